@@ -1,5 +1,6 @@
 import streamlit as st
-from utils.auth import check_login
+from utils.auth import check_login, is_admin
+from utils.perf import timed
 
 # 1. Config
 st.set_page_config(
@@ -41,9 +42,19 @@ if st.session_state["authenticated"]:
         ],
         "Actions": [
             st.Page("views/entry.py", title="Trade", icon=":material/swap_horiz:"),
+            st.Page("views/importer.py", title="Import", icon=":material/upload_file:"),
             st.Page("views/profile.py", title="Settings", icon=":material/settings:"),
         ]
     }
+    if is_admin(user):
+        pages["Admin"] = [
+            st.Page("views/diagnostics.py", title="Diagnostics", icon=":material/speed:"),
+        ]
 
     pg = st.navigation(pages)
-    pg.run()
+    # Saved/failed trade and profile writes (they're sent in the background)
+    from utils.ui_components import render_write_status
+    render_write_status()
+    # Compute time of each page script, shown on the diagnostics page
+    with timed("page", page=pg.title):
+        pg.run()
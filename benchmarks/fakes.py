@@ -0,0 +1,193 @@
+"""
+Deterministic stand-ins for the market-data provider and Supabase, plus a synthetic trade generator.
+Everything here is offline and seeded, so two runs produce identical inputs.
+"""
+import re
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from utils.price_store import BAR_SECONDS
+from utils.providers import COLUMNS, MarketDataProvider
+
+EXCHANGE_TZ = "America/New_York"
+
+
+def _seed(ticker):
+    return zlib.crc32(ticker.encode())
+
+
+def _price_at(ticker, ts):
+    """Smooth pseudo-random price path, a pure function of (ticker, epoch seconds)"""
+    seed = _seed(ticker)
+    base = 20 + seed % 480
+    phase = (seed % 1000) / 1000 * 2 * np.pi
+    years = ts / (365 * 86400)
+    noise = ((ts.astype(np.int64) * 2654435761 + seed) % 1000) / 1000 - 0.5
+    return base * (1 + 0.25 * np.sin(2 * np.pi * years + phase) + 0.1 * years / 50) * (1 + 0.01 * noise)
+
+
+def bar_index(start, end, interval):
+    """Exchange-hours bar timestamps in [start, end) for an interval (weekdays only)"""
+    start_ts = pd.Timestamp(start, unit="s", tz="UTC").tz_convert(EXCHANGE_TZ)
+    end_ts = pd.Timestamp(end, unit="s", tz="UTC").tz_convert(EXCHANGE_TZ)
+    step = BAR_SECONDS.get(interval, 86400)
+
+    if step < 86400:
+        days = pd.date_range(start_ts.normalize(), end_ts.normalize(), freq="B").tz_localize(None)
+        per_day = pd.timedelta_range("9h30min", "15h59min", freq=f"{step}s")
+        index = pd.DatetimeIndex((days.values[:, None] + per_day.values[None, :]).ravel()).tz_localize(EXCHANGE_TZ)
+    elif step == 86400:
+        index = pd.date_range(start_ts.normalize(), end_ts, freq="B")
+    else:
+        index = pd.date_range(start_ts.normalize(), end_ts, freq="W-MON")
+    return index[(index >= start_ts) & (index < end_ts)]
+
+
+class FakeMarketProvider(MarketDataProvider):
+    """
+    Market-data backend with the same contract as providers.YFinanceProvider.
+    Counts calls and bars served so benchmarks can report upstream traffic.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.calls = 0
+        self.bars = 0
+
+    def history(self, tickers, start, end, interval):
+        self.calls += 1
+        index = bar_index(start, end, interval)
+        ts = index.as_unit("s").asi8.astype(float)
+        frames = {}
+        for t in tickers:
+            close = _price_at(t, ts)
+            frames[t] = pd.DataFrame(
+                {"Open": close * 0.999, "High": close * 1.005, "Low": close * 0.995, "Close": close, "Volume": 1e6},
+                index=index,
+            )[COLUMNS]
+            self.bars += len(index)
+        return frames
+
+    def quotes(self, tickers):
+        self.calls += 1
+        now = np.array([float(self.clock())])
+        return {t: float(_price_at(t, now)[0]) for t in tickers}, {}
+
+    def info(self, ticker):
+        self.calls += 1
+        return {"longName": f"{ticker} Inc.", "sector": "Synthetic", "marketCap": 1e9 + _seed(ticker)}
+
+
+def synthetic_trades(n_trades, n_tickers=20, n_users=5, days=365, now=None, seed=7):
+    """Random but reproducible trades table in the same shape Supabase returns"""
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp.now(tz="UTC") if now is None else pd.Timestamp(now, unit="s", tz="UTC")
+    tickers = [f"T{i:03d}" for i in range(n_tickers)]
+    users = [f"user{i}" for i in range(n_users)]
+
+    offsets = np.sort(rng.uniform(0, days * 86400, n_trades))[::-1]
+    created = now - pd.to_timedelta(offsets, unit="s")
+    chosen = rng.choice(tickers, n_trades)
+    prices = _price_at_many(chosen, created.as_unit("s").asi8.astype(float))
+
+    return pd.DataFrame({
+        "id": np.arange(1, n_trades + 1),
+        "user_name": rng.choice(users, n_trades),
+        "ticker": chosen,
+        "action": rng.choice(["Buy", "Buy", "Buy", "Sell"], n_trades),
+        "price": prices.round(2),
+        "quantity": rng.integers(1, 50, n_trades).astype(float),
+        "reasoning": "synthetic",
+        "created_at": created.strftime("%Y-%m-%dT%H:%M:%S+00:00"),
+    })
+
+
+def _price_at_many(tickers, ts):
+    out = np.empty(len(ts))
+    for t in np.unique(tickers):
+        mask = tickers == t
+        out[mask] = _price_at(t, ts[mask])
+    return out
+
+
+class _Response:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class _Query:
+    """Minimal PostgREST query builder over an in-memory DataFrame"""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.frame = client.tables[table]
+        self.columns = None
+        self.count = None
+        self.order_by = []
+        self.row_limit = None
+
+    def select(self, columns="*", count=None):
+        self.columns = None if columns == "*" else columns.split(",")
+        self.count = count
+        return self
+
+    def eq(self, field, value):
+        self.frame = self.frame[self.frame[field] == value]
+        return self
+
+    def in_(self, field, values):
+        self.frame = self.frame[self.frame[field].isin(values)]
+        return self
+
+    def gte(self, field, value):
+        self.frame = self.frame[self.frame[field] >= value]
+        return self
+
+    def lte(self, field, value):
+        self.frame = self.frame[self.frame[field] <= value]
+        return self
+
+    def or_(self, expression):
+        # Only the keyset form utils.db.query_trades builds
+        m = re.fullmatch(r'created_at\.(lt|gt)\."(.+?)",and\(created_at\.eq\."(.+?)",id\.(?:lt|gt)\.(\d+)\)', expression)
+        op, ts, _, last_id = m.groups()
+        f = self.frame
+        if op == "lt":
+            self.frame = f[(f["created_at"] < ts) | ((f["created_at"] == ts) & (f["id"] < int(last_id)))]
+        else:
+            self.frame = f[(f["created_at"] > ts) | ((f["created_at"] == ts) & (f["id"] > int(last_id)))]
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by.append((column, not desc))
+        return self
+
+    def limit(self, size):
+        self.row_limit = size
+        return self
+
+    def execute(self):
+        self.client.calls += 1
+        f = self.frame
+        total = len(f)
+        if self.order_by:
+            f = f.sort_values([c for c, _ in self.order_by], ascending=[a for _, a in self.order_by])
+        if self.row_limit is not None:
+            f = f.head(self.row_limit)
+        if self.columns:
+            f = f[self.columns]
+        return _Response(f.to_dict("records"), total if self.count else None)
+
+
+class FakeSupabase:
+    """Read-only Supabase client backed by DataFrames ({table name: frame})"""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.calls = 0
+
+    def table(self, name):
+        return _Query(self, name)
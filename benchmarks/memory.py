@@ -0,0 +1,98 @@
+"""
+Memory report for the analytics caches: what the old st.cache_data entries cost versus the shared CompactFrames.
+
+    python -m benchmarks.memory                   # JSON on stdout
+    python -m benchmarks.memory --users 25 --trades 5000
+
+For every cache key a dashboard/compare/leaderboard/research workload touches, the same result is built
+both ways from the offline fakes in benchmarks/fakes.py:
+
+    legacy_pickle_bytes   what st.cache_data kept per entry (pickled float64 frame)
+    legacy_frame_bytes    the unpickled copy every cache hit used to hand out
+    compact_bytes         the one CompactFrame shared by every session
+"""
+import argparse
+import json
+import logging
+import pickle
+import sys
+import tempfile
+
+import streamlit.logger
+
+from benchmarks.fakes import synthetic_trades
+from benchmarks.run import NOW, Harness
+from utils.compact import CompactFrame
+
+streamlit.logger.set_log_level(logging.ERROR)
+
+DASHBOARD_PERIODS = [("1d", "5m"), ("5d", "15m"), ("1mo", "1d"), ("3mo", "1d"), ("1y", "1d"), ("max", "1w")]
+RESEARCH_PERIODS = [("1d", "5m"), ("1mo", "1d"), ("1y", "1d"), ("max", "1wk")]
+ETFS = ["SPY", "QQQ", "VOO", "VGT", "SCHD", "IWM", "DIA"]
+
+
+def _sizes(frame, compact):
+    return {
+        "legacy_pickle_bytes": len(pickle.dumps(frame)),
+        "legacy_frame_bytes": int(frame.memory_usage(deep=True).sum()) if not frame.empty else 0,
+        "compact_bytes": compact.nbytes,
+    }
+
+
+def workload(n_users, n_trades, n_tickers):
+    """(cache, legacy frame, compact frame) for every key the workload fills"""
+    from utils.analytics import (BAR_COLUMNS, MONEY_COLUMNS, _benchmark_returns, _bulk_returns, _rank_returns,
+                                 _replay_history)
+    from utils.price_store import get_store
+
+    trades = synthetic_trades(n_trades, n_tickers, n_users=n_users, now=NOW)
+    for user, user_trades in trades.groupby("user_name"):
+        for period, interval in DASHBOARD_PERIODS:
+            frame = _replay_history(user_trades, period, interval)
+            yield "portfolio_history", frame, CompactFrame(frame, time_col="Date", exact=MONEY_COLUMNS)
+
+    for ticker in ["SPY", "QQQ", "BTC-USD"]:
+        for period, interval in DASHBOARD_PERIODS:
+            frame = _benchmark_returns(ticker, period, interval)
+            yield "benchmark_history", frame, CompactFrame(frame, time_col="Date")
+
+    for ticker in sorted(trades["ticker"].unique()):
+        for period, interval in RESEARCH_PERIODS:
+            frame = get_store().get_period([ticker], period, interval)[ticker]
+            yield "price_history", frame, CompactFrame(frame, exact=BAR_COLUMNS)
+
+    for period in ["5d", "1mo", "3mo", "6mo", "1y", "ytd"]:
+        frame = _rank_returns(trades, tuple(ETFS), period)
+        yield "leaderboard_returns", frame, CompactFrame(frame)
+        frame = _bulk_returns(ETFS, period)
+        yield "bulk_history", frame, CompactFrame(frame)
+
+
+def run(n_users, n_trades, n_tickers):
+    groups = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        Harness(workdir)
+        for cache, frame, compact in workload(n_users, n_trades, n_tickers):
+            totals = groups.setdefault(cache, {"keys": 0, "legacy_pickle_bytes": 0, "legacy_frame_bytes": 0, "compact_bytes": 0})
+            totals["keys"] += 1
+            for k, v in _sizes(frame, compact).items():
+                totals[k] += v
+
+    total = {k: sum(g[k] for g in groups.values()) for k in ("keys", "legacy_pickle_bytes", "legacy_frame_bytes", "compact_bytes")}
+    for row in list(groups.values()) + [total]:
+        row["saving_pct"] = round(100 * (1 - row["compact_bytes"] / row["legacy_pickle_bytes"]), 1) if row["legacy_pickle_bytes"] else 0.0
+    return {"params": {"users": n_users, "trades": n_trades, "tickers": n_tickers}, "caches": groups, "total": total}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--trades", type=int, default=2000)
+    parser.add_argument("--tickers", type=int, default=20)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.users, args.trades, args.tickers), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
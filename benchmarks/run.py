@@ -0,0 +1,248 @@
+"""
+Offline benchmarks for the analytics and page pipelines.
+
+    python -m benchmarks.run                          # full matrix, JSON on stdout
+    python -m benchmarks.run --quick                  # smaller matrix
+    python -m benchmarks.run --output bench.json --check
+    python -m benchmarks.run --record                 # re-baseline thresholds.json on this machine (and --quick --record)
+
+The market-data provider and Supabase are replaced by the deterministic fakes in benchmarks/fakes.py,
+so no network access or secrets are needed. --check compares every case's fastest run (min_s)
+against benchmarks/thresholds.json and exits non-zero on a regression. The fastest of several runs
+is the least noisy statistic on a shared machine; the median still goes into the report.
+The thresholds are a recorded baseline times MARGIN, kept separately for full and --quick runs
+(the same case runs against a differently warmed store in each): re-record both after an
+intended speed change or on new hardware.
+"""
+import argparse
+import json
+import logging
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+import streamlit as st
+import streamlit.logger
+
+from benchmarks.fakes import FakeMarketProvider, FakeSupabase, synthetic_trades
+from utils.price_store import PriceStore
+from utils.snapshots import SnapshotStore
+
+# Cached functions warn about the missing Streamlit runtime on every call
+streamlit.logger.set_log_level(logging.ERROR)
+
+THRESHOLDS = Path(__file__).with_name("thresholds.json")
+
+# --record: a case's limit is its min_s times MARGIN, never below FLOOR_S (scheduler noise dominates there)
+MARGIN = 3.0
+FLOOR_S = 0.05
+
+# Friday after the close: every period has a full last session
+NOW = pd.Timestamp("2024-06-14 21:00", tz="UTC").timestamp()
+
+FULL = {
+    "trades": [100, 1000, 10000],
+    "tickers": [10, 50],
+    "periods": [("1d", "5m"), ("1mo", "1d"), ("1y", "1d"), ("max", "1w")],
+    "users": [5, 25, 250],
+    "repeats": 7,
+}
+QUICK = {
+    "trades": [100, 1000],
+    "tickers": [10],
+    "periods": [("1d", "5m"), ("1y", "1d")],
+    "users": [5],
+    "repeats": 9,
+}
+
+
+class Harness:
+    """Points utils.* at the fakes and owns one warm price store for the whole run"""
+
+    def __init__(self, workdir):
+        self.provider = FakeMarketProvider(clock=lambda: NOW)
+        self.store = PriceStore(Path(workdir) / "prices.sqlite", provider=self.provider, clock=lambda: NOW)
+        self.snapshots = SnapshotStore(Path(workdir) / "snapshots.sqlite", clock=lambda: NOW)
+        self.supabase = FakeSupabase({"trades": pd.DataFrame(), "users": pd.DataFrame()})
+
+        import supabase
+        st.secrets = {"SUPABASE_URL": "http://offline", "SUPABASE_KEY": "offline"}
+        supabase.create_client = lambda url, key: self.supabase
+
+        import utils.analytics
+        import utils.price_store
+        import utils.providers
+        import utils.snapshots
+
+        utils.price_store.get_store = lambda: self.store
+        utils.analytics.get_store = lambda: self.store
+        utils.snapshots.get_store = lambda: self.store
+        utils.snapshots.get_snapshots = lambda: self.snapshots
+        utils.analytics.get_snapshots = lambda: self.snapshots
+        utils.providers.use_provider(self.provider)
+
+    def load(self, trades):
+        users = sorted(trades["user_name"].unique())
+        self.supabase.tables = {
+            "trades": trades,
+            "users": pd.DataFrame({"username": users, "full_name": users}),
+        }
+
+    def upstream_calls(self):
+        return self.provider.calls + self.supabase.calls
+
+
+def measure(harness, fn, repeats):
+    """Warm the price store once, then time cold-cache runs of fn"""
+    fn()
+    samples = []
+    before = harness.upstream_calls()
+    for _ in range(repeats):
+        st.cache_data.clear()
+        st.cache_resource.clear()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        "median_s": statistics.median(samples),
+        "min_s": min(samples),
+        "max_s": max(samples),
+        "upstream_calls": (harness.upstream_calls() - before) / repeats,
+    }
+
+
+def cases(matrix):
+    """(group, params, trades to serve, fn) for every benchmark in the matrix"""
+    from utils.analytics import get_benchmark_history, get_bulk_history, get_leaderboard_returns, get_portfolio_history
+    from utils.db import HISTORY_COLUMNS, get_trades
+    from utils.market import calculate_portfolio_value
+
+    for n_trades in matrix["trades"]:
+        for n_tickers in matrix["tickers"]:
+            trades = synthetic_trades(n_trades, n_tickers, n_users=1, now=NOW)
+
+            for period, interval in matrix["periods"]:
+                yield ("portfolio_history",
+                       {"trades": n_trades, "tickers": n_tickers, "period": period, "interval": interval},
+                       trades, lambda t=trades, p=period, i=interval: get_portfolio_history(t, period=p, interval=i))
+
+            yield ("portfolio_value", {"trades": n_trades, "tickers": n_tickers},
+                   trades, lambda t=trades: calculate_portfolio_value(t))
+
+    etfs = ["SPY", "QQQ", "VOO", "VGT", "SCHD", "IWM", "DIA"]
+    for n_tickers in [len(etfs)] + matrix["tickers"]:
+        tickers = etfs if n_tickers == len(etfs) else [f"T{i:03d}" for i in range(n_tickers)]
+        for period, _ in matrix["periods"]:
+            if period == "1d":
+                continue
+            yield ("bulk_history", {"tickers": n_tickers, "period": period},
+                   None, lambda t=tickers, p=period: get_bulk_history(t, period=p))
+
+    for n_users in matrix["users"]:
+        for n_trades in matrix["trades"]:
+            trades = synthetic_trades(n_trades, max(matrix["tickers"]), n_users=n_users, now=NOW)
+            users = sorted(trades["user_name"].unique())
+
+            def leaderboard(p="1y"):
+                all_trades = pd.DataFrame(get_trades(columns=HISTORY_COLUMNS))
+                return get_leaderboard_returns(all_trades, etfs, period=p)
+
+            def compare(p="1mo", i="1d", picked=users[:3]):
+                all_trades = pd.DataFrame(get_trades(user=picked, columns=HISTORY_COLUMNS))
+                for u in picked:
+                    get_portfolio_history(all_trades[all_trades["user_name"] == u], period=p, interval=i)
+                get_benchmark_history("SPY", period=p, interval=i)
+
+            yield ("leaderboard", {"users": n_users, "trades": n_trades, "period": "1y"}, trades, leaderboard)
+            yield ("compare", {"users": n_users, "picked": len(users[:3]), "trades": n_trades, "period": "1mo"}, trades, compare)
+
+
+def case_name(group, params):
+    return f"{group}[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]"
+
+
+def run(matrix):
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        harness = Harness(workdir)
+        for group, params, trades, fn in cases(matrix):
+            if trades is not None:
+                harness.load(trades)
+            stats = measure(harness, fn, matrix["repeats"])
+            results.append({"name": case_name(group, params), "group": group, "params": params, **stats})
+            print(f"{results[-1]['name']}: {stats['median_s'] * 1000:.1f} ms", file=sys.stderr)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "repeats": matrix["repeats"],
+        },
+        "results": results,
+    }
+
+
+def check(report, thresholds):
+    """Cases whose fastest run is above their threshold (per-case override, else per-group)"""
+    regressions = []
+    for r in report["results"]:
+        limit = thresholds.get("cases", {}).get(r["name"], thresholds.get("groups", {}).get(r["group"]))
+        if limit is not None and r["min_s"] > limit:
+            regressions.append({"name": r["name"], "min_s": r["min_s"], "median_s": r["median_s"], "threshold_s": limit})
+    return regressions
+
+
+def record(report, path, mode, margin=MARGIN):
+    """
+    Writes the `mode` ('full' or 'quick') section of the thresholds file from this run's fastest
+    runs; the other section is kept. A group's limit (for cases without their own) is its slowest
+    recorded case limit.
+    """
+    path = Path(path)
+    thresholds = json.loads(path.read_text()) if path.exists() else {}
+    cases = {r["name"]: round(max(r["min_s"] * margin, FLOOR_S), 4) for r in report["results"]}
+    groups = {}
+    for name, limit in cases.items():
+        group = name.split("[", 1)[0]
+        groups[group] = max(groups.get(group, 0.0), limit)
+    thresholds[mode] = {"baseline": {**report["meta"], "margin": margin, "floor_s": FLOOR_S},
+                        "groups": groups, "cases": dict(sorted(cases.items()))}
+    path.write_text(json.dumps({m: thresholds[m] for m in ("full", "quick") if m in thresholds}, indent=2) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="smaller matrix")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any case exceeds its threshold")
+    parser.add_argument("--thresholds", default=THRESHOLDS, help="thresholds file (default: %(default)s)")
+    parser.add_argument("--record", action="store_true", help=f"write this run's fastest times x {MARGIN:g} to the thresholds file")
+    args = parser.parse_args(argv)
+
+    mode = "quick" if args.quick else "full"
+    report = run(QUICK if args.quick else FULL)
+    if args.record:
+        record(report, args.thresholds, mode)
+    if args.check:
+        report["regressions"] = check(report, json.loads(Path(args.thresholds).read_text()).get(mode, {}))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+
+    if args.check and report["regressions"]:
+        for r in report["regressions"]:
+            print(f"REGRESSION {r['name']}: {r['min_s']:.3f}s > {r['threshold_s']:.3f}s", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
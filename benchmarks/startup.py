@@ -0,0 +1,104 @@
+"""
+Cold-start report: how long a fresh process takes to show the login page, and what it imports on the way.
+
+    python -m benchmarks.startup                  # JSON on stdout
+    python -m benchmarks.startup --repeats 5 --output startup.json
+
+Every sample runs in a new interpreter so nothing is already imported. No secrets or network are needed:
+the login page must render without touching Supabase.
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Modules app.py pulls in before the login form renders
+LOGIN_IMPORTS = "import streamlit; import utils.auth, utils.perf"
+
+# What the default page (Home) needs once the user is in
+HOME_IMPORTS = "import utils.db, utils.analytics, utils.market, utils.ui_components, plotly.graph_objects"
+
+# Renders app.py to the login form; streamlit's test harness is imported before the clock starts
+# and only modules the render itself loads count as heavy
+LOGIN_RENDER = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+before = set(sys.modules)
+start = time.perf_counter()
+at = AppTest.from_file("app.py", default_timeout=60)
+at.run()
+elapsed = time.perf_counter() - start
+assert not at.exception, at.exception
+assert at.text_input, "login form did not render"
+loaded = {m.split(".")[0] for m in set(sys.modules) - before}
+heavy = [m for m in ("supabase", "pandas", "numpy", "plotly", "yfinance") if m in loaded]
+print(json.dumps({"seconds": elapsed, "heavy_modules": heavy}))
+"""
+
+IMPORT_TIMER = """
+import json, time
+start = time.perf_counter()
+{imports}
+print(json.dumps({{"seconds": time.perf_counter() - start}}))
+"""
+
+
+def _python(code, *flags):
+    out = subprocess.run([sys.executable, *flags, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return out
+
+
+def _sample(code):
+    return json.loads(_python(code).stdout.strip().splitlines()[-1])
+
+
+def import_breakdown(imports, top=15):
+    """Slowest direct imports (cumulative ms) from python -X importtime"""
+    stderr = _python(imports, "-X", "importtime").stderr
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented under their parent; keep what the snippet imported directly
+        if name[1:2] != " " and name.strip().split(".")[0] not in sys.stdlib_module_names and not name.strip().startswith("_"):
+            packages[name.strip()] = packages.get(name.strip(), 0) + int(cumulative)
+    ranked = sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    return [{"module": m, "cumulative_ms": us / 1000} for m, us in ranked]
+
+
+def run(repeats):
+    login = [_sample(LOGIN_RENDER) for _ in range(repeats)]
+    login_imports = [_sample(IMPORT_TIMER.format(imports=LOGIN_IMPORTS))["seconds"] for _ in range(repeats)]
+    home_imports = [_sample(IMPORT_TIMER.format(imports=HOME_IMPORTS))["seconds"] for _ in range(repeats)]
+    return {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "repeats": repeats},
+        "login_render_s": statistics.median(s["seconds"] for s in login),
+        "login_heavy_modules": login[-1]["heavy_modules"],
+        "login_imports_s": statistics.median(login_imports),
+        "home_imports_s": statistics.median(home_imports),
+        "login_import_breakdown": import_breakdown(LOGIN_IMPORTS),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=3, help="fresh processes per measurement")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    text = json.dumps(run(args.repeats), indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,10 @@
+-- Columns the app writes to the trades table since the write-behind queue and the lot ledger.
+-- Run once in the Supabase SQL editor (or psql); every statement is safe to re-run.
+
+-- Write key of every queued insert (utils.db._write_trades upserts on it), so a batch retried
+-- after a lost response doesn't store its rows twice. Rows written before this stay NULL.
+alter table trades add column if not exists client_key text;
+create unique index if not exists trades_client_key_key on trades (client_key);
+
+-- Buy trade ids a Sell closes first instead of FIFO (utils.ledger specific-lot matching)
+alter table trades add column if not exists lot_ids int8[];
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from utils.charts import downsample_index, scatter
+
+
+def test_short_series_pass_through():
+    assert downsample_index([3.0, 1.0, 2.0], 10).tolist() == [0, 1, 2]
+
+
+def test_extremes_and_endpoints_survive():
+    rng = np.random.default_rng(0)
+    y = rng.normal(size=10_000).cumsum()
+    keep = downsample_index(y, 200)
+    assert len(keep) <= 200
+    assert keep[0] == 0 and keep[-1] == len(y) - 1
+    assert np.all(np.diff(keep) > 0)
+    assert y.argmax() in keep and y.argmin() in keep
+
+
+def test_every_bucket_keeps_its_min_and_max():
+    y = np.zeros(1000)
+    y[123], y[877] = 5.0, -5.0  # lone spikes a stride-based sampler would miss
+    keep = downsample_index(y, 20)
+    assert 123 in keep and 877 in keep
+
+
+def test_nan_gaps_never_win_a_bucket():
+    y = np.arange(1000, dtype=float)
+    y[1:-1:3] = np.nan
+    keep = downsample_index(y, 10)
+    assert not np.isnan(y[keep]).any()
+
+
+def test_scatter_downsamples_series_with_their_index():
+    index = pd.date_range("2024-01-01", periods=5000, freq="min")
+    y = pd.Series(np.sin(np.arange(5000) / 50), index=index)
+    trace = scatter(y.index, y, points=100)
+    assert len(trace.y) <= 100
+    # x and y stay paired
+    assert list(y.loc[pd.DatetimeIndex(trace.x)]) == list(trace.y)
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.analytics import BAR_COLUMNS, MONEY_COLUMNS
+from utils.compact import CompactFrame
+
+
+def _bars():
+    index = pd.date_range("2024-06-10 09:30", periods=3, freq="5min", tz="America/New_York", name="Datetime")
+    return pd.DataFrame({
+        "Open": [187.123456, 187.5, 188.0],
+        "High": [188.654321, 188.0, 189.0],
+        "Low": [186.0, 187.0, 187.5],
+        "Close": [187.987654, 187.75, 188.5],
+        "Volume": [123_456_789.0, 16_777_217.0, np.nan],
+    }, index=index)
+
+
+def test_bars_round_trip_exactly():
+    bars = _bars()
+    frame = CompactFrame(bars, exact=BAR_COLUMNS).to_frame()
+    for col in BAR_COLUMNS:
+        np.testing.assert_array_equal(frame[col].to_numpy(), bars[col].to_numpy())
+    # Timestamps are kept as epoch seconds, in the original zone
+    assert frame.index.equals(bars.index) and str(frame.index.tz) == "America/New_York"
+
+
+def test_float32_is_only_for_columns_outside_exact():
+    history = pd.DataFrame({
+        "Date": pd.date_range("2024-01-01", periods=2, tz="UTC"),
+        "Portfolio Value": [123_456.78, 123_457.01],
+        "Return %": [1.2345678, 2.5],
+        "Trades": [3, 4],
+        "User": ["a", "b"],
+    })
+    frame = CompactFrame(history, time_col="Date", exact=MONEY_COLUMNS).to_frame()
+    assert frame["Portfolio Value"].dtype == np.float64
+    assert frame["Return %"].dtype == np.float32
+    assert frame["Trades"].dtype == np.int64
+    assert list(frame["Trades"]) == [3, 4]
+    assert list(frame["User"]) == ["a", "b"]
+    assert frame["Date"].equals(history["Date"].dt.as_unit("s"))
+
+
+def test_shared_arrays_are_read_only():
+    frame = CompactFrame(_bars(), exact=BAR_COLUMNS).to_frame()
+    with pytest.raises(ValueError):
+        frame["Close"].to_numpy()[0] = 0.0
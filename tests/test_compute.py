@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+import utils.compute as compute
+from benchmarks.fakes import synthetic_trades
+from benchmarks.run import NOW, Harness
+from utils.analytics import load_closes, rank_users
+from utils.risk import price_returns
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # A real two-worker pool, used even for a handful of users
+    monkeypatch.setattr(compute, "pool_workers", lambda: 2)
+    monkeypatch.setattr(compute, "POOL_MIN_USERS", 1)
+    yield compute.get_pool()
+    compute._reset_pool()
+
+
+@pytest.mark.parametrize("with_snapshots", [False, True])
+def test_pool_matches_the_in_process_ranking(tmp_path, pool, with_snapshots):
+    harness = Harness(tmp_path)
+    trades = synthetic_trades(600, 8, n_users=7, now=NOW)
+    history = load_closes(trades['ticker'].unique().tolist() + ["SPY"], "1y", "1d").ffill()
+    benchmark = price_returns(history.pop("SPY"))
+    snapshots = None
+    if with_snapshots:
+        snapshots = harness.snapshots
+        snapshots.sync(trades)
+
+    expected = rank_users(trades, history, benchmark, 252, snapshots)
+    result = compute.rank_users_parallel(trades, history, benchmark, 252, snapshots)
+    # Answered by the workers, not the in-process fallback
+    assert compute._pool is pool and pool._processes
+    pd.testing.assert_frame_equal(result, expected)
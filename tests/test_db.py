@@ -0,0 +1,86 @@
+import pandas as pd
+import pytest
+
+import utils.db as db
+from benchmarks.fakes import FakeSupabase
+
+# Three trades share each timestamp, so page boundaries fall inside ties
+TRADES = pd.DataFrame([
+    {"id": i, "user_name": f"user{i % 2}", "ticker": ("AAA", "BBB", "CCC")[i % 3], "action": "Buy",
+     "price": 10.0 + i, "quantity": 1.0, "reasoning": "r" * 50, "created_at": f"2024-01-{2 + i // 3:02d}T15:00:00+00:00"}
+    for i in range(1, 25)
+])
+
+
+class _Recorded:
+    """A fake query that logs the filters it is sent"""
+
+    def __init__(self, query, log):
+        self.query, self.log = query, log
+
+    def __getattr__(self, name):
+        method = getattr(self.query, name)
+        if name == "execute":
+            return method
+
+        def call(*args, **kwargs):
+            self.log.append((name, args))
+            method(*args, **kwargs)
+            return self
+        return call
+
+
+class _RecordingSupabase(FakeSupabase):
+    def __init__(self, tables):
+        super().__init__(tables)
+        self.filters = []
+
+    def table(self, name):
+        return _Recorded(super().table(name), self.filters)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = _RecordingSupabase({"trades": TRADES})
+    monkeypatch.setattr(db, "init_supabase", lambda: client)
+    return client
+
+
+def _key(row):
+    return (row["created_at"], row["id"])
+
+
+@pytest.mark.parametrize("desc", [True, False])
+@pytest.mark.parametrize("page_size", [1, 2, 4, 5, 24, 1000])
+def test_keyset_pages_cover_every_row_once_through_ties(client, desc, page_size):
+    rows = list(db.iter_trades(page_size=page_size, desc=desc))
+    assert sorted(r["id"] for r in rows) == list(range(1, 25))
+    assert [_key(r) for r in rows] == sorted(map(_key, rows), reverse=desc)
+
+
+def test_cursor_is_the_last_row_and_none_on_the_last_page(client):
+    first, cursor = db.query_trades(limit=4)
+    assert cursor == _key(first[-1]) == ("2024-01-09T15:00:00+00:00", 21)
+    second, _ = db.query_trades(limit=4, after=cursor)
+    assert [r["id"] for r in first + second] == [24, 23, 22, 21, 20, 19, 18, 17]
+    assert db.query_trades(limit=24)[1] == ("2024-01-02T15:00:00+00:00", 1)
+    assert db.query_trades(limit=25)[1] is None
+
+
+def test_filters_are_sent_to_the_server(client):
+    rows = db.get_trades(user="user0", ticker=["AAA", "BBB"], start="2024-01-03", end="2024-01-05T23:59:59+00:00")
+    assert ("eq", ("user_name", "user0")) in client.filters
+    assert ("in_", ("ticker", ["AAA", "BBB"])) in client.filters
+    assert ("gte", ("created_at", "2024-01-03")) in client.filters
+    expected = TRADES[(TRADES["user_name"] == "user0") & TRADES["ticker"].isin(["AAA", "BBB"])
+                      & (TRADES["created_at"] >= "2024-01-03") & (TRADES["created_at"] <= "2024-01-05T23:59:59+00:00")]
+    assert sorted(r["id"] for r in rows) == sorted(expected["id"])
+
+
+def test_columns_projection_keeps_the_cursor_keys(client):
+    rows, cursor = db.query_trades(columns=["ticker", "price"], limit=2)
+    assert ("select", ("ticker,price,created_at,id",)) in client.filters
+    assert set(rows[0]) == {"ticker", "price", "created_at", "id"}
+    assert cursor is not None
+    full, _ = db.query_trades(columns=db.HISTORY_COLUMNS, limit=1)
+    assert "reasoning" not in full[0]
@@ -0,0 +1,94 @@
+import io
+
+import pytest
+
+import utils.importer as importer
+from utils.importer import detect_columns, plan_import, read_header, read_trades, text_stream, trade_key
+from utils.symbols import Symbol, SymbolIndex
+
+FIDELITY = (
+    "Brokerage\n"
+    "Account: X12345678\n"
+    "\n"
+    "Run Date,Action,Symbol,Security Description,Quantity,Price ($),Amount ($)\n"
+    "01/02/2024,YOU BOUGHT APPLE INC (AAPL) (Cash),AAPL,APPLE INC,10,185.64,-1856.40\n"
+    "01/03/2024,DIVIDEND RECEIVED,MSFT,MICROSOFT CORP,,,12.00\n"
+    "01/04/2024,YOU SOLD APPLE INC (AAPL) (Cash),AAPL,APPLE INC,-4,181.91,727.64\n"
+    "01/05/2024 as of 01/04/2024,YOU BOUGHT BERKSHIRE (BRK.B),BRK.B,BERKSHIRE HATHAWAY,1,\"1,360.00\",-360.00\n"
+)
+
+
+@pytest.fixture(autouse=True)
+def _universe(monkeypatch):
+    index = SymbolIndex([Symbol(s, s, "NYSE") for s in ("AAPL", "MSFT", "BRK-B")])
+    monkeypatch.setattr(importer, "get_symbol_index", lambda: index)
+
+
+def test_header_found_below_the_preamble():
+    header, columns = read_header(io.BytesIO(FIDELITY.encode()))
+    assert header[0] == "Run Date"
+    assert columns == {"date": 0, "action": 1, "ticker": 2, "quantity": 4, "price": 5}
+
+
+def test_aliases_pick_the_best_match():
+    assert detect_columns(["Trade Date", "Settle Date", "Side", "Ticker", "Qty", "Fill Price"]) == {
+        "date": 0, "action": 2, "ticker": 3, "quantity": 4, "price": 5}
+
+
+def test_rows_are_parsed_and_non_trades_skipped():
+    rows = list(read_trades(io.StringIO(FIDELITY)))
+    trades = [t for _, t, _ in rows if t]
+    assert [(t["ticker"], t["action"], t["quantity"], t["price"]) for t in trades] == [
+        ("AAPL", "Buy", 10.0, 185.64), ("AAPL", "Sell", 4.0, 181.91), ("BRK-B", "Buy", 1.0, 1360.0)]
+    # Dates without a time land on the New York close
+    assert trades[0]["created_at"] == "2024-01-02T21:00:00+00:00"
+    assert trades[2]["created_at"] == "2024-01-05T21:00:00+00:00"
+    assert [line for line, t, problem in rows if t is None and problem is None] == [6]
+
+
+def test_missing_columns_are_reported():
+    with pytest.raises(ValueError, match="Missing column"):
+        list(read_trades(io.StringIO("Symbol,Quantity,Price,Note,Other\nAAPL,1,2,x,y\n")))
+
+
+def test_bad_rows_are_errors_not_failures():
+    text = ("Date,Symbol,Action,Quantity,Price\n"
+            "01/02/2024,AAPL,Buy,ten,1\n"
+            "someday,AAPL,Buy,1,1\n"
+            "01/02/2024,AAPL,Buy,0,1\n"
+            "01/02/2024,AAPL,Buy,1,2\n")
+    plan = plan_import(io.StringIO(text), "user0")
+    assert plan["error_count"] == 3
+    assert [e["line"] for e in plan["errors"]] == [2, 3, 4]
+    assert len(plan["trades"]) == 1
+
+
+def test_stored_trades_and_in_file_repeats_are_deduped():
+    text = ("Date,Symbol,Action,Quantity,Price\n"
+            "01/02/2024,AAPL,Buy,1,100\n"
+            "01/02/2024,AAPL,Buy,1,100\n"
+            "01/02/2024,AAPL,Buy,1,100\n"
+            "01/03/2024,MSFT,Buy,2,300\n")
+    first = plan_import(io.StringIO(text), "user0")
+    assert len(first["trades"]) == 4 and first["duplicates"] == 0
+
+    # Two copies already stored (with server-side ids and formatting): one of the three is still new
+    stored = [{**t, "id": i, "price": str(t["price"])} for i, t in enumerate(first["trades"][:2])]
+    second = plan_import(io.StringIO(text), "user0", existing=stored)
+    assert second["duplicates"] == 2
+    assert [(t["ticker"], t["created_at"]) for t in second["trades"]] == [
+        ("AAPL", "2024-01-02T21:00:00+00:00"), ("MSFT", "2024-01-03T21:00:00+00:00")]
+
+
+def test_trade_key_ignores_timestamp_format():
+    a = {"ticker": "AAPL", "action": "Buy", "quantity": 1, "price": 10, "created_at": "2024-01-02T21:00:00+00:00"}
+    b = dict(a, created_at="2024-01-02T16:00:00-05:00", quantity="1.0")
+    assert trade_key(a) == trade_key(b)
+
+
+def test_latin1_upload_is_decoded_and_rewound():
+    upload = io.BytesIO("Date,Symbol,Action,Quantity,Price\n01/02/2024,AAPL,Achat Buy,1,1\n".encode("latin-1")
+                        + "# Soci\xe9t\xe9\n".encode("latin-1"))
+    with text_stream(upload) as stream:
+        assert "Soci\xe9t\xe9" in stream.read()
+    assert upload.tell() == 0
@@ -0,0 +1,48 @@
+import pandas as pd
+
+import utils.analytics as analytics
+from benchmarks.fakes import synthetic_trades
+from benchmarks.run import NOW, Harness
+
+
+class _StoreUntil:
+    """The harness store, with bars after `end` not published yet"""
+
+    def __init__(self, store, end):
+        self.store, self.end = store, end
+
+    def get_history(self, tickers, start, interval):
+        frames = self.store.get_history(tickers, start=start, interval=interval)
+        return {t: f[f.index <= self.end] for t, f in frames.items()}
+
+
+def _trade(trade_id, ticker, action, price, quantity, at):
+    return {"id": trade_id, "user_name": "user0", "ticker": ticker, "action": action, "price": price,
+            "quantity": quantity, "reasoning": "test", "created_at": at.tz_convert("UTC").isoformat()}
+
+
+def test_extended_history_matches_full_replay_with_trades_between_bars(tmp_path, monkeypatch):
+    harness = Harness(tmp_path)
+    trades = synthetic_trades(200, 5, n_users=1, now=NOW)
+    tickers = trades['ticker'].unique().tolist()
+    closes = analytics.load_closes(tickers, "1d", "5m").ffill()
+    first_cut, second_cut = closes.index[30], closes.index[50]
+
+    # Logged after the last computed bar: a buy 2 minutes later, a sell in between the two extensions
+    trades = pd.concat([trades, pd.DataFrame([
+        _trade(10_001, tickers[0], "Buy", 100.0, 50.0, first_cut + pd.Timedelta(minutes=2)),
+        _trade(10_002, tickers[1], "Sell", 120.0, 10.0, first_cut + pd.Timedelta(minutes=47)),
+        _trade(10_003, tickers[2], "Buy", 90.0, 5.0, second_cut + pd.Timedelta(minutes=1)),
+    ])], ignore_index=True)
+
+    monkeypatch.setattr(analytics, "load_closes", lambda *args, **kwargs: closes[closes.index <= first_cut])
+    state = analytics._full_state(trades, tickers, "1d", "5m", NOW)
+
+    monkeypatch.setattr(analytics, "get_store", lambda: _StoreUntil(harness.store, second_cut))
+    state = analytics._extend_state(state, tickers, "5m", NOW)
+    monkeypatch.setattr(analytics, "get_store", lambda: harness.store)
+    state = analytics._extend_state(state, tickers, "5m", NOW)
+
+    expected = analytics.reconstruct_portfolio(trades, closes)
+    pd.testing.assert_frame_equal(state["history"].to_frame(), expected, check_dtype=False, rtol=1e-5)
+    assert state["pending"].empty
@@ -0,0 +1,68 @@
+import pytest
+
+from utils.ledger import LotLedger
+from utils.market import value_positions
+
+
+def _trade(trade_id, action, quantity, price, day, ticker="AAA", lot_ids=None, user="user0"):
+    return {"id": trade_id, "user_name": user, "ticker": ticker, "action": action, "quantity": quantity,
+            "price": price, "created_at": f"2024-01-{day:02d}T15:00:00+00:00", "lot_ids": lot_ids}
+
+
+BUYS = [_trade(1, "Buy", 10, 100.0, 2), _trade(2, "Buy", 10, 120.0, 3), _trade(3, "Buy", 10, 150.0, 4)]
+
+
+def _position(ledger, user="user0", ticker="AAA"):
+    positions = ledger.positions(user).set_index("ticker")
+    return positions.loc[ticker]
+
+
+def test_sells_close_the_oldest_lots_first():
+    ledger = LotLedger.from_trades(BUYS + [_trade(4, "Sell", 15, 130.0, 5)])
+    pos = _position(ledger)
+    assert pos["quantity"] == 15
+    assert pos["realized_pnl"] == pytest.approx(10 * 30 + 5 * 10)
+    assert pos["cost_basis"] == pytest.approx(5 * 120 + 10 * 150)
+    assert [(lot["id"], lot["quantity"]) for lot in ledger.lots("user0", "AAA")] == [(2, 5), (3, 10)]
+
+
+def test_named_lots_are_closed_first_then_fifo():
+    ledger = LotLedger.from_trades(BUYS + [_trade(4, "Sell", 15, 130.0, 5, lot_ids=[3])])
+    pos = _position(ledger)
+    assert pos["realized_pnl"] == pytest.approx(10 * (130 - 150) + 5 * (130 - 100))
+    assert [(lot["id"], lot["quantity"]) for lot in ledger.lots("user0", "AAA")] == [(1, 5), (2, 10)]
+
+
+def test_oversold_shares_are_unmatched_not_short():
+    ledger = LotLedger.from_trades([_trade(1, "Buy", 5, 10.0, 2), _trade(2, "Sell", 8, 12.0, 3)])
+    pos = _position(ledger)
+    assert pos["quantity"] == 0 and pos["unmatched"] == 3
+    assert pos["realized_pnl"] == pytest.approx(10.0)
+
+
+def test_backdated_insert_and_delete_replay_the_book():
+    ledger = LotLedger()
+    ledger.load("user0", BUYS[:2] + [_trade(4, "Sell", 10, 130.0, 5)])
+    # Inserted with an earlier date than the sell: FIFO now closes it first
+    ledger.add(_trade(5, "Buy", 10, 90.0, 1))
+    assert _position(ledger)["realized_pnl"] == pytest.approx(10 * 40)
+    ledger.remove(5)
+    assert _position(ledger)["realized_pnl"] == pytest.approx(10 * 30)
+    assert ledger.watermark("user0") == (4, 3)
+
+
+def test_trades_of_unloaded_users_are_ignored():
+    ledger = LotLedger()
+    ledger.add(_trade(1, "Buy", 1, 1.0, 2, user="someone"))
+    assert not ledger.loaded("someone")
+    assert ledger.positions("someone").empty
+
+
+def test_value_positions_prices_open_lots_only():
+    ledger = LotLedger.from_trades(BUYS + [_trade(4, "Sell", 30, 160.0, 5), _trade(5, "Buy", 2, 50.0, 6, ticker="BBB")])
+    total, table = value_positions(ledger.positions(), prices={"AAA": 200.0, "BBB": 60.0})
+    table = table.set_index("ticker")
+    assert total == pytest.approx(120.0)
+    assert table.loc["AAA", "market_value"] == 0.0
+    assert table.loc["BBB", "unrealized_pnl"] == pytest.approx(20.0)
+    assert table.loc["BBB", "return_pct"] == pytest.approx(20.0)
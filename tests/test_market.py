@@ -0,0 +1,91 @@
+import pytest
+
+import utils.analytics as analytics
+import utils.market as market
+from benchmarks.fakes import FakeMarketProvider, synthetic_trades
+from benchmarks.run import NOW, Harness
+from utils.providers import use_provider
+
+
+class _Provider(FakeMarketProvider):
+    """Fake quotes that can fail as a whole or for some tickers"""
+
+    def __init__(self):
+        super().__init__(clock=lambda: NOW)
+        self.down = False
+        self.missing = set()
+        self.requested = []
+
+    def quotes(self, tickers):
+        self.requested.append(list(tickers))
+        if self.down:
+            raise ConnectionError("network down")
+        prices, _ = super().quotes([t for t in tickers if t not in self.missing])
+        return prices, {t: "No price returned" for t in tickers if t in self.missing}
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = _Provider()
+    use_provider(provider)
+    # One token for the whole test, like a closed market over a weekend
+    monkeypatch.setattr(market, "freshness", lambda tickers, refresh: 0)
+    market._current_prices.clear()
+    yield provider
+    use_provider(None)
+
+
+def test_failed_quotes_are_retried_on_the_next_call(provider):
+    provider.down = True
+    prices, errors = market.get_current_prices(["AAA", "BBB"])
+    assert prices == {} and errors == {"AAA": "network down", "BBB": "network down"}
+
+    provider.down = False
+    prices, errors = market.get_current_prices(["AAA", "BBB"])
+    assert set(prices) == {"AAA", "BBB"} and not errors
+
+
+def test_complete_quotes_are_cached(provider):
+    market.get_current_prices(["AAA", "BBB"])
+    market.get_current_prices(["AAA", "BBB"])
+    assert len(provider.requested) == 1
+
+
+def test_portfolio_history_from_a_failed_fetch_is_not_cached(tmp_path, monkeypatch):
+    harness = Harness(tmp_path)
+    trades = synthetic_trades(50, 3, n_users=1, now=NOW)
+    history = harness.provider.history
+    harness.provider.history = lambda *args: (_ for _ in ()).throw(ConnectionError("network down"))
+    assert analytics.get_portfolio_history(trades, "1mo", "1d", version="retry").empty
+
+    harness.provider.history = history
+    assert not analytics.get_portfolio_history(trades, "1mo", "1d", version="retry").empty
+
+
+def test_partial_quotes_keep_the_prices_and_report_the_rest(provider):
+    provider.missing = {"BBB"}
+    prices, errors = market.get_current_prices(["AAA", "BBB", "CCC"])
+    assert set(prices) == {"AAA", "CCC"}
+    assert errors == {"BBB": "No price returned"}
+    assert market.get_current_price("BBB") is None
+
+
+def test_every_ticker_failing_is_reported_per_ticker(provider):
+    provider.missing = {"AAA", "BBB"}
+    assert market.get_current_prices(["AAA", "BBB"]) == ({}, {"AAA": "No price returned", "BBB": "No price returned"})
+
+
+def test_tickers_are_deduplicated_in_order(provider):
+    prices, _ = market.get_current_prices(["BBB", "AAA", "BBB", "AAA"])
+    assert provider.requested == [["BBB", "AAA"]]
+    assert list(prices) == ["BBB", "AAA"]
+    assert market.get_current_prices([]) == ({}, {})
+
+
+def test_partial_failure_is_retried_on_the_next_call(provider):
+    provider.missing = {"BBB"}
+    market.get_current_prices(["AAA", "BBB"])
+    provider.missing = set()
+    prices, errors = market.get_current_prices(["AAA", "BBB"])
+    assert set(prices) == {"AAA", "BBB"} and not errors
+    assert len(provider.requested) == 2
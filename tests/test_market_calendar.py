@@ -0,0 +1,70 @@
+from datetime import date, datetime
+
+import pytest
+
+from utils.market_calendar import (CRYPTO, EASTERN, NYSE, SETTLE, calendar_for, freshness, get_market_status,
+                                   nyse_early_closes, nyse_holidays)
+
+
+def _at(text):
+    """Epoch seconds of a New York wall-clock time"""
+    return datetime.fromisoformat(text).replace(tzinfo=EASTERN).timestamp()
+
+
+def test_2024_holidays():
+    assert sorted(nyse_holidays(2024)) == [
+        date(2024, 1, 1), date(2024, 1, 15), date(2024, 2, 19), date(2024, 3, 29), date(2024, 5, 27),
+        date(2024, 6, 19), date(2024, 7, 4), date(2024, 9, 2), date(2024, 11, 28), date(2024, 12, 25),
+    ]
+
+
+def test_observed_and_special_closures():
+    # Saturday New Year's Day is not made up on the Friday before
+    assert date(2021, 12, 31) not in nyse_holidays(2021)
+    assert date(2022, 1, 1) not in nyse_holidays(2022)
+    # Sunday holidays move to Monday, Saturday ones to Friday
+    assert nyse_holidays(2022)[date(2022, 6, 20)] == "Juneteenth"
+    assert nyse_holidays(2021)[date(2021, 12, 24)] == "Christmas Day"
+    assert date(2025, 1, 9) in nyse_holidays(2025)
+
+
+def test_early_closes():
+    assert nyse_early_closes(2024) == {date(2024, 7, 3), date(2024, 11, 29), date(2024, 12, 24)}
+    # July 3rd on a Friday is the observed holiday itself, not an early close
+    assert date(2026, 7, 3) not in nyse_early_closes(2026)
+    assert NYSE.session(date(2024, 11, 29))[1] == _at("2024-11-29T13:00")
+
+
+def test_sessions_and_transitions():
+    assert NYSE.is_open(_at("2024-06-14T10:00"))
+    assert not NYSE.is_open(_at("2024-06-14T16:00"))
+    assert not NYSE.is_open(_at("2024-07-04T12:00"))
+    assert NYSE.next_open(_at("2024-06-14T17:00")) == _at("2024-06-17T09:30")
+    assert NYSE.last_close(_at("2024-06-17T09:00")) == _at("2024-06-14T16:00")
+    assert NYSE.next_change(_at("2024-11-29T10:00")) == _at("2024-11-29T13:00")
+
+
+def test_data_end_stops_after_the_settle_window():
+    during = _at("2024-06-14T11:00")
+    assert NYSE.data_end(during) == during
+    assert NYSE.data_end(_at("2024-06-15T12:00")) == _at("2024-06-14T16:00") + SETTLE
+    assert CRYPTO.data_end(_at("2024-06-15T12:00")) == _at("2024-06-15T12:00")
+
+
+def test_freshness_moves_during_sessions_and_holds_while_closed():
+    assert freshness(["SPY"], 300, _at("2024-06-14T10:01")) == freshness(["SPY"], 300, _at("2024-06-14T10:04"))
+    assert freshness(["SPY"], 300, _at("2024-06-14T10:01")) != freshness(["SPY"], 300, _at("2024-06-14T10:06"))
+    weekend = {freshness(["SPY"], 300, _at(t)) for t in ("2024-06-14T20:00", "2024-06-15T12:00", "2024-06-17T09:29")}
+    assert weekend == {int(_at("2024-06-14T16:00") + SETTLE)}
+    # Any trading symbol keeps the token moving
+    assert freshness(["SPY", "BTC-USD"], 300, _at("2024-06-15T12:00")) == int(_at("2024-06-15T12:00") // 300 * 300)
+
+
+@pytest.mark.parametrize("symbol, calendar", [("BTC-USD", CRYPTO), ("ETH-EUR", CRYPTO), ("BRK-B", NYSE), ("SPY", NYSE)])
+def test_calendar_for(symbol, calendar):
+    assert calendar_for(symbol) is calendar
+
+
+def test_market_status_labels():
+    assert get_market_status(_at("2024-12-24T10:00")).label == "Market Open · closes 1:00 PM"
+    assert get_market_status(_at("2024-12-25T10:00")).label == "Market Closed · Christmas Day"
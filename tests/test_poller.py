@@ -0,0 +1,43 @@
+import gc
+
+from benchmarks.fakes import FakeMarketProvider
+from benchmarks.run import NOW
+from utils.poller import QuotePoller
+from utils.price_store import PriceStore
+
+
+def _poller(tmp_path):
+    provider = FakeMarketProvider(clock=lambda: NOW)
+    store = PriceStore(tmp_path / "prices.sqlite", provider=provider, clock=lambda: NOW)
+    return QuotePoller(provider, store, clock=lambda: NOW, is_open=lambda symbols, now: False)
+
+
+def test_watch_fills_the_board_from_the_given_provider(tmp_path):
+    poller = _poller(tmp_path)
+    poller.watch(["AAA", "BBB"], wait=True)
+    board = poller.snapshot()
+    assert sorted(board) == ["AAA", "BBB"]
+    assert board["AAA"]["price"] > 0 and board["AAA"]["prev_close"] > 0
+    poller.stop()
+
+
+def test_stop_ends_the_thread(tmp_path):
+    poller = _poller(tmp_path)
+    poller.watch(["AAA"])
+    thread = poller._thread
+    poller.stop()
+    thread.join(5)
+    assert not thread.is_alive()
+    # A stopped poller is not restarted by later watches
+    poller.watch(["BBB"])
+    assert poller._thread is thread
+
+
+def test_dropped_poller_ends_its_thread(tmp_path):
+    poller = _poller(tmp_path)
+    poller.watch(["AAA"])
+    thread = poller._thread
+    del poller
+    gc.collect()
+    thread.join(5)
+    assert not thread.is_alive()
@@ -0,0 +1,113 @@
+import pandas as pd
+
+from benchmarks.fakes import FakeMarketProvider
+from benchmarks.run import NOW
+from utils.price_store import FAILURE_BACKOFF, PriceStore, period_start
+
+DAY = 86400
+
+
+class _Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class _DroppingProvider(FakeMarketProvider):
+    """Fake provider that has no data for some tickers"""
+
+    def __init__(self, clock, missing):
+        super().__init__(clock)
+        self.missing = set(missing)
+        self.requested = []
+
+    def history(self, tickers, start, end, interval):
+        self.requested.append(list(tickers))
+        frames = super().history(tickers, start, end, interval)
+        return {t: f for t, f in frames.items() if t not in self.missing}
+
+
+def _store(tmp_path, provider, clock):
+    return PriceStore(tmp_path / "prices.sqlite", provider=provider, clock=clock)
+
+
+def test_covered_range_is_served_without_upstream_calls(tmp_path):
+    provider = FakeMarketProvider(clock=lambda: NOW)
+    store = _store(tmp_path, provider, lambda: NOW)
+    start = NOW - 30 * DAY
+
+    first = store.get_history(["AAA", "BBB"], start)
+    assert provider.calls == 1
+    second = store.get_history(["AAA", "BBB"], start)
+    assert provider.calls == 1
+    pd.testing.assert_frame_equal(first["AAA"], second["AAA"])
+    assert not store.missing_ranges("AAA", int(start), int(NOW) - 3 * DAY)
+
+
+def test_only_the_gap_is_fetched_when_the_range_grows(tmp_path):
+    provider = FakeMarketProvider(clock=lambda: NOW)
+    store = _store(tmp_path, provider, lambda: NOW)
+    store.get_history(["AAA"], NOW - 30 * DAY)
+    bars_before = provider.bars
+
+    frames = store.get_history(["AAA"], NOW - 60 * DAY)
+    assert provider.calls == 2
+    # Roughly one month of weekday bars, not two
+    assert provider.bars - bars_before < 30
+    assert frames["AAA"].index.min() <= pd.Timestamp(NOW - 58 * DAY, unit="s", tz="UTC")
+    assert frames["AAA"].index.is_monotonic_increasing and frames["AAA"].index.is_unique
+
+
+def test_missing_ticker_is_backed_off(tmp_path):
+    clock = _Clock(NOW)
+    provider = _DroppingProvider(clock, missing={"GONE"})
+    store = _store(tmp_path, provider, clock)
+    start = NOW - 30 * DAY
+
+    assert store.get_history(["AAA", "GONE"], start)["GONE"].empty
+    store.get_history(["AAA", "GONE"], start)
+    assert provider.requested == [["AAA", "GONE"]]
+    assert store.stale(["AAA", "GONE"], "1d") and not store.stale(["AAA"], "1d")
+
+    clock.now += FAILURE_BACKOFF
+    store.get_history(["GONE"], start)
+    assert provider.requested[-1] == ["GONE"]
+
+    # Second miss in a row: the wait doubles
+    clock.now += FAILURE_BACKOFF
+    store.get_history(["GONE"], start)
+    assert len(provider.requested) == 2
+
+    provider.missing.clear()
+    clock.now += FAILURE_BACKOFF
+    assert not store.get_history(["GONE"], start)["GONE"].empty
+    assert ("GONE", "1d") not in store._failures
+    assert not store.stale(["GONE"], "1d")
+
+
+def test_failed_fetch_is_stale_until_it_succeeds(tmp_path):
+    provider = FakeMarketProvider(clock=lambda: NOW)
+    store = _store(tmp_path, provider, lambda: NOW)
+    history = provider.history
+    provider.history = lambda *args: (_ for _ in ()).throw(ConnectionError("reset"))
+    assert store.get_history(["AAA"], NOW - 30 * DAY, interval="1w")["AAA"].empty
+    assert store.stale(["AAA"], "1wk")
+
+    provider.history = history
+    assert not store.get_history(["AAA"], NOW - 30 * DAY, interval="1w")["AAA"].empty
+    assert not store.stale(["AAA"], "1w")
+
+
+def test_offline_serves_cache_only(tmp_path):
+    provider = FakeMarketProvider(clock=lambda: NOW)
+    store = _store(tmp_path, provider, lambda: NOW)
+    assert store.get_history(["AAA"], NOW - 30 * DAY, offline=True)["AAA"].empty
+    assert provider.calls == 0
+
+
+def test_period_start():
+    now = pd.Timestamp("2024-06-14 21:00", tz="UTC")
+    assert period_start("ytd", now.timestamp()) == pd.Timestamp("2024-01-01", tz="UTC").timestamp()
+    assert period_start("1mo", now.timestamp()) == pd.Timestamp("2024-05-14 21:00", tz="UTC").timestamp()
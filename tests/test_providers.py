@@ -0,0 +1,156 @@
+import threading
+
+import pandas as pd
+import pytest
+import yfinance
+
+from utils.providers import COLUMNS, CoalescingProvider, MarketDataProvider, ProviderError, RateBudget, \
+    TransientError, YFinanceProvider
+
+
+class _Backend(MarketDataProvider):
+    """Records every batch it is asked for; `hook` runs first (block, raise...)"""
+
+    def __init__(self, hook=None):
+        self.batches = []
+        self.hook = hook
+
+    def history(self, tickers, start, end, interval):
+        self.batches.append(list(tickers))
+        if self.hook:
+            self.hook()
+        return {t: pd.DataFrame(columns=COLUMNS) for t in tickers}
+
+    def quotes(self, tickers):
+        self.batches.append(list(tickers))
+        return {t: 1.0 for t in tickers}, {}
+
+    def info(self, ticker):
+        return {}
+
+
+class _Budget(RateBudget):
+    def __init__(self, **kwargs):
+        self.now, self.slept = 0.0, []
+        super().__init__(clock=lambda: self.now, sleep=self.slept.append, **kwargs)
+
+
+def test_budget_allows_a_burst_then_paces():
+    budget = _Budget(rate=2.0, burst=3)
+    for _ in range(3):
+        budget.take()
+    assert budget.slept == []
+    budget.take()
+    assert budget.slept == [0.5]
+    budget.now += 10
+    budget.take(2)
+    assert budget.slept == [0.5]
+    assert budget.taken == 6
+
+
+def test_yfinance_charges_one_token_per_ticker_request(monkeypatch):
+    class _Ticker:
+        def __init__(self, ticker):
+            self.ticker = ticker
+
+        def history(self, **kwargs):
+            return pd.DataFrame({c: [1.0] for c in COLUMNS}, index=pd.DatetimeIndex(["2024-06-14"], tz="UTC"))
+
+    monkeypatch.setattr(yfinance, "Ticker", _Ticker)
+    budget = _Budget(burst=100)
+    frames = YFinanceProvider(budget).history(["AAA", "BBB", "CCC"], 0, 86400, "1d")
+    assert sorted(frames) == ["AAA", "BBB", "CCC"]
+    assert budget.taken == 3
+
+
+def _missing(ticker, **kwargs):
+    return yfinance.exceptions.YFPricesMissingError(ticker, kwargs.pop("debug_info", " (1d 2024-06-01 -> 2024-06-14)"), **kwargs)
+
+
+FAILURES = {
+    "NONE": _missing("NONE"),
+    "GONE": _missing("GONE", yahoo_reason="No data found, symbol may be delisted"),
+    "HTTP": _missing("HTTP", debug_info=" (1d 2024-06-01 -> 2024-06-14)(Yahoo status_code = 502)"),
+    "CHART": _missing("CHART", yahoo_reason="Internal error, try again later"),
+    "TZ": yfinance.exceptions.YFTzMissingError("TZ"),
+}
+
+
+def test_only_a_no_data_answer_becomes_an_empty_frame(monkeypatch):
+    calls = []
+
+    class _Ticker:
+        def __init__(self, ticker):
+            self.ticker = ticker
+
+        def history(self, **kwargs):
+            calls.append(kwargs)
+            if self.ticker in FAILURES:
+                raise FAILURES[self.ticker]
+            return pd.DataFrame({c: [1.0] for c in COLUMNS}, index=pd.DatetimeIndex(["2024-06-14"], tz="UTC"))
+
+    monkeypatch.setattr(yfinance, "Ticker", _Ticker)
+    provider = YFinanceProvider(_Budget(burst=100))
+    frames = provider.history(["AAA"] + list(FAILURES), 0, 86400, "1d")
+    # Upstream errors leave the ticker out, so the price store keeps its gap open
+    assert sorted(frames) == ["AAA", "GONE", "NONE"]
+    assert frames["GONE"].empty and frames["NONE"].empty
+    assert all("raise_errors" not in kwargs for kwargs in calls)
+    assert yfinance.config.debug.hide_exceptions is False
+
+    with pytest.raises(TransientError):
+        provider.history(["HTTP", "CHART"], 0, 86400, "1d")
+
+
+def test_concurrent_requests_share_one_upstream_call():
+    backend = _Backend()
+    provider = CoalescingProvider(backend, batch_window=0.05)
+    results = []
+    threads = [threading.Thread(target=lambda ts=ts: results.append(provider.history(ts, 0, 1, "1d")))
+               for ts in (["AAA", "BBB"], ["BBB", "CCC"])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(backend.batches) == 1
+    assert sorted(backend.batches[0]) == ["AAA", "BBB", "CCC"]
+    assert sorted(sorted(r) for r in results) == [["AAA", "BBB"], ["BBB", "CCC"]]
+
+
+def test_transient_failures_are_retried():
+    failures = [TransientError("429"), OSError("reset")]
+
+    def flaky():
+        if failures:
+            raise failures.pop(0)
+
+    backend = _Backend(hook=flaky)
+    provider = CoalescingProvider(backend, batch_window=0, sleep=lambda s: None)
+    assert list(provider.history(["AAA"], 0, 1, "1d")) == ["AAA"]
+    assert len(backend.batches) == 3
+
+
+def test_permanent_failure_is_not_retried():
+    def broken():
+        raise ValueError("bad request")
+
+    backend = _Backend(hook=broken)
+    provider = CoalescingProvider(backend, batch_window=0, sleep=lambda s: None)
+    with pytest.raises(ProviderError):
+        provider.history(["AAA"], 0, 1, "1d")
+    assert len(backend.batches) == 1
+
+
+def test_hung_upstream_times_out_as_provider_error():
+    release = threading.Event()
+    backend = _Backend(hook=lambda: release.wait(5))
+    provider = CoalescingProvider(backend, batch_window=0, timeout=0.1)
+    try:
+        with pytest.raises(ProviderError, match="timed out"):
+            provider.history(["AAA"], 0, 1, "1d")
+        # The hung flight is not joined by the next caller
+        with pytest.raises(ProviderError):
+            provider.history(["AAA"], 0, 1, "1d")
+        assert len(backend.batches) == 2
+    finally:
+        release.set()
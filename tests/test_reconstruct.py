@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.analytics import reconstruct_portfolio
+
+
+def _reference(trades_df, history):
+    """The per-bar loop reconstruct_portfolio replaced: every trade at or before the bar, replayed"""
+    times = pd.to_datetime(trades_df['created_at'])
+    if history.index.tz is not None and times.dt.tz is None:
+        times = times.dt.tz_localize(history.index.tz)
+    elif history.index.tz is None and times.dt.tz is not None:
+        times = times.dt.tz_localize(None)
+
+    rows = []
+    for date in history.index:
+        relevant = trades_df[(times <= date).to_numpy()]
+        if relevant.empty:
+            continue
+        holdings, cost = {}, 0.0
+        for _, trade in relevant.iterrows():
+            qty, price = float(trade['quantity']), float(trade['price'])
+            sign = {"Buy": 1.0, "Sell": -1.0}.get(trade['action'], 0.0)
+            holdings[trade['ticker']] = holdings.get(trade['ticker'], 0.0) + sign * qty
+            cost += sign * qty * price
+        value = 0.0
+        for sym, shares in holdings.items():
+            if shares > 0 and sym in history.columns and pd.notna(history.loc[date, sym]):
+                value += shares * history.loc[date, sym]
+        pct = 0.0 if cost == 0 else (value - cost) / cost * 100
+        rows.append({"Date": date, "Portfolio Value": value, "Cost Basis": cost, "Return %": pct})
+    return pd.DataFrame(rows)
+
+
+BARS = pd.date_range("2024-01-02 09:30", periods=6, freq="h", tz="America/New_York")
+HISTORY = pd.DataFrame({"AAA": [10.0, 11.0, np.nan, 12.0, 13.0, 14.0],
+                        "BBB": [50.0, 49.0, 48.0, 47.0, 46.0, 45.0]}, index=BARS)
+
+
+def _trades(*rows):
+    return pd.DataFrame(rows, columns=["ticker", "action", "quantity", "price", "created_at"])
+
+
+CASES = {
+    # On a bar: counts from that bar; between bars: from the next one
+    "on_and_between_bars": _trades(("AAA", "Buy", 5, 10.0, "2024-01-02T09:30:00-05:00"),
+                                   ("BBB", "Buy", 2, 49.0, "2024-01-02T10:45:00-05:00")),
+    # Oversold: negative shares are not valued (but still move the cost basis)
+    "oversold": _trades(("AAA", "Buy", 5, 10.0, "2024-01-02T09:00:00-05:00"),
+                        ("AAA", "Sell", 8, 12.0, "2024-01-02T12:30:00-05:00")),
+    # Unknown action and a ticker without prices
+    "ignored_rows": _trades(("AAA", "Buy", 1, 10.0, "2024-01-02T09:30:00-05:00"),
+                            ("AAA", "Dividend", 3, 1.0, "2024-01-02T10:30:00-05:00"),
+                            ("ZZZ", "Buy", 4, 5.0, "2024-01-02T11:30:00-05:00")),
+    # After the last bar: no rows at all
+    "after_last_bar": _trades(("AAA", "Buy", 1, 10.0, "2024-01-03T09:30:00-05:00")),
+    # Naive trades against the tz-aware index are read as index-local wall time
+    "naive_trades": _trades(("AAA", "Buy", 2, 10.0, "2024-01-02 10:30:00"),
+                            ("BBB", "Buy", 1, 50.0, "2024-01-02 09:00:00")),
+}
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_matches_the_per_bar_loop(name):
+    trades = CASES[name]
+    expected = _reference(trades, HISTORY)
+    result = reconstruct_portfolio(trades, HISTORY)
+    if expected.empty:
+        assert result.empty
+    else:
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_aware_trades_against_a_naive_index():
+    history = HISTORY.tz_localize(None)
+    trades = _trades(("AAA", "Buy", 2, 10.0, "2024-01-02T10:30:00-05:00"))
+    pd.testing.assert_frame_equal(reconstruct_portfolio(trades, history), _reference(trades, history), check_dtype=False)
+    assert reconstruct_portfolio(trades, history)["Date"].iloc[0] == pd.Timestamp("2024-01-02 10:30")
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_trades_match_the_per_bar_loop(seed):
+    rng = np.random.default_rng(seed)
+    n = 12
+    offsets = pd.to_timedelta(rng.integers(-60, 6 * 60, n), unit="min")
+    trades = pd.DataFrame({
+        "ticker": rng.choice(["AAA", "BBB", "CCC"], n),
+        "action": rng.choice(["Buy", "Buy", "Sell"], n),
+        "quantity": rng.integers(1, 10, n),
+        "price": rng.uniform(5, 60, n).round(2),
+        "created_at": [(BARS[0] + o).isoformat() for o in offsets],
+    })
+    pd.testing.assert_frame_equal(reconstruct_portfolio(trades, HISTORY), _reference(trades, HISTORY), check_dtype=False)
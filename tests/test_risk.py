@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.risk import flow_adjusted_returns, history_returns, periods_per_year, risk_metrics, rolling_risk
+
+
+def _frame(columns, n=250, seed=3):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2023-01-02", periods=n, freq="B")
+    return pd.DataFrame(rng.normal(0.0005, 0.01, (n, len(columns))), index=index, columns=columns)
+
+
+def test_matches_per_series_pandas_formulas():
+    returns = _frame(["a", "b", "bench"])
+    returns.iloc[:40, 1] = np.nan  # b starts later
+    bench = returns["bench"]
+    table = risk_metrics(returns, bench, periods=252)
+
+    for col in returns.columns:
+        r = returns[col].dropna()
+        assert table.loc[col, "Volatility %"] == pytest.approx(r.std() * np.sqrt(252) * 100)
+        assert table.loc[col, "Sharpe"] == pytest.approx(r.mean() / r.std() * np.sqrt(252))
+        downside = np.sqrt((np.minimum(r, 0) ** 2).mean())
+        assert table.loc[col, "Sortino"] == pytest.approx(r.mean() / downside * np.sqrt(252))
+        both = pd.concat([r, bench], axis=1, join="inner")
+        assert table.loc[col, "Beta"] == pytest.approx(both.cov().iloc[0, 1] / both.iloc[:, 1].var())
+        assert table.loc[col, "Correlation"] == pytest.approx(both.corr().iloc[0, 1])
+        growth = (1 + r).cumprod()
+        assert table.loc[col, "Max Drawdown %"] == pytest.approx(((growth / growth.cummax()) - 1).min() * 100)
+
+    assert table.loc["bench", "Beta"] == pytest.approx(1.0)
+
+
+def test_short_series_get_no_ratios():
+    returns = _frame(["a", "b"], n=10)
+    returns.iloc[:8, 0] = np.nan
+    table = risk_metrics(returns, returns["b"])
+    assert np.isnan(table.loc["a", "Sharpe"]) and np.isnan(table.loc["a", "Beta"])
+    assert not np.isnan(table.loc["b", "Sharpe"])
+
+
+def test_deposits_are_not_returns():
+    # 1000 invested, +10%, then 1000 more deposited, then flat
+    values = np.array([[1000.0], [1100.0], [2100.0], [2100.0]])
+    cost = np.array([[1000.0], [1000.0], [2000.0], [2000.0]])
+    returns = flow_adjusted_returns(values, cost, np.ones(values.shape, dtype=bool))[:, 0]
+    assert np.isnan(returns[0])
+    assert returns[1:] == pytest.approx([0.1, 0.0, 0.0])
+
+
+def test_history_returns_for_portfolios_and_benchmarks():
+    dates = pd.date_range("2024-01-02", periods=3, freq="B")
+    portfolio = pd.DataFrame({"Date": dates, "Portfolio Value": [100.0, 110.0, 99.0], "Cost Basis": [100.0] * 3})
+    assert history_returns(portfolio).iloc[1:].tolist() == pytest.approx([0.1, -0.1])
+    benchmark = pd.DataFrame({"Date": dates, "Return %": [0.0, 10.0, -1.0]})
+    assert history_returns(benchmark).iloc[1:].tolist() == pytest.approx([0.1, -0.1])
+
+
+def test_rolling_risk_matches_the_full_window_at_the_end():
+    returns = _frame(["a", "bench"], n=21)
+    volatility, beta = rolling_risk(returns, returns["bench"], window=21)
+    full = risk_metrics(returns, returns["bench"])
+    assert volatility["a"].iloc[-1] == pytest.approx(full.loc["a", "Volatility %"])
+    assert beta["a"].iloc[-1] == pytest.approx(full.loc["a", "Beta"])
+
+
+def test_periods_per_year():
+    assert periods_per_year("1d") == 252
+    assert periods_per_year("5m") == pytest.approx(252 * 78)
+    assert periods_per_year("1w") == pytest.approx(52.18, abs=0.01)
@@ -0,0 +1,66 @@
+import io
+
+import pytest
+
+import utils.importer as importer
+from utils.symbols import Symbol, SymbolIndex, is_valid_symbol, load_universe, normalize
+
+
+@pytest.fixture(scope="module")
+def index():
+    return load_universe()
+
+
+@pytest.mark.parametrize("typed, expected", [
+    ("brk.b", "BRK-B"),
+    ("BF/B", "BF-B"),
+    (" nvda ", "NVDA"),
+    ("VWRL.L", "VWRL.L"),
+    ("VOD.L", "VOD.L"),
+    ("SHOP.TO", "SHOP.TO"),
+    ("GC=F", "GC=F"),
+    ("eurusd=x", "EURUSD=X"),
+    ("^GSPC", "^GSPC"),
+    ("BTC-USD", "BTC-USD"),
+])
+def test_normalize(typed, expected):
+    assert normalize(typed) == expected
+
+
+@pytest.mark.parametrize("symbol", ["AAPL", "BRK-B", "SPY", "BTC-USD", "^GSPC"])
+def test_listed_symbols_are_valid(index, symbol):
+    assert is_valid_symbol(symbol, index) is True
+
+
+@pytest.mark.parametrize("symbol", ["VFIAX", "FXAIX", "VTSAX", "SWPPX", "GC=F", "EURUSD=X", "VWRL.L", "SHOP.TO"])
+def test_unlisted_symbols_are_unverified_not_rejected(index, symbol):
+    assert is_valid_symbol(normalize(symbol), index) is None
+
+
+@pytest.mark.parametrize("text", ["", "NOT A TICKER", "TOOLONGSYMBOL", "$$$"])
+def test_malformed_text_is_invalid(index, text):
+    assert is_valid_symbol(normalize(text), index) is False
+
+
+def test_search_ranks_exact_then_prefix_then_name():
+    small = SymbolIndex([Symbol("AAPL", "Apple Inc.", "NASDAQ"), Symbol("AAP", "Advance Auto Parts", "NYSE"),
+                         Symbol("APLE", "Apple Hospitality REIT", "NYSE")])
+    assert [s.symbol for s in small.search("AAP")] == ["AAP", "AAPL"]
+    assert [s.symbol for s in small.search("apple")] == ["AAPL", "APLE"]
+    assert small.fuzzy("APPL")[0] == "AAPL"
+
+
+def test_import_keeps_unlisted_symbols_as_unverified(monkeypatch, index):
+    monkeypatch.setattr(importer, "get_symbol_index", lambda: index)
+    csv = io.StringIO(
+        "Date,Symbol,Action,Quantity,Price\n"
+        "01/02/2024,VFIAX,Buy,1,400\n"
+        "01/02/2024,VWRL.L,Buy,2,90\n"
+        "01/02/2024,GC=F,Buy,1,2000\n"
+        "01/02/2024,AAPL,Buy,1,180\n"
+        "01/02/2024,NOT A TICKER,Buy,1,1\n"
+    )
+    plan = importer.plan_import(csv, "user0")
+    assert [t["ticker"] for t in plan["trades"]] == ["VFIAX", "VWRL.L", "GC=F", "AAPL"]
+    assert plan["unverified"] == {"VFIAX", "VWRL.L", "GC=F"}
+    assert plan["error_count"] == 1
@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+import utils.analytics as analytics
+import utils.db as db
+from benchmarks.fakes import FakeSupabase, synthetic_trades
+from benchmarks.run import NOW, Harness
+from utils.writes import WriteQueue
+
+# created_at the fake server stamps on new rows (a few sessions back, so daily bars follow it)
+SERVER_TIME = pd.Timestamp(NOW - 3 * 86400, unit="s", tz="UTC").isoformat()
+
+
+class _Insert:
+    def __init__(self, client, table, rows):
+        self.client, self.table, self.rows = client, table, rows
+
+    def execute(self):
+        frame = self.client.tables[self.table]
+        next_id = int(frame["id"].max()) + 1 if not frame.empty else 1
+        rows = [{"created_at": SERVER_TIME, **row, "id": next_id + i} for i, row in enumerate(self.rows)]
+        self.client.tables[self.table] = pd.concat([frame, pd.DataFrame(rows)], ignore_index=True)
+        return type("Response", (), {"data": rows})()
+
+
+class _WritableSupabase(FakeSupabase):
+    def table(self, name):
+        query = super().table(name)
+        query.upsert = lambda rows, **kwargs: _Insert(self, name, rows)
+        return query
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    Harness(tmp_path)
+    trades = synthetic_trades(40, 3, n_users=2, now=NOW).drop(columns="reasoning")
+    client = _WritableSupabase({"trades": trades})
+    monkeypatch.setattr(db, "init_supabase", lambda: client)
+    monkeypatch.setattr(db, "_update_ledger", lambda added=(), removed=(): None)
+    db._trade_write_versions().clear()
+    db._trades_watermark.clear()
+
+    monkeypatch.setattr(WriteQueue, "_start", lambda self: None)
+    queue = WriteQueue({"trade": db._write_trades, "delete_trade": db._delete_trades})
+    monkeypatch.setattr(db, "get_write_queue", lambda: queue)
+    return queue
+
+
+def test_version_moves_when_a_queued_write_lands(queue):
+    before, other, table = db.get_trades_version("user0"), db.get_trades_version("user1"), db.get_trades_version()
+    db.log_trade("user0", "T000", "Buy", 100.0, 5.0, "test")
+    # Still queued: nothing has changed on the server yet
+    assert db.get_trades_version("user0") == before
+
+    queue.flush()
+    after = db.get_trades_version("user0")
+    assert after != before
+    assert after[-2] != before[-2]  # the server watermark was re-read too
+    assert db.get_trades_version() != table
+    assert db.get_trades_version("user1")[1] == other[1]
+
+
+def test_histories_keyed_on_the_version_see_the_write(queue):
+    def history():
+        trades = pd.DataFrame(db.get_trades(user="user0", columns=db.HISTORY_COLUMNS))
+        return analytics.get_portfolio_history(trades, "1mo", "1d", version=db.get_trades_version("user0"))
+
+    before = history()
+    assert history()["Cost Basis"].iloc[-1] == before["Cost Basis"].iloc[-1]
+    db.log_trade("user0", "T000", "Buy", 100.0, 5.0, "test")
+    queue.flush()
+    assert history()["Cost Basis"].iloc[-1] == pytest.approx(before["Cost Basis"].iloc[-1] + 500.0)
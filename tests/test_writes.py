@@ -0,0 +1,156 @@
+import pytest
+from postgrest.exceptions import APIError
+
+import utils.db as db
+from utils.writes import MAX_ATTEMPTS, RETRY_BASE, WriteQueue, permanent
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _api_error(code, message="error"):
+    return APIError({"code": code, "message": message})
+
+
+def _queue(handler, monkeypatch):
+    # Driven by flush() from the test, not by the background thread
+    monkeypatch.setattr(WriteQueue, "_start", lambda self: None)
+    clock = _Clock()
+    return WriteQueue({"trade": handler}, clock=clock), clock
+
+
+@pytest.mark.parametrize("exc, expected", [
+    (_api_error("23505", "duplicate key"), True),
+    (_api_error("PGRST204", "column not found"), True),
+    (_api_error(400), True),
+    (_api_error(429), False),
+    (_api_error(502), False),
+    (_api_error("503"), False),
+    (_api_error("PGRST003", "pool timeout"), False),
+    (_api_error("57014", "statement timeout"), False),
+    (_api_error("40001", "serialization failure"), False),
+    (_api_error("08006", "connection failure"), False),
+    (ConnectionError("reset"), False),
+])
+def test_permanent(exc, expected):
+    assert permanent(exc) is expected
+
+
+def test_transient_failures_back_off_then_fail(monkeypatch):
+    calls = []
+
+    def handler(ops):
+        calls.append(len(ops))
+        raise _api_error(503)
+
+    queue, clock = _queue(handler, monkeypatch)
+    key = queue.submit("trade", "user0", {"ticker": "AAA"})
+    queue.flush()
+    assert queue.pending()[0]["due"] == clock.now + RETRY_BASE
+    # Not due yet: nothing is sent
+    assert queue.flush() == 0
+    for _ in range(MAX_ATTEMPTS - 1):
+        clock.now += 60
+        queue.flush()
+    assert len(calls) == MAX_ATTEMPTS
+    assert [op["key"] for op in queue.failed()] == [key]
+    assert queue.notices("user0")[0]["ok"] is False
+
+
+def test_refused_batch_is_split_to_find_the_bad_row(monkeypatch):
+    batches = []
+
+    def handler(ops):
+        batches.append([op["data"]["ticker"] for op in ops])
+        if any(op["data"]["ticker"] == "BAD" for op in ops):
+            raise _api_error("23514", "check constraint")
+
+    queue, _ = _queue(handler, monkeypatch)
+    for ticker in ("AAA", "BAD", "CCC"):
+        queue.submit("trade", "user0", {"ticker": ticker})
+    queue.flush()
+    queue.flush()
+    assert batches == [["AAA", "BAD", "CCC"], ["AAA"], ["BAD"], ["CCC"]]
+    assert [op["data"]["ticker"] for op in queue.failed()] == ["BAD"]
+    assert not queue.pending()
+    assert sorted((n["label"], n["ok"]) for n in queue.notices("user0")) == [(None, False), (None, True), (None, True)]
+
+
+def test_coalesced_edits_merge_into_one_write(monkeypatch):
+    sent = []
+    queue, _ = _queue(lambda ops: sent.extend(op["data"] for op in ops), monkeypatch)
+    first = queue.submit("trade", "user0", {"full_name": "A", "password": "x"}, coalesce=True)
+    second = queue.submit("trade", "user0", {"full_name": "B"}, coalesce=True)
+    assert first == second
+    queue.flush()
+    assert sent == [{"full_name": "B", "password": "x"}]
+
+
+class _Query:
+    def __init__(self, rows, error=None):
+        self.rows, self.error = rows, error
+
+    def execute(self):
+        if self.error is not None:
+            raise self.error
+        return type("Response", (), {"data": [dict(row, id=i) for i, row in enumerate(self.rows, start=1)]})()
+
+
+class _Table:
+    def __init__(self, client):
+        self.client = client
+
+    def upsert(self, rows, on_conflict=None, ignore_duplicates=False):
+        self.client.calls.append(("upsert", rows))
+        if not self.client.has_client_key:
+            return _Query(rows, _api_error("42P10", "there is no unique or exclusion constraint matching the ON CONFLICT specification"))
+        return _Query(rows)
+
+    def insert(self, rows, **kwargs):
+        self.client.calls.append(("insert", rows))
+        return _Query(rows)
+
+
+class _Supabase:
+    def __init__(self, has_client_key):
+        self.has_client_key = has_client_key
+        self.calls = []
+
+    def table(self, name):
+        return _Table(self)
+
+
+@pytest.fixture
+def supabase(monkeypatch):
+    def install(has_client_key):
+        client = _Supabase(has_client_key)
+        monkeypatch.setattr(db, "init_supabase", lambda: client)
+        monkeypatch.setattr(db, "_client_keys", True)
+        monkeypatch.setattr(db, "_bump_trades_version", lambda user=None: None)
+        monkeypatch.setattr(db, "_update_ledger", lambda added=(), removed=(): None)
+        return client
+    return install
+
+
+def _ops():
+    return [{"key": "k1", "user": "user0", "data": {"user_name": "user0", "ticker": "AAA"}}]
+
+
+def test_trades_upsert_on_client_key(supabase):
+    client = supabase(has_client_key=True)
+    db._write_trades(_ops())
+    assert client.calls == [("upsert", [{"user_name": "user0", "ticker": "AAA", "client_key": "k1"}])]
+
+
+def test_trades_fall_back_to_plain_inserts_without_client_key(supabase):
+    client = supabase(has_client_key=False)
+    db._write_trades(_ops())
+    db._write_trades(_ops())
+    # The upsert is only tried once; the key isn't sent to a table without the column
+    assert [kind for kind, _ in client.calls] == ["upsert", "insert", "insert"]
+    assert client.calls[1][1] == [{"user_name": "user0", "ticker": "AAA"}]
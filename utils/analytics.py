@@ -1,44 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
-import yfinance as yf
 import streamlit as st
+from utils.compact import CompactFrame
+from utils.compute import rank_users_parallel
+from utils.market_calendar import data_end, freshness
+from utils.perf import Uncached, cache_resource
+from utils.price_store import get_store, period_start, SESSION_PERIODS, INTRADAY_LOOKBACK
+from utils.providers import COLUMNS
+from utils.risk import RISK_BENCHMARK, RISK_COLUMNS, flow_adjusted_returns, periods_per_year, price_returns, risk_metrics
+from utils.snapshots import FILL_LOOKBACK, get_snapshots
+
+# Cached results are CompactFrames in cache_resource: one float32/epoch-int64 copy per key,
+# shared by every session, instead of a pickled float64 frame per st.cache_data entry.
+# Money totals stay float64 (float32 would drop cents on six-figure portfolios), and so do
+# the OHLCV bars: float32 rounds volumes above 2**24 and the last digits of prices.
+MONEY_COLUMNS = ("Portfolio Value", "Cost Basis")
+BAR_COLUMNS = tuple(COLUMNS)
+
+# Cached results are keyed on a market_calendar.freshness() token instead of a fixed ttl:
+# it moves every *_REFRESH seconds while the tickers trade and stands still while they're
+# closed, so nights and weekends are served from cache. max_entries bounds the old tokens.
+LIVE_REFRESH = 300     # price / portfolio / benchmark paths
+SUMMARY_REFRESH = 3600 # bulk returns and the leaderboard
+
+# Daily histories read end-of-day rows from utils.snapshots and replay only the bars after them.
+# Weekly ones replay the weekly bars (from the first trade on, see _replay_history).
+SNAPSHOT_INTERVALS = {"1d"}
+
+# Intraday histories are extended in place instead of recomputed (see _incremental_history)
+INCREMENTAL_REFRESH = 30  # seconds between looks for new bars
+INCREMENTAL_STATES = 256  # series kept in memory per process
+PENDING_COLUMNS = ["ticker", "action", "price", "quantity", "created_at"]
+
+def load_closes(tickers, period="1d", interval="5m"):
+    """Close prices (bars x tickers) from the local price store"""
+    return _closes_frame(get_store().get_period(tickers, period, interval))
+
+def _closes_frame(frames):
+    closes = {t: f['Close'] for t, f in frames.items() if not f.empty}
+    if not closes:
+        return pd.DataFrame()
+    return pd.DataFrame(closes)
 
-@st.cache_data(ttl=300) # Cache 5 mins for live-ish data
-def get_portfolio_history(trades_df, period="1d", interval="5m"):
+def get_price_history(ticker, period="1d", interval="5m"):
+    """OHLCV bars for a single ticker (Research page)"""
+    return _price_history(ticker, period, interval, freshness([ticker], LIVE_REFRESH)).to_frame()
+
+@cache_resource(max_entries=512)
+def _price_history(ticker, period, interval, fresh):
+    store = get_store()
+    bars = CompactFrame(store.get_period([ticker], period, interval)[ticker], exact=BAR_COLUMNS)
+    if store.stale([ticker], interval):
+        raise Uncached(bars)
+    return bars
+
+def trades_fingerprint(trades_df):
+    """Fallback cache key when the caller has no version token from utils.db"""
+    if trades_df.empty:
+        return ()
+    return (len(trades_df), int(pd.util.hash_pandas_object(trades_df, index=False).sum()))
+
+def get_portfolio_history(trades_df, period="1d", interval="5m", version=None):
     """
     Reconstructs the portfolio value over time.
     Supports intraday intervals (5m, 15m) for the 'Live' feel.
+    Pass version (utils.db.get_trades_version) so the cache keys on that token
+    instead of hashing the whole trades frame on every call.
     """
+    if version is None:
+        version = trades_fingerprint(trades_df)
+    if interval in INTRADAY_LOOKBACK and period in SESSION_PERIODS:
+        return _incremental_history(trades_df, version, period, interval)
+    fresh = freshness(trades_df['ticker'].unique() if not trades_df.empty else [], LIVE_REFRESH)
+    return _portfolio_history(trades_df, version, period, interval, fresh).to_frame()
+
+@cache_resource(max_entries=256)
+def _portfolio_history(_trades_df, version, period, interval, fresh):
+    if interval in SNAPSHOT_INTERVALS:
+        history = _snapshot_history(_trades_df, period, interval)
+    else:
+        history = _replay_history(_trades_df, period, interval)
+    history = CompactFrame(history, time_col="Date", exact=MONEY_COLUMNS)
+    # Served around a failed fetch: recomputed on the next call instead of pinned under the token
+    if not _trades_df.empty and get_store().stale(_trades_df['ticker'].unique(), interval):
+        raise Uncached(history)
+    return history
+
+def _replay_history(trades_df, period, interval):
     if trades_df.empty:
         return pd.DataFrame()
 
     tickers = trades_df['ticker'].unique().tolist()
     
-    # 1. Download Data with specific interval
-    try:
-        data = yf.download(tickers, period=period, interval=interval, progress=False, group_by='ticker')
-    except:
-        return pd.DataFrame()
-
-    # 2. Extract Close Prices
-    history = pd.DataFrame()
-    if len(tickers) == 1:
-        t = tickers[0]
-        if 'Close' in data.columns:
-            history[t] = data['Close']
-        else:
-            try:
-                history[t] = data.iloc[:, 3] 
-            except:
-                pass
+    # 1 + 2. Close prices with specific interval (local store, only missing bars are downloaded)
+    if period in SESSION_PERIODS:
+        history = load_closes(tickers, period=period, interval=interval)
     else:
-        for t in tickers:
-            try:
-                if (t, 'Close') in data.columns:
-                    history[t] = data[(t, 'Close')]
-                elif t in data.columns and 'Close' in data[t].columns:
-                     history[t] = data[t]['Close']
-            except:
-                pass
+        # Bars before the first trade are never active: skip reading them ('max' goes back to 1970)
+        store = get_store()
+        first = pd.to_datetime(trades_df['created_at'], utc=True, format="ISO8601").min().timestamp()
+        start = max(period_start(period, store.clock()), int(first) - FILL_LOOKBACK)
+        history = _closes_frame(store.get_history(tickers, start, interval=interval))
 
     # Forward fill to handle gaps in intraday data
     history = history.ffill()
@@ -48,83 +114,160 @@ def get_portfolio_history(trades_df, period="1d", interval="5m"):
         return pd.DataFrame()
 
     # 3. Reconstruct Portfolio
-    portfolio_history = []
-    
-    # Pre-process trades: Ensure timestamps are timezone-aware if history is
-    trades_df['created_at'] = pd.to_datetime(trades_df['created_at'])
-    
-    # Check if history index is timezone aware
-    is_tz_aware = history.index.tz is not None
-    
-    for date in history.index:
-        # Align Timezones
-        current_ts = date
-        if is_tz_aware and trades_df['created_at'].dt.tz is None:
-             # Localize trades if they aren't but history is
-             trade_dates = trades_df['created_at'].dt.tz_localize(date.tz)
-        elif not is_tz_aware and trades_df['created_at'].dt.tz is not None:
-             # Naive history, strip trade tz
-             trade_dates = trades_df['created_at'].dt.tz_localize(None)
-        else:
-             trade_dates = trades_df['created_at']
-
-        # Filter trades that happened BEFORE this timestamp
-        mask = trade_dates <= current_ts
-        relevant_trades = trades_df[mask]
-        
-        if relevant_trades.empty:
-            continue
+    return reconstruct_portfolio(trades_df, history)
 
-        holdings = {}
-        cost_basis = 0.0
-        
-        for _, trade in relevant_trades.iterrows():
-            qty = float(trade['quantity'])
-            price = float(trade['price'])
-            sym = trade['ticker']
-            
-            if sym not in holdings: holdings[sym] = 0.0
-            
-            if trade['action'] == "Buy":
-                holdings[sym] += qty
-                cost_basis += (qty * price)
-            elif trade['action'] == "Sell":
-                holdings[sym] -= qty
-                cost_basis -= (qty * price)
-
-        # Calculate Value
-        daily_val = 0.0
-        for sym, shares in holdings.items():
-            if shares > 0:
-                price_now = 0
-                # Try to get price at this specific minute
-                if sym in history.columns:
-                    val = history.loc[date, sym]
-                    if pd.notna(val):
-                        price_now = val
-                
-                daily_val += shares * price_now
-        
-        # Avoid division by zero
-        if cost_basis == 0:
-            pct = 0.0
-        else:
-            pct = ((daily_val - cost_basis) / cost_basis) * 100
-
-        portfolio_history.append({
-            "Date": date,
-            "Portfolio Value": daily_val,
-            "Cost Basis": cost_basis,
-            "Return %": pct
-        })
+def _snapshot_history(trades_df, period, interval):
+    """
+    One user's long-range daily history: stored end-of-day rows for the settled sessions, plus a
+    replay of the bars after the last snapshot (today's forming bar).
+    """
+    users = trades_df['user_name'].unique() if 'user_name' in trades_df.columns else []
+    if len(users) != 1:
+        return _replay_history(trades_df, period, interval)
+    user = users[0]
+
+    snapshots = get_snapshots()
+    through = snapshots.sync(trades_df).get(user)
+    start = period_start(period, snapshots.clock())
+    stored = snapshots.history(user, start)
 
-    return pd.DataFrame(portfolio_history)
+    # Tail: closes from a little before the last snapshot, so forward-filling has a previous close
+    tail_from = through if through is not None else start - 1
+    tickers = trades_df['ticker'].unique().tolist()
+    closes = _closes_frame(get_store().get_history(tickers, max(start, tail_from) - FILL_LOOKBACK, interval="1d"))
+    tail = pd.DataFrame()
+    if not closes.empty:
+        closes = closes.ffill()
+        closes = closes[closes.index.as_unit("s").asi8 > max(tail_from, start - 1)]
+        if not closes.empty:
+            tail = reconstruct_portfolio(trades_df, closes)
+
+    if stored.empty:
+        history = tail
+    elif tail.empty:
+        history = stored
+    else:
+        tail["Date"] = tail["Date"].dt.tz_convert(stored["Date"].dt.tz)
+        history = pd.concat([stored, tail], ignore_index=True)
+
+    return history
+
+@st.cache_resource
+def _intraday_states():
+    """Last computed intraday series per (trades version, period, interval), shared across sessions"""
+    return {"lock": threading.Lock(), "states": OrderedDict()}
+
+def _incremental_history(trades_df, version, period, interval):
+    """
+    Intraday portfolio history that only appends bars newer than the last one computed.
+    The holdings and cost basis at the last bar are kept with the series, along with the
+    trades dated after it (they count from the first bar at or after them, as in the full
+    replay). A new trades version or a new session date falls back to a full recompute.
+    """
+    if trades_df.empty:
+        return pd.DataFrame()
+
+    cache = _intraday_states()
+    key = (version, period, interval)
+    with cache["lock"]:
+        state = cache["states"].get(key)
+
+    now = time.time()
+    tickers = trades_df['ticker'].unique().tolist()
+    # Checked recently, or already checked after the close: nothing new to look for
+    if state is not None and (now - state["checked"] < INCREMENTAL_REFRESH or state["checked"] >= data_end(tickers, now)):
+        return state["history"].to_frame()
+
+    if state is not None:
+        state = _extend_state(state, tickers, interval, now)
+    if state is None:
+        state = _full_state(trades_df, tickers, period, interval, now)
+        if state is None:
+            return pd.DataFrame()
+
+    with cache["lock"]:
+        cache["states"][key] = state
+        cache["states"].move_to_end(key)
+        while len(cache["states"]) > INCREMENTAL_STATES:
+            cache["states"].popitem(last=False)
+    return state["history"].to_frame()
+
+def _full_state(trades_df, tickers, period, interval, now):
+    closes = load_closes(tickers, period=period, interval=interval).ffill()
+    if closes.empty:
+        return None
+    history = reconstruct_portfolio(trades_df, closes)
+    if history.empty:
+        return None
+
+    last_bar = closes.index[-1:]
+    ranks = np.searchsorted(last_bar.as_unit("ns").asi8, _trade_times(trades_df['created_at'], last_bar), side='left')
+    done = ranks == 0
+    return {
+        "history": CompactFrame(history, time_col="Date", exact=MONEY_COLUMNS),
+        "closes": closes.iloc[-1:],
+        "holdings": net_shares(trades_df[done]).reindex(closes.columns, fill_value=0.0),
+        "cost": history["Cost Basis"].iloc[-1],
+        # Trades after the last bar (e.g. logged a few minutes ago) land on a later bar
+        "pending": trades_df.loc[~done, PENDING_COLUMNS],
+        "checked": now,
+    }
+
+def _extend_state(state, tickers, interval, now):
+    """New bars since the last one, valued with the saved holdings; None if a full recompute is needed"""
+    last_closes = state["closes"]
+    last_ts = last_closes.index[-1]
+    frames = get_store().get_history(tickers, start=int(last_ts.timestamp()), interval=interval)
+    fresh = _closes_frame(frames)
+    if fresh.empty:
+        return dict(state, checked=now)
+
+    fresh = fresh.reindex(columns=last_closes.columns)
+    # The last stored bar may have been partial: its refetched value replaces it
+    closes = pd.concat([last_closes, fresh])
+    closes = closes[~closes.index.duplicated(keep='last')].sort_index().ffill()
+
+    # New session date -> the window moves; recompute from scratch
+    if closes.index[-1].date() != last_ts.date():
+        return None
+
+    new = closes[closes.index >= last_ts]
+    n_bars = len(new)
+
+    # Pending trades count from the first new bar at or after them
+    pending = state["pending"]
+    ranks = np.searchsorted(new.index.as_unit("ns").asi8, _trade_times(pending['created_at'], new.index), side='left')
+    signed, cash = _signed_flows(pending)
+    columns = new.columns.get_indexer(pending['ticker'])
+    known = columns >= 0
+    shares = state["holdings"].to_numpy() + _accumulate(ranks[known], columns[known], signed[known], n_bars, len(new.columns))
+    cost = state["cost"] + _accumulate(ranks, np.zeros(len(pending), dtype=np.intp), cash, n_bars, 1)[:, 0]
+
+    values = (new.fillna(0.0).to_numpy() * np.where(shares > 0, shares, 0.0)).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct = np.where(cost != 0, (values - cost) / cost * 100, 0.0)
+    rows = pd.DataFrame({"Date": new.index, "Portfolio Value": values, "Cost Basis": cost, "Return %": pct})
+
+    history = state["history"].to_frame()
+    history = pd.concat([history[history["Date"] < last_ts], rows], ignore_index=True)
+    history = CompactFrame(history, time_col="Date", exact=MONEY_COLUMNS)
+    return dict(state, history=history, closes=closes.iloc[-1:], checked=now,
+                holdings=pd.Series(shares[-1], index=new.columns), cost=cost[-1],
+                pending=pending[ranks >= n_bars])
 
-@st.cache_data(ttl=300)
 def get_benchmark_history(ticker, period="1d", interval="5m"):
+    """% return path of a single ticker (Date, Return %)"""
+    return _benchmark_history(ticker, period, interval, freshness([ticker], LIVE_REFRESH)).to_frame()
+
+@cache_resource(max_entries=256)
+def _benchmark_history(ticker, period, interval, fresh):
+    return CompactFrame(_benchmark_returns(ticker, period, interval), time_col="Date")
+
+def _benchmark_returns(ticker, period, interval):
     try:
-        data = yf.Ticker(ticker).history(period=period, interval=interval)['Close']
+        data = load_closes([ticker], period=period, interval=interval)
         if data.empty: return pd.DataFrame()
+        data = data[ticker].dropna()
         
         start = data.iloc[0]
         normalized = ((data - start) / start) * 100
@@ -134,31 +277,287 @@ def get_benchmark_history(ticker, period="1d", interval="5m"):
     except:
         return pd.DataFrame()
 
-@st.cache_data(ttl=3600)
 def get_bulk_history(tickers, period="1mo"):
     """Fetches simple % return history for a list of tickers (Users or ETFs)"""
+    return _bulk_history(tuple(tickers), period, freshness(tickers, SUMMARY_REFRESH)).to_frame()
+
+@cache_resource(max_entries=64)
+def _bulk_history(tickers, period, fresh):
+    return CompactFrame(_bulk_returns(list(tickers), period))
+
+def _bulk_returns(tickers, period):
     if not tickers:
         return pd.DataFrame()
     
     try:
         # Fetch all at once
-        data = yf.download(tickers, period=period, progress=False)['Close']
+        data = load_closes(tickers, period=period, interval="1d")
         
-        # Clean up if single ticker
-        if len(tickers) == 1:
-            data = data.to_frame(name=tickers[0])
-            
         # Calculate % Return ((Current - Start) / Start)
-        results = []
-        for t in tickers:
-            if t in data.columns:
-                series = data[t].dropna()
-                if not series.empty:
-                    start = series.iloc[0]
-                    end = series.iloc[-1]
-                    pct = ((end - start) / start) * 100
-                    results.append({"Name": t, "Return %": pct})
+        results = _simple_returns(data, tickers)
         
         return pd.DataFrame(results)
-    except Exception as e:
+    except Exception:
+        return pd.DataFrame()
+
+def _simple_returns(closes, tickers):
+    """[{Name, Return %}] from first to last close of each ticker"""
+    results = []
+    for t in tickers:
+        if t in closes.columns:
+            series = closes[t].dropna()
+            if not series.empty:
+                start = series.iloc[0]
+                end = series.iloc[-1]
+                pct = ((end - start) / start) * 100
+                results.append({"Name": t, "Return %": pct})
+    return results
+
+def get_leaderboard_returns(trades_df, etfs, period="1mo", version=None):
+    """
+    Latest Return % for every user in trades_df plus every ETF, from one shared price pass.
+    The union of all held tickers and the ETFs is loaded once, and every user's
+    portfolio is reconstructed against that same price matrix in a single grouped replay.
+    Returns a frame with Name (username or ETF ticker), Type, Return % and the
+    utils.risk.RISK_COLUMNS (vs SPY) computed over the same bars.
+    """
+    if version is None:
+        version = trades_fingerprint(trades_df)
+    held = trades_df['ticker'].unique().tolist() if not trades_df.empty else []
+    fresh = freshness(held + list(etfs), SUMMARY_REFRESH)
+    return _leaderboard_returns(trades_df, version, tuple(etfs), period, fresh).to_frame()
+
+@cache_resource(max_entries=64)
+def _leaderboard_returns(_trades_df, version, etfs, period, fresh):
+    return CompactFrame(_rank_returns(_trades_df, etfs, period))
+
+def _rank_returns(trades_df, etfs, period):
+    if trades_df.empty and not etfs:
+        return pd.DataFrame()
+
+    held = trades_df['ticker'].unique().tolist() if not trades_df.empty else []
+    tickers = list(dict.fromkeys(held + list(etfs) + [RISK_BENCHMARK]))
+
+    closes = load_closes(tickers, period=period, interval="1d")
+    if closes.empty:
+        return pd.DataFrame()
+
+    benchmark = price_returns(closes[RISK_BENCHMARK]) if RISK_BENCHMARK in closes else pd.Series(np.nan, index=closes.index)
+    periods = periods_per_year("1d")
+    ranked = []
+
+    # A. Users: settled bars from the end-of-day snapshots, grouped replays of the rest over the
+    # shared matrix (chunks of users across the compute pool at scale)
+    if held:
+        snapshots = get_snapshots()
+        snapshots.sync(trades_df)
+        history = closes.reindex(columns=held).ffill()
+        ranked.append(rank_users_parallel(trades_df, history, benchmark, periods, snapshots=snapshots))
+
+    # B. ETFs: simple return over the same bars
+    etf_rows = _simple_returns(closes, etfs)
+    if etf_rows:
+        names = [row["Name"] for row in etf_rows]
+        risk = risk_metrics(price_returns(closes[names]), benchmark, periods=periods)
+        etf_rows = pd.DataFrame([{"Name": n, "Type": "ETF", "Return %": row["Return %"]} for n, row in zip(names, etf_rows)])
+        ranked.append(pd.concat([etf_rows, risk.reset_index(drop=True)], axis=1))
+
+    ranked = [frame for frame in ranked if not frame.empty]
+    if not ranked:
+        return pd.DataFrame()
+    return pd.concat(ranked, ignore_index=True)
+
+def rank_users(trades_df, history, benchmark, periods, snapshots=None):
+    """
+    Return % and RISK_COLUMNS for every user in trades_df, from one grouped replay over a
+    ffilled (bars x tickers) close frame. Rows follow each user's first appearance in trades_df.
+    snapshots: a SnapshotStore to read the settled bars from (see portfolio_matrix).
+    """
+    groups, values, cost, active = portfolio_matrix(trades_df, history, snapshots)
+    user_returns = flow_adjusted_returns(values, cost, active)
+    results = []
+    kept = []
+    for g, user in enumerate(groups):
+        rows = np.flatnonzero(active[:, g])
+        if not len(rows):
+            continue
+        last_value, last_cost = values[rows[-1], g], cost[rows[-1], g]
+        pct = (last_value - last_cost) / last_cost * 100 if last_cost != 0 else 0.0
+        results.append({"Name": user, "Type": "User", "Return %": pct})
+        kept.append(g)
+    if not results:
+        return pd.DataFrame(columns=["Name", "Type", "Return %"] + RISK_COLUMNS)
+
+    # Risk for every user in one pass over the aligned return matrix
+    risk = risk_metrics(pd.DataFrame(user_returns[:, kept], index=history.index), benchmark, periods=periods)
+    return pd.concat([pd.DataFrame(results), risk.reset_index(drop=True)], axis=1)
+
+
+def _signed_flows(trades_df):
+    """(shares, cash) per trade: positive for Buys, negative for Sells, 0 for anything else"""
+    qty = pd.to_numeric(trades_df['quantity'], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+    price = pd.to_numeric(trades_df['price'], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+    sign = trades_df['action'].map({"Buy": 1.0, "Sell": -1.0}).fillna(0.0).to_numpy(dtype=float)
+    return sign * qty, sign * qty * price
+
+def net_shares(trades_df):
+    """Net shares per ticker after every trade (short/oversold tickers included, as negatives)"""
+    if trades_df.empty:
+        return pd.Series(dtype=float)
+    signed, _ = _signed_flows(trades_df)
+    return pd.Series(signed, index=trades_df.index).groupby(trades_df['ticker']).sum()
+
+def append_live_value(history, holdings, board):
+    """Adds a 'now' row to a portfolio history, valued at the quote board prices"""
+    if history.empty or holdings.empty:
+        return history
+    prices = pd.Series({t: q["price"] for t, q in board.items() if t in holdings.index})
+    if not holdings.index.isin(prices.index).all():
+        return history
+
+    last = history.iloc[-1]
+    now = pd.Timestamp.now(tz=last["Date"].tz)
+    if now <= last["Date"]:
+        return history
+
+    value = float((holdings.reindex(prices.index) * prices).sum())
+    cost = last["Cost Basis"]
+    pct = ((value - cost) / cost) * 100 if cost != 0 else 0.0
+    live = pd.DataFrame([{"Date": now, "Portfolio Value": value, "Cost Basis": cost, "Return %": pct}])
+    return pd.concat([history, live], ignore_index=True)
+
+def _trade_times(created_at, index):
+    """
+    Trade timestamps as int64 ns on the same clock as the price index.
+    Naive trades are localized to the index tz; aware trades against a naive index
+    are stripped to wall time (same rules the old per-bar loop used).
+    """
+    ts = pd.to_datetime(created_at)
+    if index.tz is not None:
+        ts = ts.dt.tz_localize(index.tz) if ts.dt.tz is None else ts.dt.tz_convert(index.tz)
+    elif ts.dt.tz is not None:
+        ts = ts.dt.tz_localize(None)
+    return ts.dt.as_unit("ns").astype("int64").to_numpy()
+
+def _accumulate(bar_rank, codes, weights, n_bars, n_codes):
+    """
+    Running total of `weights` per code, as of every bar.
+    A trade with bar_rank r counts towards bar r and every bar after it.
+    """
+    grid = np.zeros((n_bars + 1, n_codes))
+    np.add.at(grid, (bar_rank, codes), weights)
+    return grid.cumsum(axis=0)[:-1]
+
+def reconstruct_portfolio(trades_df, history, group_col=None):
+    """
+    Vectorized replay of trades against a (bars x tickers) close-price frame.
+
+    Holdings and cost basis are built once as cumulative sums and aligned to the
+    price index with searchsorted, so the cost is O(bars x tickers) array work
+    instead of replaying every trade on every bar.
+
+    With group_col (e.g. 'user_name') every group is reconstructed in the same pass
+    and the result gets an extra column with the group label.
+    """
+    if trades_df.empty or history.empty:
         return pd.DataFrame()
+
+    index = history.index
+    groups, values, cost, active = replay_matrix(trades_df, history, group_col)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct = np.where(cost != 0, (values - cost) / cost * 100, 0.0)
+
+    frames = []
+    for g, label in enumerate(groups):
+        rows = active[:, g]
+        frame = pd.DataFrame({
+            "Date": index[rows],
+            "Portfolio Value": values[rows, g],
+            "Cost Basis": cost[rows, g],
+            "Return %": pct[rows, g],
+        })
+        if group_col is not None:
+            frame.insert(1, group_col, label)
+        frames.append(frame)
+
+    return pd.concat(frames, ignore_index=True)
+
+def portfolio_matrix(trades_df, history, snapshots=None):
+    """
+    replay_matrix(trades_df, history, group_col='user_name'), with each user's bars up to their
+    last end-of-day snapshot read from the store; only the bars after it are replayed.
+    """
+    if snapshots is None:
+        return replay_matrix(trades_df, history, group_col='user_name')
+    groups = list(pd.unique(trades_df['user_name']))  # same order as replay_matrix's factorize
+    through = snapshots.through(groups)
+    if not through:
+        return replay_matrix(trades_df, history, group_col='user_name')
+
+    ts = history.index.as_unit("s").asi8
+    values = np.zeros((len(ts), len(groups)))
+    cost = np.zeros((len(ts), len(groups)))
+    active = np.zeros((len(ts), len(groups)), dtype=bool)
+    bounds = np.array([through.get(user, np.iinfo(np.int64).min) for user in groups])
+
+    # 1. Settled bars: the last stored row at or before each bar (holidays carry the previous close)
+    if len(ts):
+        rows = snapshots.rows(through, ts[0] - FILL_LOOKBACK)
+        for user, positions in rows.groupby("user_name", sort=False).indices.items():
+            g = groups.index(user)
+            stored = rows["ts"].to_numpy()[positions]
+            bars = np.flatnonzero(ts <= bounds[g])
+            at = np.searchsorted(stored, ts[bars], side="right") - 1
+            bars, at = bars[at >= 0], positions[at[at >= 0]]
+            values[bars, g] = rows["value"].to_numpy()[at]
+            cost[bars, g] = rows["cost"].to_numpy()[at]
+            active[bars, g] = True
+
+    # 2. The rest: one grouped replay from the earliest unsnapshotted bar on
+    tail = ts > bounds.min()
+    if tail.any():
+        _, tail_values, tail_cost, tail_active = replay_matrix(trades_df, history[tail], group_col='user_name')
+        fresh = ts[tail][:, None] > bounds[None, :]
+        values[tail] = np.where(fresh, tail_values, values[tail])
+        cost[tail] = np.where(fresh, tail_cost, cost[tail])
+        active[tail] = np.where(fresh, tail_active, active[tail])
+    return groups, values, cost, active
+
+def replay_matrix(trades_df, history, group_col=None):
+    """
+    The arrays behind reconstruct_portfolio: (groups, values, cost, active), each
+    (bars x groups). active is False before a group's first trade.
+    """
+    index = history.index
+    bar_times = index.as_unit("ns").asi8
+    n_bars = len(index)
+
+    signed, cash = _signed_flows(trades_df)
+
+    # First bar at or after each trade -> the trade counts from that bar onwards
+    bar_rank = np.searchsorted(bar_times, _trade_times(trades_df['created_at'], index), side='left')
+
+    if group_col is None:
+        group_codes = np.zeros(len(trades_df), dtype=np.intp)
+        groups = [None]
+    else:
+        group_codes, groups = pd.factorize(trades_df[group_col])
+
+    # Holdings per (group, ticker) pair
+    pair_codes, pairs = pd.factorize(pd.MultiIndex.from_arrays([group_codes, trades_df['ticker'].to_numpy()]))
+    shares = _accumulate(bar_rank, pair_codes, signed, n_bars, len(pairs))
+
+    # Prices per pair (ffilled closes, missing -> 0, same as before)
+    closes = history.reindex(columns=pairs.get_level_values(1)).to_numpy(dtype=float)
+    closes = np.nan_to_num(closes, nan=0.0)
+    pair_values = np.where(shares > 0, shares, 0.0) * closes
+
+    # Roll pairs up to their group
+    pair_group = pairs.get_level_values(0).to_numpy()
+    values = np.zeros((n_bars, len(groups)))
+    np.add.at(values.T, pair_group, pair_values.T)
+
+    cost = _accumulate(bar_rank, group_codes, cash, n_bars, len(groups))
+    active = _accumulate(bar_rank, group_codes, np.ones(len(trades_df)), n_bars, len(groups)) > 0
+    return list(groups), values, cost, active
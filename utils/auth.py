@@ -1,5 +1,4 @@
 import streamlit as st
-from utils.db import get_users
 
 def check_login():
     if "authenticated" not in st.session_state:
@@ -12,9 +11,11 @@ def check_login():
             username = st.text_input("Username").lower().strip()
             password = st.text_input("Password", type="password")
             if st.form_submit_button("Log In"):
-                users = get_users()
+                from utils.db import get_user  # deferred: the form renders without Supabase
+
                 # Find user
-                valid_user = next((u for u in users if u['username'] == username and u['password'] == password), None)
+                found = get_user(username) if username else None
+                valid_user = found if found and found['password'] == password else None
                 if valid_user:
                     st.session_state["authenticated"] = True
                     st.session_state["user"] = valid_user
@@ -24,3 +25,13 @@ def check_login():
         st.stop()
     
     return st.session_state["user"]
+
+def is_admin(user):
+    """Admins are flagged in the users table (is_admin) or listed in secrets ADMIN_USERS"""
+    if user.get("is_admin"):
+        return True
+    try:
+        admins = st.secrets.get("ADMIN_USERS", [])
+    except Exception:
+        admins = []
+    return user.get("username") in admins
@@ -0,0 +1,80 @@
+import base64
+import hashlib
+import io
+from pathlib import Path
+
+from utils.db import download_blob, get_users, set_user_avatar, upload_blob
+from utils.perf import cache_data
+
+# Avatars live in a Supabase Storage bucket; users.avatar_url only holds a reference to them
+BUCKET = "avatars"
+REF_PREFIX = "storage:"
+
+THUMB_SIZE = 256  # px square, shown at 120px
+MAX_UPLOAD = 10_000_000  # raw upload; only the thumbnail is stored
+
+CACHE_DIR = Path(".cache") / "avatars"
+DEFAULT_AVATAR = "https://www.gravatar.com/avatar/00000000000000000000000000000000?d=mp&f=y"
+
+def make_thumbnail(data, size=THUMB_SIZE):
+    """Square, center-cropped JPEG thumbnail of an uploaded image"""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img = ImageOps.fit(img, (size, size), Image.Resampling.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, "JPEG", quality=85, optimize=True)
+    return out.getvalue()
+
+def _cache_path(path):
+    return CACHE_DIR / path.replace("/", "__")
+
+def upload_avatar(username, data):
+    """
+    Stores a thumbnail of the upload in the bucket and returns the reference to save in users.avatar_url.
+    Paths are content-addressed, so a stored thumbnail never changes and can be cached forever.
+    """
+    thumb = make_thumbnail(data)
+    path = f"{username}/{hashlib.sha256(thumb).hexdigest()[:16]}.jpg"
+    upload_blob(BUCKET, path, thumb, "image/jpeg")
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    _cache_path(path).write_bytes(thumb)
+    return REF_PREFIX + path
+
+@cache_data(max_entries=256)
+def get_thumbnail(path):
+    """Thumbnail bytes: memory, then the local disk cache, then the bucket (None if missing)"""
+    cached = _cache_path(path)
+    if cached.exists():
+        return cached.read_bytes()
+    try:
+        data = download_blob(BUCKET, path)
+    except Exception:
+        return None
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    cached.write_bytes(data)
+    return data
+
+def avatar_src(avatar_url):
+    """<img src> for a users.avatar_url value: bucket references become a small inline thumbnail"""
+    if not avatar_url:
+        return DEFAULT_AVATAR
+    if not avatar_url.startswith(REF_PREFIX):
+        return avatar_url  # external URL, or a legacy inline data URL not migrated yet
+    thumb = get_thumbnail(avatar_url[len(REF_PREFIX):])
+    if thumb is None:
+        return DEFAULT_AVATAR
+    return "data:image/jpeg;base64," + base64.b64encode(thumb).decode()
+
+def migrate_inline_avatars():
+    """One-off: moves legacy base64 avatars out of the users table into the bucket. Returns how many moved."""
+    moved = 0
+    for u in get_users(columns=["username", "avatar_url"]):
+        url = u.get("avatar_url") or ""
+        if url.startswith("data:") and "," in url:
+            data = base64.b64decode(url.split(",", 1)[1])
+            set_user_avatar(u["username"], upload_avatar(u["username"], data))
+            moved += 1
+    return moved
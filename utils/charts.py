@@ -0,0 +1,48 @@
+import numpy as np
+import plotly.graph_objects as go
+
+# Charts span the wide layout (~1400px); two points per pixel column is already more than a line can show
+CHART_WIDTH = 1400
+PX_PER_POINT = 2
+
+def target_points(width=CHART_WIDTH):
+    return max(2, width // PX_PER_POINT)
+
+def downsample_index(y, n):
+    """
+    Positions to keep so a line of len(y) points looks the same drawn with about n.
+    Min/max bucketing: every bucket keeps its lowest and highest point (so all peaks and
+    troughs survive), plus the first and last points. Returns sorted positions.
+    """
+    y = np.asarray(y, dtype=float)
+    size = len(y)
+    if size <= n:
+        return np.arange(size)
+
+    buckets = max(1, (n - 2) // 2)
+    width = -(-size // buckets)  # ceil
+    padded = np.full(buckets * width, np.nan)
+    padded[:size] = y
+    rows = padded.reshape(buckets, width)
+
+    # NaNs (gaps, padding) never win a bucket
+    lo = np.where(np.isnan(rows), np.inf, rows).argmin(axis=1)
+    hi = np.where(np.isnan(rows), -np.inf, rows).argmax(axis=1)
+    offsets = np.arange(buckets) * width
+
+    keep = np.concatenate(([0, size - 1], offsets + lo, offsets + hi))
+    return np.unique(keep[keep < size])
+
+def _take(values, positions):
+    if hasattr(values, "iloc"):
+        return values.iloc[positions]
+    if hasattr(values, "take"):
+        return values.take(positions)
+    return np.asarray(values)[positions]
+
+def scatter(x, y, points=None, **kwargs):
+    """go.Scatter with x/y downsampled to the chart's point budget (short series pass through)"""
+    positions = downsample_index(y, points or target_points())
+    if len(positions) < len(y):
+        x, y = _take(x, positions), _take(y, positions)
+    return go.Scatter(x=x, y=y, **kwargs)
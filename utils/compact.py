@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+def _frozen(values):
+    values = np.ascontiguousarray(values)
+    values.setflags(write=False)
+    return values
+
+class CompactFrame:
+    """
+    Read-only, compact copy of a result frame for process-wide caches.
+
+    - timestamps (DatetimeIndex or a datetime column) as int64 epoch seconds + tz name
+    - integer columns as int64
+    - float columns as float32, except the ones listed in `exact` (money totals, OHLCV bars keep float64);
+      float32 is only for derived series (returns, chart values) that don't need more than ~7 digits
+    - text columns as categoricals
+
+    One instance is shared by every session that hits the same cache key; to_frame() builds a
+    DataFrame over the same arrays without copying them. The arrays are read-only, so in-place
+    writes on that frame raise instead of leaking into other sessions (assigning new columns is fine).
+    """
+
+    def __init__(self, frame, time_col=None, exact=()):
+        self.order = list(frame.columns)
+        self.time_col = time_col
+        self.epoch = None
+        self.tz = None
+        self.index_name = None
+
+        times = None
+        if time_col is not None and time_col in frame.columns:
+            times = pd.DatetimeIndex(frame[time_col])
+        elif time_col is None and isinstance(frame.index, pd.DatetimeIndex):
+            times = frame.index
+            self.index_name = times.name
+        if times is not None:
+            self.tz = str(times.tz) if times.tz is not None else None
+            self.epoch = _frozen(times.as_unit("s").asi8)
+
+        self.columns = {}
+        for col in self.order:
+            if col == time_col:
+                continue
+            series = frame[col]
+            if pd.api.types.is_integer_dtype(series) and not series.hasnans:
+                self.columns[col] = _frozen(series.to_numpy(np.int64))
+            elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                self.columns[col] = _frozen(series.to_numpy(np.float64 if col in exact else np.float32))
+            else:
+                self.columns[col] = pd.Categorical(series)
+
+    def __len__(self):
+        if self.epoch is not None:
+            return len(self.epoch)
+        return len(next(iter(self.columns.values()), []))
+
+    @property
+    def nbytes(self):
+        total = 0 if self.epoch is None else self.epoch.nbytes
+        for values in self.columns.values():
+            total += values.nbytes
+        return total
+
+    def _times(self):
+        times = pd.to_datetime(self.epoch, unit="s", utc=True)
+        return times.tz_convert(self.tz) if self.tz else times.tz_localize(None)
+
+    def to_frame(self):
+        if not self.order:
+            return pd.DataFrame()
+        data = dict(self.columns)
+        if self.epoch is None:
+            return pd.DataFrame(data, columns=self.order, copy=False)
+        if self.time_col is not None:
+            data[self.time_col] = self._times()
+            return pd.DataFrame(data, columns=self.order, copy=False)
+        return pd.DataFrame(data, index=self._times().rename(self.index_name), columns=self.order, copy=False)
@@ -0,0 +1,155 @@
+"""
+Compute scheduler: fans per-user analytics out to a process pool.
+
+The (bars x tickers) price matrix is copied once into a shared-memory block that every worker
+maps read-only; a task only carries its users' trades and the block's name, so a few hundred
+portfolios don't mean a pickled copy of the prices per task. Small jobs (a family, not a club)
+and single-core hosts run in-process, where starting work elsewhere costs more than it saves.
+"""
+import atexit
+import importlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_all_start_methods, get_context, shared_memory
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Below this many users one grouped replay in-process is faster than shipping chunks out
+POOL_MIN_USERS = 100
+
+# Chunks per worker, so one chunk of heavy traders doesn't leave the other cores idle
+TASKS_PER_WORKER = 2
+
+# Trade columns the workers need (no reasoning text)
+TASK_COLUMNS = ["user_name", "ticker", "action", "price", "quantity", "created_at"]
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool_workers():
+    """Worker processes to use: COMPUTE_WORKERS from secrets, else one per core (1 = no pool)"""
+    workers = None
+    try:
+        workers = st.secrets.get("COMPUTE_WORKERS")
+    except Exception:
+        pass
+    return max(1, int(workers or os.cpu_count() or 1))
+
+
+def get_pool():
+    """
+    The process-wide pool, or None when there's a single worker. Kept in a module global rather
+    than st.cache_resource: clearing that cache would orphan the worker processes.
+    """
+    global _pool
+    workers = pool_workers()
+    if workers < 2:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # forkserver: workers don't inherit the server's threads (poller, write queue) mid-lock
+            method = "forkserver" if "forkserver" in get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context(method))
+            # Start every worker and import the analytics stack now, not on the first leaderboard
+            for _ in range(workers):
+                _pool.submit(_warm)
+        return _pool
+
+
+def _warm():
+    """Worker start-up task: pays the pandas/streamlit import once per worker"""
+    importlib.import_module("utils.analytics")
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(_reset_pool)
+
+
+class SharedFrame:
+    """A float frame copied into shared memory once; workers map it from .spec with attach()"""
+
+    def __init__(self, frame):
+        values = np.ascontiguousarray(frame.to_numpy(dtype=float))
+        self._shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=self._shm.buf)[:] = values
+        self.spec = {"name": self._shm.name, "shape": values.shape, "index": frame.index, "columns": list(frame.columns)}
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(spec):
+    """(shared memory handle, read-only DataFrame over it) in a worker; close the handle when done"""
+    shm = shared_memory.SharedMemory(name=spec["name"])
+    values = np.ndarray(spec["shape"], dtype=float, buffer=shm.buf)
+    values.flags.writeable = False
+    return shm, pd.DataFrame(values, index=spec["index"], columns=spec["columns"], copy=False)
+
+
+def _rank_chunk(spec, trades_df, benchmark, periods, snapshot_path=None):
+    """Worker task: one chunk of users ranked against the shared close matrix"""
+    from utils.analytics import rank_users
+    from utils.snapshots import SnapshotStore
+
+    snapshots = SnapshotStore(snapshot_path) if snapshot_path is not None else None
+    shm, history = attach(spec)
+    try:
+        return rank_users(trades_df, history, pd.Series(benchmark, index=history.index), periods, snapshots)
+    finally:
+        del history
+        try:
+            shm.close()
+        except BufferError:
+            pass  # a view is still referenced (e.g. by a traceback); the mapping goes with the process
+
+
+def rank_users_parallel(trades_df, history, benchmark, periods, snapshots=None):
+    """
+    utils.analytics.rank_users over all users, split into chunks of users across the pool.
+    Users are independent, so the result (rows in order of each user's first trade) is the same
+    as one in-process call. Workers open the snapshot store's file themselves (it's SQLite).
+    """
+    from utils.analytics import rank_users
+
+    codes, users = pd.factorize(trades_df['user_name'])
+    pool = get_pool() if len(users) >= POOL_MIN_USERS else None
+    if pool is None:
+        return rank_users(trades_df, history, benchmark, periods, snapshots)
+
+    # Contiguous ranges of users (in first-trade order), so concatenating keeps the row order
+    n_tasks = min(len(users), pool_workers() * TASKS_PER_WORKER)
+    chunk = codes * n_tasks // len(users)
+    trades_df = trades_df[[c for c in TASK_COLUMNS if c in trades_df.columns]]
+    benchmark = benchmark.reindex(history.index).to_numpy(dtype=float)
+
+    with SharedFrame(history) as shared:
+        try:
+            snapshot_path = snapshots.path if snapshots is not None else None
+            futures = [pool.submit(_rank_chunk, shared.spec, trades_df[chunk == k], benchmark, periods, snapshot_path)
+                       for k in range(n_tasks)]
+            frames = [f.result() for f in futures]
+        except BrokenProcessPool:
+            # A worker died (OOM, killed): start a fresh pool next time, answer this one in-process
+            _reset_pool()
+            return rank_users(trades_df, history, pd.Series(benchmark, index=history.index), periods, snapshots)
+    frames = [f for f in frames if not f.empty] or frames[:1]
+    return pd.concat(frames, ignore_index=True)
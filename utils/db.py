@@ -1,16 +1,27 @@
 import streamlit as st
-from supabase import create_client, Client
+from utils.perf import cache_data, timed
 
-# Initialize connection once and cache it
+# Initialize connection once and cache it (on first use, not at import:
+# the login page shouldn't pay for the supabase package and client)
 @st.cache_resource
 def init_supabase():
+    from supabase import create_client
+
     url = st.secrets["SUPABASE_URL"]
     key = st.secrets["SUPABASE_KEY"]
     return create_client(url, key)
 
-supabase = init_supabase()
+def _execute(query, op):
+    """Every Supabase round trip goes through here so it shows up on the diagnostics page"""
+    with timed("calls", kind="supabase", name=op):
+        return query.execute()
 
-def log_trade(user, ticker, action, price, quantity, reasoning):
+def log_trade(user, ticker, action, price, quantity, reasoning, lot_ids=None):
+    """
+    Queues a trade insert and returns its write key right away (see get_write_queue).
+    lot_ids: for a Sell, the Buy trade ids to close first instead of FIFO
+    (stored in the trades.lot_ids int8[] column from migrations/, so only sent when given).
+    """
     data = {
         "user_name": user,
         "ticker": ticker,
@@ -19,24 +30,256 @@ def log_trade(user, ticker, action, price, quantity, reasoning):
         "quantity": quantity,
         "reasoning": reasoning
     }
-    supabase.table("trades").insert(data).execute()
+    if lot_ids:
+        data["lot_ids"] = list(lot_ids)
+    label = f"Logged {action} {quantity:.4f} shares of {ticker}"
+    return get_write_queue().submit("trade", user, data, label=label)
+
+INSERT_BATCH = 500  # rows per insert request (keeps each request body well under PostgREST limits)
+
+def insert_trades(rows, batch_size=INSERT_BATCH, progress=None):
+    """
+    Inserts many trades, batch_size rows per request (bulk import).
+    progress(done, total) is called after every batch. Returns the number of rows written.
+    """
+    from utils.ledger import get_ledger
+
+    rows = list(rows)
+    users = set()
+    done = 0
+    try:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            # returning=minimal: the server doesn't echo every row back
+            _execute(init_supabase().table("trades").insert(batch, returning="minimal"), "insert_trades")
+            users.update(r["user_name"] for r in batch)
+            done += len(batch)
+            if progress is not None:
+                progress(done, len(rows))
+    finally:
+        # Also after a failed batch: the ones before it are stored. Many (often backdated)
+        # trades, so the ledger reloads these users instead of replaying row by row
+        for user in users:
+            _bump_trades_version(user)
+            get_ledger().discard(user)
+    return done
+
+# Columns the portfolio/leaderboard analytics need (no reasoning text)
+HISTORY_COLUMNS = ["id", "user_name", "ticker", "action", "price", "quantity", "created_at"]
+
+PAGE_SIZE = 1000  # PostgREST caps a single response at 1000 rows by default
+
+def _iso(value):
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+def _trade_query(user=None, ticker=None, start=None, end=None, action=None, columns=None):
+    """Builds a trades select with every filter pushed down to Postgres"""
+    if columns:
+        # Keyset pagination needs the sort keys in every row
+        columns = list(dict.fromkeys(list(columns) + ["created_at", "id"]))
+    query = init_supabase().table("trades").select(",".join(columns) if columns else "*")
+
+    for field, value in (("user_name", user), ("ticker", ticker), ("action", action)):
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            query = query.in_(field, list(value))
+        else:
+            query = query.eq(field, value)
+
+    if start is not None:
+        query = query.gte("created_at", _iso(start))
+    if end is not None:
+        query = query.lte("created_at", _iso(end))
+    return query
 
-def get_trades():
-    response = supabase.table("trades").select("*").order("created_at", desc=True).execute()
-    return response.data
+def query_trades(user=None, ticker=None, start=None, end=None, action=None, columns=None,
+                 limit=PAGE_SIZE, after=None, desc=True):
+    """
+    One page of trades, filtered and projected on the server.
+    user/ticker/action take a value or a list. `after` is the (created_at, id) keyset
+    cursor of the last row of the previous page.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    query = _trade_query(user, ticker, start, end, action, columns)
 
-def get_users():
-    return supabase.table("users").select("*").execute().data
+    if after is not None:
+        ts, last_id = after
+        op = "lt" if desc else "gt"
+        query = query.or_(f'created_at.{op}."{ts}",and(created_at.eq."{ts}",id.{op}.{last_id})')
+
+    query = query.order("created_at", desc=desc).order("id", desc=desc).limit(limit)
+    rows = _execute(query, "query_trades").data
+
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = (rows[-1]["created_at"], rows[-1]["id"])
+    return rows, next_cursor
+
+def iter_trades(user=None, ticker=None, start=None, end=None, action=None, columns=None,
+                page_size=PAGE_SIZE, desc=True):
+    """Streams every matching trade, one keyset page at a time"""
+    cursor = None
+    while True:
+        rows, cursor = query_trades(user, ticker, start, end, action, columns,
+                                    limit=page_size, after=cursor, desc=desc)
+        yield from rows
+        if cursor is None:
+            break
+
+def get_trades(user=None, ticker=None, start=None, end=None, action=None, columns=None):
+    """All matching trades (newest first). With no filters this is the whole table."""
+    return list(iter_trades(user, ticker, start, end, action, columns))
+
+# What user lists (compare, leaderboard) need -- never the password or avatar payloads
+USER_COLUMNS = ["username", "full_name"]
+
+def get_users(columns=USER_COLUMNS):
+    return _execute(init_supabase().table("users").select(",".join(columns)), "get_users").data
+
+def get_user(username):
+    """One user row by username (primary key lookup), or None"""
+    rows = _execute(init_supabase().table("users").select("*").eq("username", username).limit(1), "get_user").data
+    return rows[0] if rows else None
 
 def update_user_profile(username, new_full_name, new_password, new_avatar_url):
-    """Updates the user's password, display name, and avatar"""
+    """Queues an update of the user's password, display name, and avatar (edits not sent yet are merged)"""
     data = {
         "full_name": new_full_name,
         "password": new_password,
         "avatar_url": new_avatar_url
     }
-    supabase.table("users").update(data).eq("username", username).execute()
+    return get_write_queue().submit("profile", username, data, label="Profile updated", coalesce=True)
+
+def set_user_avatar(username, avatar_url):
+    _execute(init_supabase().table("users").update({"avatar_url": avatar_url}).eq("username", username), "set_user_avatar")
+
+# --- Blob storage (Supabase Storage buckets) ---
+def upload_blob(bucket, path, data, content_type):
+    storage = init_supabase().storage.from_(bucket)
+    with timed("calls", kind="supabase", name="upload_blob"):
+        storage.upload(path, data, {"content-type": content_type, "cache-control": "31536000", "upsert": "true"})
+
+def download_blob(bucket, path):
+    storage = init_supabase().storage.from_(bucket)
+    with timed("calls", kind="supabase", name="download_blob"):
+        return storage.download(path)
+
+def delete_trade(trade_id, user=None):
+    """Queues the delete of a trade by ID (pass the owner so only their caches are invalidated)"""
+    return get_write_queue().submit("delete_trade", user, {"id": trade_id})
+
+# --- Write-behind queue (trade and profile writes leave the page right away) ---
+# The unique trades.client_key comes from migrations/001_trades_write_keys.sql. On a table that
+# doesn't have it yet, trades go out as plain inserts (a retried batch may then store a row twice).
+_client_keys = True
+
+def _missing_client_key(exc):
+    """The server refused the upsert because trades.client_key, or its unique index, doesn't exist"""
+    code = str(getattr(exc, "code", None))
+    message = str(getattr(exc, "message", None) or exc)
+    return code == "42P10" or (code in ("PGRST204", "42703") and "client_key" in message)
+
+def _store_trades(rows):
+    global _client_keys
+    if _client_keys:
+        query = init_supabase().table("trades").upsert(rows, on_conflict="client_key", ignore_duplicates=True)
+        try:
+            return _execute(query, "log_trade").data
+        except Exception as e:
+            if not _missing_client_key(e):
+                raise
+            _client_keys = False
+    rows = [{k: v for k, v in row.items() if k != "client_key"} for row in rows]
+    return _execute(init_supabase().table("trades").insert(rows), "log_trade").data
+
+def _write_trades(ops):
+    """
+    One upsert per column set (PostgREST bulk inserts need the same keys in every row).
+    The write key goes in trades.client_key (unique): a batch retried after a lost response
+    skips the rows that made it the first time.
+    """
+    groups = {}
+    for op in ops:
+        row = {**op["data"], "client_key": op["key"]}
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    stored = []
+    for rows in groups.values():
+        stored += _store_trades(rows)
+    for user in {op["user"] for op in ops}:
+        _bump_trades_version(user)
+    # Rows skipped as already stored aren't returned; the version bump makes the ledger resync for those
+    _update_ledger(added=stored)
+
+def _delete_trades(ops):
+    ids = [op["data"]["id"] for op in ops]
+    _execute(init_supabase().table("trades").delete().in_("id", ids), "delete_trade")
+    for user in {op["user"] for op in ops}:
+        _bump_trades_version(user)
+    _update_ledger(removed=ids)
+
+def _write_profiles(ops):
+    for op in ops:
+        _execute(init_supabase().table("users").update(op["data"]).eq("username", op["user"]), "update_user_profile")
+
+@st.cache_resource
+def get_write_queue():
+    """Process-wide write-behind queue for log_trade, delete_trade and update_user_profile"""
+    from utils.writes import WriteQueue
+
+    return WriteQueue({"trade": _write_trades, "delete_trade": _delete_trades, "profile": _write_profiles})
+
+def pending_trades(user):
+    """Trades a user logged that aren't stored yet (rows without an id), newest first"""
+    ops = get_write_queue().pending(user=user, kind="trade")
+    return [{**op["data"], "id": None, "created_at": None, "client_key": op["key"]} for op in reversed(ops)]
+
+def pending_deletes(user):
+    """Ids of trades a user deleted that are still queued for the server"""
+    return {op["data"]["id"] for op in get_write_queue().pending(user=user, kind="delete_trade")}
+
+def _update_ledger(added=(), removed=()):
+    """Keeps the process-wide lot ledger in step with our own writes (no reload needed)"""
+    from utils.ledger import get_ledger
+
+    ledger = get_ledger()
+    for row in added or ():
+        ledger.add(row)
+    for trade_id in removed:
+        ledger.remove(trade_id)
+
+# --- Trade versions (cheap cache keys for analytics) ---
+ALL_USERS = "*"
+UNKNOWN_USER = "?"
+
+@st.cache_resource
+def _trade_write_versions():
+    """Per-user write counters shared by every session in this process"""
+    return {}
+
+def _bump_trades_version(user=None):
+    versions = _trade_write_versions()
+    for key in (user or UNKNOWN_USER, ALL_USERS):
+        versions[key] = versions.get(key, 0) + 1
+
+@cache_data(ttl=60)
+def _trades_watermark(user, local_version):
+    """(max id, row count) of a user's trades -- catches writes from other processes"""
+    query = init_supabase().table("trades").select("id", count="exact")
+    if user is not None:
+        query = query.eq("user_name", user)
+    response = _execute(query.order("id", desc=True).limit(1), "trades_watermark")
+    return (response.data[0]["id"] if response.data else None, response.count)
 
-def delete_trade(trade_id):
-    """Deletes a specific trade by ID"""
-    supabase.table("trades").delete().eq("id", trade_id).execute()
+def get_trades_version(user=None):
+    """
+    Small token that changes whenever a user's trades change (user=None: the whole table).
+    Writes through log_trade/delete_trade bump it right away for the affected user;
+    the server watermark picks up anything written elsewhere within a minute.
+    """
+    versions = _trade_write_versions()
+    if user is None:
+        local = versions.get(ALL_USERS, 0)
+    else:
+        local = (versions.get(user, 0), versions.get(UNKNOWN_USER, 0))
+    return (user, local) + _trades_watermark(user, local)
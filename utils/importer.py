@@ -0,0 +1,267 @@
+"""
+Bulk trade import from broker CSV exports.
+
+The file is read one line at a time (csv module over a text stream), every ticker is checked
+against the local symbol universe (utils.symbols -- no network), rows already in the trades
+table or repeated in the file are dropped, and what's left goes to utils.db.insert_trades
+in batches.
+"""
+import csv
+import io
+import re
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, time as dtime, timezone
+from itertools import chain, islice
+
+import pandas as pd
+
+from utils.market_calendar import EASTERN
+from utils.symbols import get_symbol_index, is_valid_symbol, normalize
+
+FIELDS = ("date", "ticker", "action", "quantity", "price")
+
+# Normalized header (lower case, letters only) per field, best match first; covers the
+# common broker exports (Fidelity, Schwab, Vanguard, Robinhood, IBKR...)
+HEADER_ALIASES = {
+    "date": ["tradedate", "date", "rundate", "activitydate", "transactiondate", "datetime", "executiontime",
+             "filledat", "createdat", "time", "settledate"],
+    "ticker": ["symbol", "ticker", "securitysymbol", "instrument", "underlyingsymbol"],
+    "action": ["action", "side", "buysell", "transcode", "transactiontype", "activity", "type"],
+    "quantity": ["quantity", "qty", "shares", "filledqty", "units"],
+    "price": ["price", "fillprice", "tradeprice", "executionprice", "tprice", "avgprice", "averageprice"],
+}
+
+# Preamble lines some brokers put above the header (account name, export date...)
+HEADER_SEARCH_LINES = 25
+
+MAX_ERRORS = 100  # row errors kept for display; the rest are only counted
+
+# Dates without a time are taken as the session close, so the trade lands on that day's bar
+DEFAULT_TIME = dtime(16, 0)
+
+DATE_FORMATS = ("%m/%d/%Y", "%m/%d/%y", "%Y-%m-%d", "%m/%d/%Y %H:%M:%S", "%m/%d/%Y %I:%M:%S %p",
+                "%Y-%m-%d %H:%M:%S", "%Y%m%d", "%d-%b-%Y", "%b %d, %Y")
+
+_BUY = re.compile(r"\b(buy|bought|bot|reinvest\w*|purchase\w*)\b")
+_SELL = re.compile(r"\b(sell|sold|sld|sale)\b")
+_NUMBER = re.compile(r"[^0-9.\-]")
+
+
+def _header_key(text):
+    return re.sub(r"[^a-z]", "", (text or "").lower())
+
+
+def detect_columns(header):
+    """{field: column position} for every field a header row names"""
+    positions = {}
+    for position, name in enumerate(header):
+        positions.setdefault(_header_key(name), position)
+    columns = {}
+    for field, aliases in HEADER_ALIASES.items():
+        found = next((positions[a] for a in aliases if a in positions), None)
+        if found is not None:
+            columns[field] = found
+    return columns
+
+
+def _parse_number(text):
+    text = (text or "").strip()
+    negative = text.startswith("(") and text.endswith(")")
+    value = float(_NUMBER.sub("", text))
+    return -value if negative else value
+
+
+def _parse_action(text):
+    text = (text or "").lower()
+    if _SELL.search(text):
+        return "Sell"
+    if _BUY.search(text):
+        return "Buy"
+    return None
+
+
+class _DateParser:
+    """Broker date strings -> ISO timestamps; most files repeat dates, so results are memoized"""
+
+    def __init__(self):
+        self._seen = {}
+
+    def __call__(self, text):
+        text = (text or "").strip()
+        if text not in self._seen:
+            self._seen[text] = self._parse(text)
+        return self._seen[text]
+
+    def _parse(self, text):
+        # Fidelity/Schwab add notes after the date ("01/02/2024 as of 12/29/2023")
+        head = text.split(" as of ")[0].strip()
+        value = None
+        for fmt in DATE_FORMATS:
+            try:
+                value = datetime.strptime(head, fmt)
+                break
+            except ValueError:
+                continue
+        if value is None:
+            value = pd.Timestamp(head).to_pydatetime()  # ISO with offsets, other oddities
+        if value.tzinfo is None:
+            if value.time() == dtime(0) and ":" not in head:
+                value = datetime.combine(value.date(), DEFAULT_TIME)
+            value = value.replace(tzinfo=EASTERN)
+        return pd.Timestamp(value).tz_convert("UTC").isoformat()
+
+
+def _find_header(head):
+    """
+    Skips preamble lines (head: the file's first lines); returns (header fields, column map, lines used).
+    With no recognisable header, the first row with a cell per field is taken as the header
+    (columns then have to be mapped by hand).
+    """
+    fallback = None
+    for number, line in enumerate(head, start=1):
+        header = next(csv.reader([line]), [])
+        columns = detect_columns(header)
+        if {"ticker", "quantity", "price"} <= columns.keys():
+            return header, columns, number
+        if fallback is None and sum(1 for cell in header if cell.strip()) >= len(FIELDS):
+            fallback = (header, columns, number)
+    if fallback is None:
+        raise ValueError("Couldn't find a header row (a line naming date, symbol, action, quantity and price).")
+    return fallback
+
+
+def read_trades(stream, columns=None):
+    """
+    Streams (line number, trade dict or None, error or None) from a broker CSV.
+    stream: text file object. columns: {field: position} to override header detection.
+    Rows that aren't buys or sells (dividends, fees, transfers) come back as (n, None, None).
+    """
+    lines = iter(stream)
+    head = list(islice(lines, HEADER_SEARCH_LINES))
+    header, detected, line_no = _find_header(head)
+    lines = chain(head[line_no:], lines)
+    columns = {**detected, **(columns or {})}
+    missing = [f for f in FIELDS if f not in columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}. Found: {', '.join(h for h in header if h)}")
+
+    parse_date = _DateParser()
+    width = max(columns.values()) + 1
+    for line_no, row in enumerate(csv.reader(lines), start=line_no + 1):
+        if not any(cell.strip() for cell in row):
+            continue
+        if len(row) < width:
+            yield line_no, None, "Not a trade row (too few columns)"
+            continue
+        action = _parse_action(row[columns["action"]])
+        if action is None:
+            yield line_no, None, None
+            continue
+        try:
+            quantity = abs(_parse_number(row[columns["quantity"]]))
+            price = abs(_parse_number(row[columns["price"]]))
+        except ValueError:
+            yield line_no, None, "Quantity/price isn't a number"
+            continue
+        if quantity <= 0 or price <= 0:
+            yield line_no, None, "Quantity and price must be positive"
+            continue
+        try:
+            created_at = parse_date(row[columns["date"]])
+        except (ValueError, TypeError):
+            yield line_no, None, f"Unreadable date '{row[columns['date']]}'"
+            continue
+        trade = {
+            "ticker": normalize(row[columns["ticker"]]),
+            "action": action,
+            "price": price,
+            "quantity": quantity,
+            "created_at": created_at,
+        }
+        yield line_no, trade, None
+
+
+def trade_key(trade):
+    """Natural key used to spot a trade that's already stored (ids differ between exports)"""
+    created_at = trade["created_at"]
+    try:
+        ts = datetime.fromisoformat(created_at) if isinstance(created_at, str) else pd.Timestamp(created_at).to_pydatetime()
+    except ValueError:
+        ts = pd.Timestamp(created_at).to_pydatetime()
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return (trade["ticker"], trade["action"], int(ts.timestamp()),
+            round(float(trade["quantity"]), 6), round(float(trade["price"]), 4))
+
+
+def plan_import(stream, user, existing=(), reasoning="Imported", columns=None):
+    """
+    Parses and validates a whole file without writing anything.
+    existing: the user's stored trades (dicts), used to drop rows imported before. A row repeated
+    n times in the file is kept n times minus however many copies are already stored.
+    Returns {"trades", "duplicates", "skipped", "errors", "error_count", "unverified", "rows"}.
+    """
+    index = get_symbol_index()
+    stored = Counter(trade_key(t) for t in existing)
+    plan = {"trades": [], "duplicates": 0, "skipped": 0, "errors": [], "error_count": 0, "unverified": set(), "rows": 0}
+
+    def error(line_no, message):
+        plan["error_count"] += 1
+        if len(plan["errors"]) < MAX_ERRORS:
+            plan["errors"].append({"line": line_no, "error": message})
+
+    for line_no, trade, problem in read_trades(stream, columns):
+        plan["rows"] += 1
+        if problem:
+            error(line_no, problem)
+            continue
+        if trade is None:
+            plan["skipped"] += 1
+            continue
+
+        # Local symbol check only -- no per-row network calls
+        ticker = trade["ticker"]
+        valid = is_valid_symbol(ticker, index)
+        if valid is False:
+            error(line_no, f"Invalid symbol {ticker}")
+            continue
+        if valid is None:
+            plan["unverified"].add(ticker)
+
+        key = trade_key(trade)
+        if stored[key] > 0:
+            stored[key] -= 1
+            plan["duplicates"] += 1
+            continue
+
+        plan["trades"].append({"user_name": user, **trade, "reasoning": reasoning})
+    return plan
+
+
+@contextmanager
+def text_stream(uploaded):
+    """
+    Binary upload -> text stream decoded as it's read (BOM-tolerant, falls back to latin-1).
+    The upload is rewound afterwards and left open, so it can be read again.
+    """
+    uploaded.seek(0)
+    try:
+        uploaded.read(64 * 1024).decode("utf-8-sig")
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError:
+        encoding = "latin-1"
+    uploaded.seek(0)
+    stream = io.TextIOWrapper(uploaded, encoding=encoding, newline="")
+    try:
+        yield stream
+    finally:
+        stream.detach()
+        uploaded.seek(0)
+
+
+def read_header(uploaded):
+    """(header fields, detected {field: position}) of an upload, for the column-mapping step"""
+    with text_stream(uploaded) as stream:
+        header, columns, _ = _find_header(list(islice(stream, HEADER_SEARCH_LINES)))
+    return header, columns
@@ -0,0 +1,241 @@
+"""
+Lot ledger: open lots and realized PnL per user and ticker.
+
+Sells close the oldest open lots first (FIFO), or the lots named in the trade's `lot_ids`
+(specific-lot matching). The process-wide ledger is loaded once per user and then kept
+current by log_trade/delete_trade in utils.db, so a dashboard reads positions in
+O(open lots) instead of replaying the user's whole trade history on every render.
+"""
+import threading
+from collections import deque
+
+import pandas as pd
+import streamlit as st
+
+POSITION_COLUMNS = ["user_name", "ticker", "quantity", "cost_basis", "avg_cost", "realized_pnl", "open_lots", "unmatched"]
+
+# Quantities below this are float dust from partial fills, not open shares
+EPSILON = 1e-9
+
+
+def _sort_key(trade):
+    return (trade["ts"], trade["id"] if trade["id"] is not None else float("inf"))
+
+
+def _timestamps(values):
+    """created_at values -> UTC timestamps (naive ones are taken as UTC; missing = now)"""
+    now = pd.Timestamp.now(tz="UTC")
+    times = pd.to_datetime(pd.Series(list(values), dtype=object), utc=True, format="ISO8601")
+    return [now if pd.isna(t) else t for t in times]
+
+
+def _normalize(row, ts):
+    """Trade row (dict from utils.db, or a DataFrame record) -> the fields the ledger uses"""
+    lot_ids = row.get("lot_ids")
+    return {
+        "id": row.get("id"),
+        "user_name": row.get("user_name"),
+        "ticker": row["ticker"],
+        "action": row["action"],
+        "price": float(row["price"] or 0.0),
+        "quantity": float(row["quantity"] or 0.0),
+        "ts": ts,
+        "lot_ids": list(lot_ids) if isinstance(lot_ids, (list, tuple)) else None,
+    }
+
+
+class TickerBook:
+    """One user's trades in one ticker, and the lots they leave open"""
+
+    def __init__(self):
+        self.trades = []  # sorted by (created_at, id)
+        self.reset()
+
+    def reset(self):
+        self.lots = deque()  # [trade id, quantity left, price, opened at]
+        self.realized = 0.0
+        self.unmatched = 0.0  # sold without an open lot to match (not valued)
+
+    def apply(self, trade):
+        qty = trade["quantity"]
+        if trade["action"] == "Buy":
+            self.lots.append([trade["id"], qty, trade["price"], trade["ts"]])
+        elif trade["action"] == "Sell":
+            self._close(qty, trade["price"], trade["lot_ids"])
+
+    def _close(self, qty, price, lot_ids):
+        # Named lots first (in the order given), then FIFO for whatever is left
+        if lot_ids:
+            order = {lot_id: i for i, lot_id in enumerate(lot_ids)}
+            picked = sorted((lot for lot in self.lots if lot[0] in order), key=lambda lot: order[lot[0]])
+            for lot in picked:
+                qty = self._match(lot, qty, price)
+                if qty <= EPSILON:
+                    break
+            self.lots = deque(lot for lot in self.lots if lot[1] > EPSILON)
+        while qty > EPSILON and self.lots:
+            qty = self._match(self.lots[0], qty, price)
+            if self.lots[0][1] <= EPSILON:
+                self.lots.popleft()
+        if qty > EPSILON:
+            self.unmatched += qty
+
+    def _match(self, lot, qty, price):
+        used = min(lot[1], qty)
+        lot[1] -= used
+        self.realized += used * (price - lot[2])
+        return qty - used
+
+    def add(self, trade):
+        """New trade: O(1) if it's the latest one (the usual case), else replay this book"""
+        if not self.trades or _sort_key(trade) >= _sort_key(self.trades[-1]):
+            self.trades.append(trade)
+            self.apply(trade)
+        else:
+            self.trades.append(trade)
+            self.replay()
+
+    def remove(self, trade_id):
+        self.trades = [t for t in self.trades if t["id"] != trade_id]
+        self.replay()
+
+    def replay(self):
+        self.trades.sort(key=_sort_key)
+        self.reset()
+        for trade in self.trades:
+            self.apply(trade)
+
+    def position(self):
+        quantity = sum(lot[1] for lot in self.lots)
+        cost = sum(lot[1] * lot[2] for lot in self.lots)
+        return {
+            "quantity": quantity,
+            "cost_basis": cost,
+            "avg_cost": cost / quantity if quantity > EPSILON else 0.0,
+            "realized_pnl": self.realized,
+            "open_lots": len(self.lots),
+            "unmatched": self.unmatched,
+        }
+
+
+class LotLedger:
+    """
+    Books per (user, ticker), plus what the ledger reflects for each user: (max trade id, trade count),
+    the same watermark utils.db.get_trades_version() reports from the server.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._books = {}   # user -> {ticker: TickerBook}
+        self._owner = {}   # trade id -> (user, ticker)
+        self._ids = {}     # user -> trade ids applied (for the watermark)
+
+    @classmethod
+    def from_trades(cls, trades):
+        """Standalone ledger over a list of trade rows or a trades DataFrame (any users)"""
+        ledger = cls()
+        rows = trades.to_dict("records") if isinstance(trades, pd.DataFrame) else list(trades)
+        by_user = {}
+        for row in rows:
+            by_user.setdefault(row.get("user_name"), []).append(row)
+        for user, user_rows in by_user.items():
+            ledger.load(user, user_rows)
+        return ledger
+
+    def load(self, user, rows):
+        """(Re)build one user's books from their full trade list"""
+        rows = list(rows)
+        books = {}
+        trades = map(_normalize, rows, _timestamps(r.get("created_at") for r in rows))
+        for trade in sorted(trades, key=_sort_key):
+            books.setdefault(trade["ticker"], TickerBook()).trades.append(trade)
+        for book in books.values():
+            for trade in book.trades:
+                book.apply(trade)
+        with self._lock:
+            for trade_id in self._ids.get(user, ()):
+                self._owner.pop(trade_id, None)
+            self._books[user] = books
+            self._ids[user] = set()
+            for ticker, book in books.items():
+                for trade in book.trades:
+                    self._owner[trade["id"]] = (user, ticker)
+                    self._ids[user].add(trade["id"])
+
+    def loaded(self, user):
+        return user in self._books
+
+    def discard(self, user):
+        """Drop a user's books; the next sync() loads them again"""
+        with self._lock:
+            for trade_id in self._ids.pop(user, ()):
+                self._owner.pop(trade_id, None)
+            self._books.pop(user, None)
+
+    def add(self, row):
+        """Apply a newly inserted trade (ignored for users this ledger hasn't loaded)"""
+        trade = _normalize(row, _timestamps([row.get("created_at")])[0])
+        user = trade["user_name"]
+        with self._lock:
+            if user not in self._books or trade["id"] in self._owner:
+                return
+            self._books[user].setdefault(trade["ticker"], TickerBook()).add(trade)
+            self._owner[trade["id"]] = (user, trade["ticker"])
+            self._ids[user].add(trade["id"])
+
+    def remove(self, trade_id):
+        """Forget a deleted trade; only that ticker's book is replayed"""
+        with self._lock:
+            owner = self._owner.pop(trade_id, None)
+            if owner is None:
+                return
+            user, ticker = owner
+            self._ids[user].discard(trade_id)
+            book = self._books[user][ticker]
+            book.remove(trade_id)
+            if not book.trades:
+                del self._books[user][ticker]
+
+    def watermark(self, user):
+        with self._lock:
+            ids = self._ids.get(user, ())
+            return (max(ids) if ids else None, len(ids))
+
+    def sync(self, user, watermark, load):
+        """Reload the user from load() unless the ledger already matches the server watermark"""
+        if self.loaded(user) and self.watermark(user) == tuple(watermark):
+            return
+        self.load(user, load())
+
+    def lots(self, user, ticker):
+        """Open lots of one position, oldest first: [{id, quantity, price, opened}]"""
+        with self._lock:
+            book = self._books.get(user, {}).get(ticker)
+            lots = list(book.lots) if book else []
+        return [{"id": i, "quantity": q, "price": p, "opened": ts} for i, q, p, ts in lots]
+
+    def positions(self, user=None):
+        """One row per (user, ticker) with POSITION_COLUMNS; closed positions keep their realized PnL"""
+        with self._lock:
+            users = [user] if user is not None else list(self._books)
+            rows = [
+                {"user_name": u, "ticker": ticker, **book.position()}
+                for u in users
+                for ticker, book in self._books.get(u, {}).items()
+            ]
+        return pd.DataFrame(rows, columns=POSITION_COLUMNS)
+
+
+@st.cache_resource
+def get_ledger():
+    """Process-wide ledger shared by every session (kept current by utils.db writes)"""
+    return LotLedger()
+
+
+def get_positions(user):
+    """A user's positions from the shared ledger, loading them on first use or after outside writes"""
+    from utils.db import get_trades, get_trades_version
+
+    ledger = get_ledger()
+    ledger.sync(user, get_trades_version(user)[-2:], lambda: get_trades(user=user))
+    return ledger.positions(user)
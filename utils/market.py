@@ -1,54 +1,75 @@
-import streamlit as st
-import yfinance as yf
 import pandas as pd
-import datetime
-import pytz
+from utils.ledger import LotLedger
+from utils.market_calendar import freshness
+from utils.perf import Uncached, cache_data
+from utils.providers import get_provider
 
-@st.cache_data(ttl=300)  # Cache data for 5 minutes (prevents slow loading)
-def get_current_price(ticker):
+# Seconds a quote is reused while its market trades (closed markets keep theirs until the open)
+QUOTE_REFRESH = 300
+
+def get_current_prices(tickers):
+    """
+    Latest price for a batch of tickers in one round trip.
+    Returns (prices, errors): {ticker: price} for everything that resolved and
+    {ticker: reason} for everything that didn't.
+    """
+    tickers = tuple(dict.fromkeys(tickers))
+    if not tickers:
+        return {}, {}
     try:
-        data = yf.Ticker(ticker)
-        # Fast fetch of just the latest price
-        price = data.fast_info['last_price']
-        return price
-    except:
-        return None
+        return _current_prices(tickers, freshness(tickers, QUOTE_REFRESH))
+    except Exception as e:
+        return {}, {t: str(e) for t in tickers}
+
+@cache_data(max_entries=256)
+def _current_prices(tickers, fresh):
+    prices, errors = get_provider().quotes(list(tickers))
+    if errors:
+        # Not cached: the token holds from the close to the next open, a failure would stick all weekend
+        raise Uncached((prices, errors))
+    return prices, errors
+
+def get_current_price(ticker):
+    prices, _ = get_current_prices((ticker,))
+    return prices.get(ticker)
 
 def calculate_portfolio_value(trades_df):
     """
-    Takes the trades dataframe and adds 'Current Price' and 'PnL' columns.
+    Values the open lots left by trades_df (sells close the oldest buys, or their lot_ids).
+    Returns (total market value, positions): one row per user and ticker, see value_positions.
+
+    The frame used to be trades_df itself with price/value columns added per trade, which
+    counted Sells as long positions. Callers wanting per-position numbers read the
+    positions frame; trades_df is no longer modified.
     """
     if trades_df.empty:
-        return 0, trades_df
+        return 0, pd.DataFrame()
+    return value_positions(LotLedger.from_trades(trades_df).positions())
+
+def value_positions(positions, prices=None):
+    """
+    Adds 'current_price', 'market_value', 'unrealized_pnl' and 'return_pct' to a
+    utils.ledger positions frame. prices: {ticker: price}, fetched in one batch if not given.
+    """
+    positions = positions.copy()
+    if positions.empty:
+        return 0, positions
+
+    # 1. Map current prices onto the open positions
+    if prices is None:
+        held = positions.loc[positions['quantity'] > 0, 'ticker']
+        prices, _ = get_current_prices(tuple(sorted(held.unique())))
+    positions['current_price'] = positions['ticker'].map(prices)
 
-    # Get unique tickers to fetch
-    unique_tickers = trades_df['ticker'].unique()
-    current_prices = {}
-    
-    # Fetch prices
-    for t in unique_tickers:
-        p = get_current_price(t)
-        if p:
-            current_prices[t] = p
+    # 2. Market value of the shares still held (closed positions are worth 0)
+    positions['market_value'] = (positions['quantity'] * positions['current_price']).where(positions['quantity'] > 0, 0.0)
 
-    # Logic:
-    # 1. Map current prices to the dataframe
-    trades_df['current_price'] = trades_df['ticker'].map(current_prices)
-    
-    # 2. Calculate Market Value = Quantity * Current Price
-    trades_df['market_value'] = trades_df['quantity'] * trades_df['current_price']
-    
-    # 3. Calculate Cost Basis = Quantity * Entry Price
-    trades_df['cost_basis'] = trades_df['quantity'] * trades_df['price']
-    
-    # 4. Calculate PnL (Profit and Loss)
-    # If it's a BUY: (Current - Entry) * Qty
-    # If it's a SELL (Short): (Entry - Current) * Qty -- (Simplified for now assuming mostly Longs)
-    trades_df['unrealized_pnl'] = trades_df['market_value'] - trades_df['cost_basis']
-    trades_df['return_pct'] = (trades_df['unrealized_pnl'] / trades_df['cost_basis']) * 100
-    
-    total_value = trades_df['market_value'].sum()
-    return total_value, trades_df
+    # 3. Unrealized PnL against the cost of the open lots only
+    positions['unrealized_pnl'] = positions['market_value'] - positions['cost_basis']
+    positions['return_pct'] = (positions['unrealized_pnl'] / positions['cost_basis'].where(positions['cost_basis'] != 0)) * 100
+
+    total_value = positions['market_value'].sum()
+    return total_value, positions
 
 # utils/market.py (Add this to the bottom)
 
@@ -65,22 +86,3 @@ def get_common_tickers():
         "JNJ", "PFE", "LLY", "UNH", # Healthcare
         "AMD", "INTC", "QCOM", "CRM", "ADBE" # Chips/Software
     ]
-
-def get_market_status():
-    """Returns (Color, StatusText, DateString)"""
-    tz = pytz.timezone('US/Eastern')
-    now = datetime.datetime.now(tz)
-
-    # Simple Logic: Mon-Fri, 9:30am - 4:00pm
-    is_weekday = now.weekday() < 5
-    # Decimal hours for easy comparison (e.g. 9:30 is 9.5)
-    current_hour = now.hour + (now.minute / 60)
-
-    is_open = is_weekday and (9.5 <= current_hour < 16.0)
-
-    date_str = now.strftime("%B %d, %Y")
-
-    if is_open:
-        return "green", "Market Open", date_str
-    else:
-        return "gray", "Market Closed", date_str
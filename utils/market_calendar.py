@@ -0,0 +1,260 @@
+"""
+Exchange calendars: trading sessions, holidays and early closes.
+
+NYSE rules (valid from 2000 on) plus a 24/7 calendar for crypto pairs. Besides telling the top bar
+whether the market is open, the calendar decides how long price data stays fresh:
+
+    data_end(...)   latest moment new bars can exist for (the close + a settle window once the bell rang)
+    freshness(...)  cache key part that moves every `refresh` seconds during a session and
+                    stays put from the close until the next open, so closed markets aren't refetched
+"""
+import re
+import time
+from collections import namedtuple
+from datetime import date, datetime, time as dtime, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+EASTERN = ZoneInfo("America/New_York")
+
+# Bars for a session can still be revised shortly after the bell (closing auction prints)
+SETTLE = 15 * 60
+
+# Unscheduled full-day closures
+SPECIAL_CLOSURES = {
+    date(2001, 9, 11): "September 11", date(2001, 9, 12): "September 11",
+    date(2001, 9, 13): "September 11", date(2001, 9, 14): "September 11",
+    date(2004, 6, 11): "Reagan National Day of Mourning",
+    date(2007, 1, 2): "Ford National Day of Mourning",
+    date(2012, 10, 29): "Hurricane Sandy", date(2012, 10, 30): "Hurricane Sandy",
+    date(2018, 12, 5): "Bush National Day of Mourning",
+    date(2025, 1, 9): "Carter National Day of Mourning",
+}
+
+# Yahoo quotes crypto as <COIN>-<CURRENCY>
+_CRYPTO = re.compile(r"[A-Z0-9]+-(USD|USDT|USDC|EUR|GBP|BTC|ETH)")
+
+MarketStatus = namedtuple("MarketStatus", ["is_open", "label", "date", "next_change"])
+
+
+def _observed(day):
+    """Saturday holidays are observed on Friday, Sunday ones on Monday"""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def _nth_weekday(year, month, weekday, n):
+    """n-th (1-based, -1 = last) given weekday of a month"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year):
+    """Gregorian Easter Sunday (anonymous algorithm)"""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+@lru_cache(maxsize=None)
+def nyse_holidays(year):
+    """{date: name} of every full-day NYSE closure in a year"""
+    days = {}
+    new_year = date(year, 1, 1)
+    # A Saturday New Year's Day isn't made up on the Friday before (that Friday is still in the old year)
+    if new_year.weekday() != 5:
+        days[_observed(new_year)] = "New Year's Day"
+    days[_nth_weekday(year, 1, 0, 3)] = "Martin Luther King Jr. Day"
+    days[_nth_weekday(year, 2, 0, 3)] = "Washington's Birthday"
+    days[_easter(year) - timedelta(days=2)] = "Good Friday"
+    days[_nth_weekday(year, 5, 0, -1)] = "Memorial Day"
+    if year >= 2022:
+        days[_observed(date(year, 6, 19))] = "Juneteenth"
+    days[_observed(date(year, 7, 4))] = "Independence Day"
+    days[_nth_weekday(year, 9, 0, 1)] = "Labor Day"
+    days[_nth_weekday(year, 11, 3, 4)] = "Thanksgiving Day"
+    days[_observed(date(year, 12, 25))] = "Christmas Day"
+    days.update({d: name for d, name in SPECIAL_CLOSURES.items() if d.year == year})
+    return days
+
+
+@lru_cache(maxsize=None)
+def nyse_early_closes(year):
+    """Sessions that end at 1pm: the eve of Independence Day, Black Friday and Christmas Eve"""
+    holidays = nyse_holidays(year)
+    days = set()
+    july_3 = date(year, 7, 3)
+    if july_3.weekday() < 4 and july_3 not in holidays:
+        days.add(july_3)
+    days.add(_nth_weekday(year, 11, 3, 4) + timedelta(days=1))
+    christmas_eve = date(year, 12, 24)
+    if christmas_eve.weekday() < 4 and christmas_eve not in holidays:
+        days.add(christmas_eve)
+    return frozenset(days)
+
+
+class ExchangeCalendar:
+    """
+    Regular sessions of one exchange. Times in and out are epoch seconds (like the
+    store and poller clocks); days are dates in the exchange's time zone.
+    """
+
+    def __init__(self, name, tz=EASTERN, open=dtime(9, 30), close=dtime(16), early_close=dtime(13),
+                 holidays=nyse_holidays, early_closes=nyse_early_closes):
+        self.name = name
+        self.tz = tz
+        self.open = open
+        self.close = close
+        self.early_close = early_close
+        self.holidays = holidays
+        self.early_closes = early_closes
+
+    def _day(self, now):
+        return datetime.fromtimestamp(now, self.tz).date()
+
+    def holiday(self, day):
+        """Name of the holiday closing the exchange that day, or None"""
+        return self.holidays(day.year).get(day)
+
+    def session(self, day):
+        """(open, close) epoch seconds of the session on a date, None if there is none"""
+        if day.weekday() >= 5 or day in self.holidays(day.year):
+            return None
+        close = self.early_close if day in self.early_closes(day.year) else self.close
+        return (datetime.combine(day, self.open, self.tz).timestamp(),
+                datetime.combine(day, close, self.tz).timestamp())
+
+    def is_open(self, now=None):
+        now = time.time() if now is None else now
+        bounds = self.session(self._day(now))
+        return bounds is not None and bounds[0] <= now < bounds[1]
+
+    def next_open(self, now=None):
+        """Start of the next session beginning after now (the current one if it hasn't opened yet)"""
+        now = time.time() if now is None else now
+        day = self._day(now)
+        for offset in range(15):
+            bounds = self.session(day + timedelta(days=offset))
+            if bounds and bounds[0] > now:
+                return bounds[0]
+        raise ValueError(f"No {self.name} session within two weeks of {now}")
+
+    def last_close(self, now=None):
+        """End of the most recent session that finished at or before now"""
+        now = time.time() if now is None else now
+        day = self._day(now)
+        for offset in range(15):
+            bounds = self.session(day - timedelta(days=offset))
+            if bounds and bounds[1] <= now:
+                return bounds[1]
+        raise ValueError(f"No {self.name} session within two weeks of {now}")
+
+    def data_end(self, now=None):
+        """Latest time new bars can exist for: now during a session, else the last close + SETTLE"""
+        now = time.time() if now is None else now
+        if self.is_open(now):
+            return now
+        return min(now, self.last_close(now) + SETTLE)
+
+    def settled_until(self, now=None):
+        """Daily bars dated before this (epoch seconds) are final: their session closed more than SETTLE ago"""
+        now = time.time() if now is None else now
+        day = self._day(now)
+        bounds = self.session(day)
+        if bounds is not None and now < bounds[1] + SETTLE:
+            return datetime.combine(day, dtime(0), self.tz).timestamp()
+        return datetime.combine(day + timedelta(days=1), dtime(0), self.tz).timestamp()
+
+    def next_change(self, now=None):
+        """When is_open() flips next"""
+        now = time.time() if now is None else now
+        if self.is_open(now):
+            return self.session(self._day(now))[1]
+        return self.next_open(now)
+
+
+class AlwaysOpen(ExchangeCalendar):
+    """Markets that never close (crypto)"""
+
+    def __init__(self, name, tz=ZoneInfo("UTC")):
+        super().__init__(name, tz=tz, holidays=lambda year: {}, early_closes=lambda year: frozenset())
+
+    def session(self, day):
+        start = datetime.combine(day, dtime(0), self.tz).timestamp()
+        return start, start + 86400
+
+    def is_open(self, now=None):
+        return True
+
+    def data_end(self, now=None):
+        return time.time() if now is None else now
+
+    def next_change(self, now=None):
+        return float("inf")
+
+
+NYSE = ExchangeCalendar("NYSE")
+CRYPTO = AlwaysOpen("CRYPTO")
+
+
+def calendar_for(symbol):
+    """Calendar a symbol trades on: crypto pairs are 24/7, everything else follows NYSE"""
+    return CRYPTO if _CRYPTO.fullmatch(symbol or "") else NYSE
+
+
+def is_trading(symbols, now=None):
+    """True if any of the symbols is in a session right now"""
+    now = time.time() if now is None else now
+    return any(calendar_for(s).is_open(now) for s in symbols)
+
+
+def data_end(symbols, now=None):
+    """Latest time any of the symbols can have new data (now if one of them is trading)"""
+    now = time.time() if now is None else now
+    return max((calendar_for(s).data_end(now) for s in symbols), default=NYSE.data_end(now))
+
+
+def settled_until(symbols, now=None):
+    """Daily bars dated before this are final for every one of the symbols (see ExchangeCalendar.settled_until)"""
+    now = time.time() if now is None else now
+    return min((calendar_for(s).settled_until(now) for s in symbols), default=NYSE.settled_until(now))
+
+
+def freshness(symbols, refresh, now=None):
+    """
+    Freshness token for price caches. Pass it as a cache key argument:
+    while any symbol trades it changes every `refresh` seconds; once they are all closed it is
+    the time their data stopped changing, so cached results live until the next session opens.
+    """
+    now = time.time() if now is None else now
+    end = data_end(symbols, now)
+    if end >= now:
+        return int(now // refresh * refresh)
+    return int(end)
+
+
+def get_market_status(now=None, calendar=NYSE):
+    """MarketStatus(is_open, label, date, next_change) for the top bar"""
+    now = time.time() if now is None else now
+    local = datetime.fromtimestamp(now, calendar.tz)
+    is_open = calendar.is_open(now)
+    if is_open:
+        label = "Market Open"
+        if local.date() in calendar.early_closes(local.year):
+            label += f" · closes {calendar.early_close.strftime('%I:%M %p').lstrip('0')}"
+    else:
+        holiday = calendar.holiday(local.date())
+        label = f"Market Closed · {holiday}" if holiday else "Market Closed"
+    return MarketStatus(is_open, label, local.strftime("%B %d"), calendar.next_change(now))
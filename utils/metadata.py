@@ -0,0 +1,128 @@
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import streamlit as st
+
+from utils.price_store import CACHE_DIR
+from utils.providers import get_provider
+
+DB_PATH = CACHE_DIR / "metadata.sqlite"
+
+# The part of provider.info() the Research page shows (the full dict is ~150 fields)
+FIELDS = (
+    "longName", "sector", "marketCap", "trailingPE", "averageVolume",
+    "fiftyTwoWeekHigh", "longBusinessSummary",
+)
+
+METADATA_TTL = 24 * 3600  # seconds before a stored entry is refreshed
+FAILURE_TTL = 5 * 60      # don't retry a failed lookup on every rerun
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS info (
+    ticker TEXT PRIMARY KEY,
+    fetched REAL NOT NULL,
+    data TEXT NOT NULL
+);
+"""
+
+
+class MetadataCache:
+    """
+    Ticker metadata (name, sector, market cap...) kept in memory and on disk.
+
+    Entries are served for METADATA_TTL. A stale entry is refreshed on read, and kept if the
+    refresh fails. prefetch() warms a list of symbols on a background thread, so
+    pages can ask for them later without waiting on the provider.
+    """
+
+    def __init__(self, path=DB_PATH, provider=None, clock=time.time, ttl=METADATA_TTL):
+        self.path = Path(path)
+        self.provider = provider
+        self.clock = clock
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._memory = {}    # ticker -> (fetched, data)
+        self._failed = {}    # ticker -> when the last lookup failed
+        self._queue = []
+        self._worker = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as con:
+            con.executescript(SCHEMA)
+            for ticker, fetched, data in con.execute("SELECT ticker, fetched, data FROM info"):
+                self._memory[ticker] = (fetched, json.loads(data))
+
+    @contextmanager
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=30)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def _fresh(self, ticker):
+        entry = self._memory.get(ticker)
+        return entry is not None and self.clock() - entry[0] < self.ttl
+
+    def _fetch(self, ticker):
+        provider = self.provider or get_provider()
+        try:
+            info = provider.info(ticker) or {}
+        except Exception:
+            with self._lock:
+                self._failed[ticker] = self.clock()
+            return None
+        data = {k: info[k] for k in FIELDS if info.get(k) is not None}
+        now = self.clock()
+        with self._lock:
+            self._memory[ticker] = (now, data)
+            self._failed.pop(ticker, None)
+        with self._connect() as con:
+            con.execute("INSERT OR REPLACE INTO info VALUES (?, ?, ?)", (ticker, now, json.dumps(data)))
+        return data
+
+    def get(self, ticker):
+        """Metadata dict for a ticker ({} if it has never been fetched successfully)"""
+        with self._lock:
+            entry = self._memory.get(ticker)
+            recently_failed = self.clock() - self._failed.get(ticker, float("-inf")) < FAILURE_TTL
+        if self._fresh(ticker) or recently_failed:
+            return dict(entry[1]) if entry else {}
+        data = self._fetch(ticker)
+        if data is None:
+            return dict(entry[1]) if entry else {}
+        return dict(data)
+
+    def prefetch(self, tickers):
+        """Fetch missing or stale tickers on a background thread (returns immediately)"""
+        with self._lock:
+            todo = [t for t in dict.fromkeys(tickers) if not self._fresh(t) and t not in self._queue]
+            self._queue.extend(todo)
+            if not self._queue or self._worker is not None:
+                return
+            self._worker = threading.Thread(target=self._drain, name="metadata-prefetch", daemon=True)
+            self._worker.start()
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._worker = None
+                    return
+                ticker = self._queue.pop(0)
+                skip = self._fresh(ticker) or self.clock() - self._failed.get(ticker, float("-inf")) < FAILURE_TTL
+            if not skip:
+                try:
+                    self._fetch(ticker)
+                except Exception:
+                    pass  # disk write failed; the next get() retries
+
+
+@st.cache_resource
+def get_metadata():
+    """Process-wide metadata cache shared by every session"""
+    return MetadataCache()
@@ -0,0 +1,199 @@
+import functools
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import streamlit as st
+
+# Recent samples kept per timer for percentiles
+SAMPLES = 500
+
+
+class Metrics:
+    """Process-wide counters and timers, keyed by (name, labels)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.timers = {}
+        self.started = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        return (name, tuple(sorted(labels.items())))
+
+    def count(self, name, /, n=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def observe(self, name, seconds, /, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            t = self.timers.get(key)
+            if t is None:
+                t = self.timers[key] = {"count": 0, "sum": 0.0, "max": 0.0, "errors": 0, "samples": deque(maxlen=SAMPLES)}
+            t["count"] += 1
+            t["sum"] += seconds
+            t["max"] = max(t["max"], seconds)
+            t["samples"].append(seconds)
+
+    def error(self, name, /, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            if key in self.timers:
+                self.timers[key]["errors"] += 1
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.timers.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """Plain dict of everything collected (what the JSON export contains)"""
+        with self._lock:
+            counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self.counters.items()]
+            timers = []
+            for (n, l), t in self.timers.items():
+                samples = sorted(t["samples"])
+                timers.append({
+                    "name": n, "labels": dict(l),
+                    "count": t["count"], "errors": t["errors"],
+                    "sum_s": t["sum"], "avg_s": t["sum"] / t["count"], "max_s": t["max"],
+                    "p50_s": _percentile(samples, 0.5), "p95_s": _percentile(samples, 0.95),
+                })
+            return {"since": self.started, "counters": counters, "timers": timers}
+
+
+def _percentile(samples, q):
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def timed(name, /, **labels):
+    """
+    Times the block into METRICS. Exceptions are counted as errors and re-raised;
+    st.stop()/st.rerun() (not Exceptions) still record the time spent.
+    """
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        METRICS.observe(name, time.perf_counter() - start, **labels)
+        if failed:
+            METRICS.error(name, **labels)
+
+
+def instrument(kind):
+    """Decorator: time every call of the function as calls{kind, name}"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed("calls", kind=kind, name=fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Uncached(Exception):
+    """
+    Raised from the body of a cache_data/cache_resource function to return `value` to this
+    caller without storing it (a partial result from a failed fetch, retried on the next call).
+    """
+
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+
+
+def cache_data(**cache_kwargs):
+    """
+    st.cache_data that also records hits and misses per function.
+    A miss is detected by the wrapped body actually running.
+    """
+    return _counted(st.cache_data, cache_kwargs)
+
+
+def cache_resource(**cache_kwargs):
+    """st.cache_resource with the same hit/miss accounting (results are shared, not copied)"""
+    return _counted(st.cache_resource, cache_kwargs)
+
+
+def _counted(cache, cache_kwargs):
+    def decorator(fn):
+        state = threading.local()
+
+        @functools.wraps(fn)
+        def compute(*args, **kwargs):
+            state.miss = True
+            return fn(*args, **kwargs)
+
+        cached = cache(**cache_kwargs)(compute)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            state.miss = False
+            start = time.perf_counter()
+            try:
+                result = cached(*args, **kwargs)
+            except Uncached as e:
+                result = e.value
+            outcome = "miss" if state.miss else "hit"
+            METRICS.count("cache", func=fn.__qualname__, module=fn.__module__, result=outcome)
+            METRICS.observe("cache_lookup", time.perf_counter() - start, func=fn.__qualname__, result=outcome)
+            return result
+
+        wrapper.clear = cached.clear
+        return wrapper
+    return decorator
+
+
+def to_json():
+    return json.dumps(METRICS.snapshot(), indent=2)
+
+
+def to_prometheus(prefix="waddle"):
+    """Prometheus text exposition of the same data"""
+    snap = METRICS.snapshot()
+    lines = []
+
+    def fmt(labels):
+        if not labels:
+            return ""
+        body = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in sorted(labels.items()))
+        return "{" + body + "}"
+
+    names = sorted({c["name"] for c in snap["counters"]})
+    for name in names:
+        lines.append(f"# TYPE {prefix}_{name}_total counter")
+        for c in snap["counters"]:
+            if c["name"] == name:
+                lines.append(f"{prefix}_{name}_total{fmt(c['labels'])} {c['value']}")
+
+    names = sorted({t["name"] for t in snap["timers"]})
+    for name in names:
+        timers = [t for t in snap["timers"] if t["name"] == name]
+        metric = f"{prefix}_{name}_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        for t in timers:
+            labels = t["labels"]
+            lines.append(f"{metric}{fmt({**labels, 'quantile': '0.5'})} {t['p50_s']}")
+            lines.append(f"{metric}{fmt({**labels, 'quantile': '0.95'})} {t['p95_s']}")
+            lines.append(f"{metric}_sum{fmt(labels)} {t['sum_s']}")
+            lines.append(f"{metric}_count{fmt(labels)} {t['count']}")
+        lines.append(f"# TYPE {prefix}_{name}_errors_total counter")
+        for t in timers:
+            lines.append(f"{prefix}_{name}_errors_total{fmt(t['labels'])} {t['errors']}")
+    return "\n".join(lines) + "\n"
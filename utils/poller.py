@@ -0,0 +1,155 @@
+import threading
+import time
+import weakref
+
+import pandas as pd
+import streamlit as st
+
+from utils.market_calendar import calendar_for, is_trading
+from utils.perf import METRICS, timed
+from utils.price_store import get_store
+from utils.providers import get_provider
+
+# Seconds between polls while the market is open / closed
+OPEN_INTERVAL = 30
+CLOSED_INTERVAL = 300
+
+# Symbols nobody has asked about for this long drop off the board
+WATCH_TTL = 15 * 60
+
+
+class QuotePoller:
+    """
+    One background thread per process that keeps an in-memory quote board for every
+    watched symbol. Sessions read the board instead of calling the provider, so the
+    number of upstream requests doesn't grow with the number of open sessions.
+
+    Board entries: {"price": last price, "prev_close": previous session close, "updated": epoch}
+    It also keeps the intraday bars of watched symbols fresh in the price store, so
+    intraday charts read from local data. Symbols whose market has closed are polled once
+    after the close and then left alone until it reopens.
+
+    The provider and store are passed in, so the thread never touches Streamlit caches.
+    The thread only holds a weak reference: it exits on stop() or once the poller is
+    dropped (e.g. get_poller's cache entry cleared), instead of polling alongside its successor.
+    """
+
+    def __init__(self, provider, store, clock=time.time, is_open=None):
+        self.provider = provider
+        self.store = store
+        self.clock = clock
+        self.is_open = is_open or is_trading
+        self._lock = threading.Lock()
+        self._board = {}
+        self._watched = {}  # symbol -> last time a session asked for it
+        self._thread = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        weakref.finalize(self, _release, self._stop, self._wake)
+
+    def watch(self, symbols, wait=False):
+        """Keep symbols on the board. wait=True polls missing ones right away in this thread."""
+        now = self.clock()
+        with self._lock:
+            for s in symbols:
+                self._watched[s] = now
+            missing = [s for s in symbols if s not in self._board]
+        # The board is what the tape/dashboard read instead of a cache_data call
+        METRICS.count("cache", n=len(symbols) - len(missing), func="quote_board", module=__name__, result="hit")
+        METRICS.count("cache", n=len(missing), func="quote_board", module=__name__, result="miss")
+        if wait and missing:
+            self.poll(missing)
+        self._start()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._board)
+
+    def quote(self, symbol):
+        with self._lock:
+            return self._board.get(symbol)
+
+    def poll(self, symbols=None):
+        """Refresh quotes (and daily/intraday bars) for the given or all watched symbols"""
+        now = self.clock()
+        with self._lock:
+            for s, seen in list(self._watched.items()):
+                if now - seen > WATCH_TTL:
+                    del self._watched[s]
+                    self._board.pop(s, None)
+            symbols = list(symbols or self._watched)
+            # Skip symbols already polled after their market's close + settle window
+            symbols = [s for s in symbols if s not in self._board or self._board[s]["updated"] < calendar_for(s).data_end(now)]
+        if not symbols:
+            return
+
+        with timed("calls", kind="poller", name="poll"):
+            prices, _ = self.provider.quotes(symbols)
+            daily = self.store.get_period(symbols, "5d", "1d")
+            self.store.get_period(symbols, "1d", "5m")
+
+        today = pd.Timestamp(now, unit="s", tz="UTC")
+        updates = {}
+        for s in symbols:
+            closes = daily.get(s, pd.DataFrame()).get("Close", pd.Series(dtype=float)).dropna()
+            prev_close = None
+            if not closes.empty:
+                # If the last daily bar is today's (still forming), the previous close is the one before
+                last_day = closes.index[-1].date()
+                is_today = last_day == today.tz_convert(closes.index.tz).date()
+                if is_today and len(closes) >= 2:
+                    prev_close = float(closes.iloc[-2])
+                elif not is_today:
+                    prev_close = float(closes.iloc[-1])
+            price = prices.get(s)
+            if price is None and not closes.empty:
+                price = float(closes.iloc[-1])
+            if price is not None:
+                updates[s] = {"price": price, "prev_close": prev_close, "updated": now}
+
+        with self._lock:
+            self._board.update(updates)
+
+    def stop(self):
+        """End the background thread (it finishes the poll in progress, if any)"""
+        _release(self._stop, self._wake)
+
+    def _start(self):
+        with self._lock:
+            if self._stop.is_set() or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=_run, args=(weakref.ref(self), self._stop, self._wake),
+                                            name="quote-poller", daemon=True)
+            self._thread.start()
+
+    def _next_wait(self):
+        with self._lock:
+            watched = list(self._watched)
+        return OPEN_INTERVAL if self.is_open(watched, self.clock()) else CLOSED_INTERVAL
+
+
+def _release(stop, wake):
+    stop.set()
+    wake.set()
+
+
+def _run(ref, stop, wake):
+    while not stop.is_set():
+        poller = ref()
+        if poller is None:
+            return
+        try:
+            poller.poll()
+        except Exception:
+            pass  # keep the last board; try again next cycle
+        wait = poller._next_wait()
+        # Don't keep the poller alive while sleeping
+        del poller
+        wake.wait(wait)
+        wake.clear()
+
+
+@st.cache_resource
+def get_poller():
+    """Quote poller shared by every session in the process"""
+    return QuotePoller(get_provider(), get_store())
@@ -0,0 +1,296 @@
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+from utils.market_calendar import calendar_for
+from utils.providers import COLUMNS, get_provider
+
+CACHE_DIR = Path(".cache")
+DB_PATH = CACHE_DIR / "prices.sqlite"
+
+# yfinance only accepts '1wk'; the views use '1w'
+INTERVAL_ALIASES = {"1w": "1wk"}
+
+BAR_SECONDS = {
+    "1m": 60, "2m": 120, "5m": 300, "15m": 900, "30m": 1800,
+    "60m": 3600, "90m": 5400, "1h": 3600,
+    "1d": 86400, "5d": 5 * 86400, "1wk": 7 * 86400, "1mo": 31 * 86400, "3mo": 92 * 86400,
+}
+
+# Yahoo only serves intraday bars for a limited look-back (days)
+INTRADAY_LOOKBACK = {"1m": 7, "2m": 59, "5m": 59, "15m": 59, "30m": 59, "60m": 729, "90m": 59, "1h": 729}
+
+# Periods counted in trading sessions rather than calendar time
+SESSION_PERIODS = {"1d": 1, "5d": 5}
+
+# A ticker the provider returned nothing for is not asked again for this long, doubling
+# on every further miss up to FAILURE_BACKOFF_MAX (seconds)
+FAILURE_BACKOFF = 60
+FAILURE_BACKOFF_MAX = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    ticker TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    open REAL, high REAL, low REAL, close REAL, volume REAL,
+    PRIMARY KEY (ticker, interval, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage (
+    ticker TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS coverage_key ON coverage (ticker, interval);
+CREATE TABLE IF NOT EXISTS meta (
+    ticker TEXT PRIMARY KEY,
+    tz TEXT
+);
+"""
+
+
+def _merge_ranges(ranges):
+    merged = []
+    for s, e in sorted(ranges):
+        if merged and s <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], e)
+        else:
+            merged.append([s, e])
+    return [tuple(r) for r in merged]
+
+
+def _subtract_ranges(start, end, covered, tolerance=0):
+    """Pieces of [start, end] not inside any covered range (gaps <= tolerance are ignored)"""
+    gaps = []
+    cursor = start
+    for s, e in covered:
+        if e <= cursor:
+            continue
+        if s > end:
+            break
+        if s > cursor:
+            gaps.append((cursor, s))
+        cursor = max(cursor, e)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return [(s, e) for s, e in gaps if e - s > tolerance]
+
+
+def period_start(period, now):
+    """
+    Epoch seconds where a yfinance-style period ('5d', '1mo', 'ytd', 'max'...) begins.
+    Session periods get a calendar buffer for weekends/holidays and are trimmed after loading.
+    """
+    now_ts = pd.Timestamp(now, unit="s", tz="UTC")
+    if period == "max":
+        start = pd.Timestamp("1970-01-02", tz="UTC")
+    elif period == "ytd":
+        start = pd.Timestamp(year=now_ts.year, month=1, day=1, tz="UTC")
+    elif period in SESSION_PERIODS:
+        start = now_ts - pd.Timedelta(days=SESSION_PERIODS[period] * 2 + 4)
+    else:
+        m = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+        if not m:
+            raise ValueError(f"Unknown period: {period}")
+        n, unit = int(m.group(1)), m.group(2)
+        offset = {
+            "d": pd.DateOffset(days=n), "wk": pd.DateOffset(weeks=n),
+            "mo": pd.DateOffset(months=n), "y": pd.DateOffset(years=n),
+        }[unit]
+        start = now_ts - offset
+    return int(start.timestamp())
+
+
+def trim_sessions(frame, n):
+    """Keep the last n trading dates of a bar frame"""
+    if frame.empty:
+        return frame
+    dates = frame.index.normalize()
+    keep = dates.unique()[-n:]
+    return frame[dates.isin(keep)]
+
+
+class PriceStore:
+    """
+    On-disk OHLCV store keyed by ticker/interval.
+
+    Every fetched range is recorded in the coverage table, so a request only asks the
+    provider for the bars it doesn't already hold (plus one bar of overlap at the tail,
+    which may still have been forming when it was stored). The tail ends at the ticker's
+    last close while its market is shut (utils.market_calendar), so nights, weekends and
+    holidays cost no requests. If the provider fails, or offline=True, whatever is cached is served.
+    A ticker missing from the provider's answer is backed off before it is requested again.
+    stale() tells callers which answers were served around a failed fetch, so they aren't cached.
+    """
+
+    def __init__(self, path=DB_PATH, provider=None, clock=time.time):
+        self.path = Path(path)
+        self.provider = provider
+        self.clock = clock
+        self._write_lock = threading.Lock()
+        # (ticker, interval) -> (time of the last miss, consecutive misses)
+        self._failures = {}
+        # (ticker, interval) whose last fetch failed: their gaps are still open
+        self._stale = set()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as con:
+            con.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=30)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    # --- Coverage ---
+    def coverage(self, ticker, interval):
+        with self._connect() as con:
+            rows = con.execute(
+                "SELECT start, end FROM coverage WHERE ticker = ? AND interval = ? ORDER BY start",
+                (ticker, interval),
+            ).fetchall()
+        return _merge_ranges(rows)
+
+    def missing_ranges(self, ticker, start, end, interval="1d"):
+        interval = INTERVAL_ALIASES.get(interval, interval)
+        tolerance = min(BAR_SECONDS.get(interval, 86400), 900)
+        return _subtract_ranges(start, end, self.coverage(ticker, interval), tolerance)
+
+    # --- Failed fetches ---
+    def _backing_off(self, ticker, interval, now):
+        failure = self._failures.get((ticker, interval))
+        if failure is None:
+            return False
+        when, misses = failure
+        return now - when < min(FAILURE_BACKOFF * 2 ** (misses - 1), FAILURE_BACKOFF_MAX)
+
+    def _record_failure(self, ticker, interval, now):
+        _, misses = self._failures.get((ticker, interval), (None, 0))
+        self._failures[(ticker, interval)] = (now, misses + 1)
+
+    def stale(self, tickers, interval):
+        """True if the last fetch of any of the tickers failed (their bars may be incomplete)"""
+        interval = INTERVAL_ALIASES.get(interval, interval)
+        return any((t, interval) in self._stale for t in tickers)
+
+    # --- Reads ---
+    def _read(self, con, ticker, interval, start, end):
+        rows = con.execute(
+            "SELECT ts, open, high, low, close, volume FROM bars "
+            "WHERE ticker = ? AND interval = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+            (ticker, interval, start, end),
+        ).fetchall()
+        tz = con.execute("SELECT tz FROM meta WHERE ticker = ?", (ticker,)).fetchone()
+        frame = pd.DataFrame(rows, columns=["ts"] + COLUMNS)
+        index = pd.to_datetime(frame.pop("ts"), unit="s", utc=True)
+        frame.index = pd.DatetimeIndex(index).tz_convert(tz[0] if tz and tz[0] else "UTC")
+        frame.index.name = "Datetime" if BAR_SECONDS.get(interval, 86400) < 86400 else "Date"
+        return frame
+
+    # --- Writes ---
+    def _write(self, ticker, interval, frame, covered):
+        with self._write_lock, self._connect() as con:
+            if frame is not None and not frame.empty:
+                frame = frame.reindex(columns=COLUMNS)
+                idx = frame.index
+                if idx.tz is None:
+                    idx = idx.tz_localize("UTC")
+                else:
+                    con.execute("INSERT OR REPLACE INTO meta (ticker, tz) VALUES (?, ?)", (ticker, str(idx.tz)))
+                ts = idx.as_unit("s").asi8
+                con.executemany(
+                    "INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(ticker, interval, int(t), *map(_float_or_none, row)) for t, row in zip(ts, frame.itertuples(index=False))],
+                )
+            if covered:
+                ranges = con.execute(
+                    "SELECT start, end FROM coverage WHERE ticker = ? AND interval = ?", (ticker, interval)
+                ).fetchall()
+                con.execute("DELETE FROM coverage WHERE ticker = ? AND interval = ?", (ticker, interval))
+                con.executemany(
+                    "INSERT INTO coverage VALUES (?, ?, ?, ?)",
+                    [(ticker, interval, s, e) for s, e in _merge_ranges(ranges + [covered])],
+                )
+
+    # --- Public API ---
+    def get_history(self, tickers, start, end=None, interval="1d", offline=False):
+        """
+        OHLCV bars for each ticker in [start, end] (epoch seconds). Returns {ticker: DataFrame}.
+        Only the uncovered pieces of the range are requested upstream, batched across
+        tickers that share the same gap.
+        """
+        interval = INTERVAL_ALIASES.get(interval, interval)
+        now = int(self.clock())
+        end = now if end is None else min(int(end), now)
+        if interval in INTRADAY_LOOKBACK:
+            start = max(int(start), now - INTRADAY_LOOKBACK[interval] * 86400)
+
+        if not offline:
+            self._fill_gaps(list(dict.fromkeys(tickers)), int(start), end, interval)
+
+        with self._connect() as con:
+            return {t: self._read(con, t, interval, int(start), end) for t in tickers}
+
+    def get_period(self, tickers, period, interval="1d", offline=False):
+        """Same as get_history but with a yfinance-style period ('1d', '1mo', 'max'...)"""
+        frames = self.get_history(tickers, period_start(period, self.clock()), interval=interval, offline=offline)
+        if period in SESSION_PERIODS:
+            frames = {t: trim_sessions(f, SESSION_PERIODS[period]) for t, f in frames.items()}
+        return frames
+
+    def _fill_gaps(self, tickers, start, end, interval):
+        overlap = BAR_SECONDS.get(interval, 86400)
+        provider = self.provider or get_provider()
+        now = self.clock()
+
+        # Whole minutes, so sessions asking at the same time share one upstream request
+        start = start - start % 60
+
+        # Group tickers that are missing exactly the same ranges -> one upstream call each
+        batches = {}
+        for t in tickers:
+            if self._backing_off(t, interval, now):
+                continue
+            # No bars form between the close and the next open: the tail stops at the close
+            t_end = int(min(end, calendar_for(t).data_end(now)))
+            t_end -= t_end % 60
+            for gap in self.missing_ranges(t, start, t_end, interval):
+                batches.setdefault(gap, []).append(t)
+
+        for (gap_start, gap_end), batch in batches.items():
+            try:
+                frames = provider.history(batch, gap_start - overlap, gap_end + overlap, interval)
+            except Exception:
+                # Upstream down: serve what we have, leave the gap open for next time
+                self._stale.update((t, interval) for t in batch)
+                continue
+            for t in batch:
+                if t in frames:
+                    self._write(t, interval, frames[t], (gap_start, gap_end))
+                    self._failures.pop((t, interval), None)
+                    self._stale.discard((t, interval))
+                else:
+                    # No data (delisted, mistyped...): the gap stays open, but not re-asked every call
+                    self._record_failure(t, interval, now)
+                    self._stale.add((t, interval))
+
+
+def _float_or_none(v):
+    return None if pd.isna(v) else float(v)
+
+
+@st.cache_resource
+def get_store():
+    """Process-wide price store shared by every session"""
+    return PriceStore()
@@ -0,0 +1,421 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeout
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+from utils.perf import instrument, timed
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+# Fallback pool size for tickers a bulk quote download can't price
+QUOTE_WORKERS = 8
+
+# Yahoo's reasons for an empty chart that are an answer (nothing listed in the range), not an outage
+NO_DATA_REASONS = ("no data found", "delisted", "doesn't exist", "does not exist")
+
+
+class ProviderError(Exception):
+    """Upstream market data failed after every retry"""
+
+
+class TransientError(ProviderError):
+    """A failure worth retrying (rate limited, upstream briefly down)"""
+
+
+def transient(exc):
+    """
+    Only transport failures are retried: timeouts and dropped connections (requests/curl errors
+    are OSErrors) and rate limits. A bad ticker or a bug fails the same way every time.
+    """
+    return isinstance(exc, (TransientError, OSError))
+
+
+class RateBudget:
+    """
+    Token bucket shared by every thread of a backend: take(n) blocks until n more upstream
+    requests fit in `rate` requests/s, with bursts of up to `burst`.
+    """
+
+    def __init__(self, rate=4.0, burst=20, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._refilled = clock()
+        self.taken = 0
+
+    def take(self, n=1):
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            wait = 0.0 if self._tokens >= n else (n - self._tokens) / self.rate
+            self._tokens -= n
+            self.taken += n
+        if wait:
+            self.sleep(wait)
+
+
+class MarketDataProvider(ABC):
+    """
+    Interface for market-data backends.
+
+    history(): {ticker: OHLCV DataFrame} for [start, end) epoch seconds. An empty frame
+        means no bars in the range (delisted or mistyped tickers included); a ticker missing
+        from the result failed and is asked for again later.
+    quotes(): (prices, errors) -> {ticker: last price}, {ticker: reason}
+    info(): dict of descriptive fields (longName, sector, marketCap...)
+    """
+
+    @abstractmethod
+    def history(self, tickers, start, end, interval):
+        ...
+
+    @abstractmethod
+    def quotes(self, tickers):
+        ...
+
+    @abstractmethod
+    def info(self, ticker):
+        ...
+
+
+class YFinanceProvider(MarketDataProvider):
+    """
+    Yahoo Finance via yfinance (imported lazily). Every call is timed for the diagnostics page.
+    Each HTTP request yfinance makes (per-ticker history, bulk download, fast_info) takes one
+    token from the rate budget first.
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget or RateBudget()
+
+    @instrument("yfinance")
+    def history(self, tickers, start, end, interval):
+        import yfinance as yf
+
+        # Raise instead of logging and returning an empty frame (replaces the deprecated raise_errors=True)
+        yf.config.debug.hide_exceptions = False
+
+        # One request per ticker (what yf.download does internally), so each ticker's error
+        # comes back with it instead of through yfinance's shared error state
+        frames, errors = {}, []
+        with ThreadPoolExecutor(max_workers=min(QUOTE_WORKERS, len(tickers) or 1)) as pool:
+            futures = {pool.submit(self._ticker_history, yf, t, start, end, interval): t for t in tickers}
+            for future in as_completed(futures):
+                t = futures[future]
+                try:
+                    frames[t] = future.result().reindex(columns=COLUMNS).dropna(how="all")
+                except yf.exceptions.YFPricesMissingError as e:
+                    if not _no_data(e):
+                        # Yahoo status-code or chart error: the gap stays open for another try
+                        errors.append(TransientError(str(e)))
+                        continue
+                    # Delisted, mistyped or nothing in range: that's the answer, not a failure
+                    frames[t] = pd.DataFrame(columns=COLUMNS)
+                except yf.exceptions.YFInvalidPeriodError:
+                    frames[t] = pd.DataFrame(columns=COLUMNS)
+                except yf.exceptions.YFRateLimitError as e:
+                    errors.append(TransientError(str(e)))
+                except Exception as e:
+                    errors.append(e)
+        if errors and not frames:
+            raise next((e for e in errors if transient(e)), errors[0])
+        return frames
+
+    @instrument("yfinance")
+    def quotes(self, tickers):
+        import yfinance as yf
+
+        prices, errors = {}, {}
+
+        # 1. One bulk call for the whole list (yf.download still makes a request per ticker)
+        try:
+            self.budget.take(len(tickers))
+            data = yf.download(tickers, period="5d", interval="1d", progress=False, group_by="ticker")
+            if not data.empty:
+                for t in tickers:
+                    p = _last_close(data, t)
+                    if p:
+                        prices[t] = p
+        except Exception as e:
+            errors = {t: str(e) for t in tickers}
+
+        # 2. Whatever the bulk call missed: bounded concurrent fast_info lookups
+        missing = [t for t in tickers if t not in prices]
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(QUOTE_WORKERS, len(missing))) as pool:
+                futures = {pool.submit(self._fast_price, yf, t): t for t in missing}
+                for future in as_completed(futures):
+                    t = futures[future]
+                    try:
+                        p = future.result()
+                        if p:
+                            prices[t] = float(p)
+                            errors.pop(t, None)
+                        else:
+                            errors[t] = "No price returned"
+                    except Exception as e:
+                        errors[t] = str(e)
+
+        return prices, errors
+
+    @instrument("yfinance")
+    def info(self, ticker):
+        import yfinance as yf
+
+        self.budget.take()
+        return yf.Ticker(ticker).info
+
+    def _ticker_history(self, yf, ticker, start, end, interval):
+        self.budget.take()
+        with timed("calls", kind="yfinance", name="ticker_history"):
+            return yf.Ticker(ticker).history(
+                start=pd.Timestamp(start, unit="s", tz="UTC"), end=pd.Timestamp(end, unit="s", tz="UTC"),
+                interval=interval,
+            )
+
+    def _fast_price(self, yf, ticker):
+        self.budget.take()
+        with timed("calls", kind="yfinance", name="fast_info"):
+            return yf.Ticker(ticker).fast_info['last_price']
+
+
+def _no_data(exc):
+    """
+    True if a YFPricesMissingError means Yahoo has no prices for the symbol/range. yfinance also
+    raises it for HTTP status-code and chart errors, which must not be stored as an empty range.
+    """
+    if "status_code" in (getattr(exc, "debug_info", None) or ""):
+        return False
+    reason = getattr(exc, "yahoo_reason", None)
+    if reason is not None:
+        return any(r in reason.lower() for r in NO_DATA_REASONS)
+    return True
+
+
+def _last_close(data, ticker):
+    if isinstance(data.columns, pd.MultiIndex):
+        if ticker not in data.columns.get_level_values(0):
+            return None
+        closes = data[ticker]['Close']
+    else:
+        closes = data['Close']
+    closes = closes.dropna()
+    return float(closes.iloc[-1]) if not closes.empty else None
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Serves recorded data from disk, for offline use and tests.
+
+        <root>/<interval>/<TICKER>.csv   OHLCV with an epoch-seconds 'ts' column
+        <root>/info/<TICKER>.json        info dict
+
+    Tickers with no file have no data (empty frame), not a failure.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._frames = {}
+
+    def _path(self, ticker, interval):
+        return self.root / interval / f"{ticker}.csv"
+
+    def _load(self, ticker, interval):
+        key = (ticker, interval)
+        if key not in self._frames:
+            path = self._path(ticker, interval)
+            if path.exists():
+                frame = pd.read_csv(path)
+                frame.index = pd.to_datetime(frame.pop("ts"), unit="s", utc=True)
+                self._frames[key] = frame.reindex(columns=COLUMNS)
+            else:
+                self._frames[key] = pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([], tz="UTC"))
+        return self._frames[key]
+
+    def save(self, ticker, interval, frame):
+        """Record bars (e.g. from another provider) for later replay"""
+        path = self._path(ticker, interval)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        out = frame.reindex(columns=COLUMNS).copy()
+        out.insert(0, "ts", out.index.as_unit("s").asi8)
+        out.to_csv(path, index=False)
+        self._frames.pop((ticker, interval), None)
+
+    def history(self, tickers, start, end, interval):
+        lo = pd.Timestamp(start, unit="s", tz="UTC")
+        hi = pd.Timestamp(end, unit="s", tz="UTC")
+        frames = {}
+        for t in tickers:
+            frame = self._load(t, interval)
+            frames[t] = frame[(frame.index >= lo) & (frame.index < hi)]
+        return frames
+
+    def quotes(self, tickers):
+        prices, errors = {}, {}
+        for t in tickers:
+            closes = self._load(t, "1d")["Close"].dropna()
+            if closes.empty:
+                errors[t] = "No recorded data"
+            else:
+                prices[t] = float(closes.iloc[-1])
+        return prices, errors
+
+    def info(self, ticker):
+        path = self.root / "info" / f"{ticker}.json"
+        return json.loads(path.read_text()) if path.exists() else {}
+
+
+class CoalescingProvider(MarketDataProvider):
+    """
+    Wraps a backend shared by every session in the process.
+
+    - single-flight: a ticker already being fetched for the same request joins that fetch
+    - batching: compatible requests arriving within batch_window go upstream as one call
+    - retries: exponential backoff between retries of transient failures
+    - timeout: a caller waits at most `timeout` seconds for its flight, then gets ProviderError
+
+    The rate budget is charged by the backend (RateBudget), per HTTP request it actually makes:
+    one batched call here can fan out to a request per ticker.
+    """
+
+    def __init__(self, backend, batch_window=0.02, retries=3, backoff=0.5, timeout=60.0, sleep=time.sleep):
+        self.backend = backend
+        self.batch_window = batch_window
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.sleep = sleep
+
+        self._lock = threading.Lock()
+        self._inflight = {}  # (kind, group, ticker) -> Future, pending or running
+        self._pending = {}   # (kind, group) -> {ticker: Future}, still collecting
+
+        self.upstream_calls = 0
+
+    def _call_upstream(self, call, tickers):
+        error = None
+        for attempt in range(self.retries):
+            try:
+                self.upstream_calls += 1
+                return call(tickers)
+            except Exception as e:
+                if not transient(e):
+                    raise ProviderError(str(e)) from e
+                error = e
+                if attempt < self.retries - 1:
+                    self.sleep(self.backoff * 2 ** attempt)
+        raise ProviderError(str(error)) from error
+
+    # --- Single-flight + batching ---
+    def _submit(self, kind, group, tickers, call):
+        futures = {}
+        start_batch = False
+        with self._lock:
+            batch = self._pending.get((kind, group))
+            for t in tickers:
+                key = (kind, group, t)
+                future = self._inflight.get(key)
+                if future is None:
+                    future = Future()
+                    self._inflight[key] = future
+                    if batch is None:
+                        batch = self._pending[(kind, group)] = {}
+                        start_batch = True
+                    batch[t] = future
+                futures[t] = future
+        if start_batch:
+            threading.Thread(target=self._flush, args=(kind, group, call), daemon=True).start()
+        return futures
+
+    def _flush(self, kind, group, call):
+        if self.batch_window:
+            self.sleep(self.batch_window)
+        with self._lock:
+            batch = self._pending.pop((kind, group))
+        try:
+            result, error = self._call_upstream(call, list(batch)), None
+        except Exception as e:
+            result, error = None, e
+        with self._lock:
+            for t in batch:
+                self._inflight.pop((kind, group, t), None)
+        for future in batch.values():
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _wait(self, kind, group, ticker, future):
+        """Result of a flight, or ProviderError once it has run longer than the timeout"""
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # Let the next caller start a fresh flight instead of joining the hung one
+            with self._lock:
+                if self._inflight.get((kind, group, ticker)) is future:
+                    del self._inflight[(kind, group, ticker)]
+            raise ProviderError(f"{kind} for {ticker} timed out after {self.timeout:g}s") from None
+
+    # --- Interface ---
+    def history(self, tickers, start, end, interval):
+        group = (start, end, interval)
+        futures = self._submit("history", group, list(dict.fromkeys(tickers)),
+                               lambda batch: self.backend.history(batch, start, end, interval))
+        frames = {}
+        for t, future in futures.items():
+            result = self._wait("history", group, t, future)
+            if t in result:
+                frames[t] = result[t]
+        return frames
+
+    def quotes(self, tickers):
+        futures = self._submit("quotes", None, list(dict.fromkeys(tickers)), self.backend.quotes)
+        prices, errors = {}, {}
+        for t, future in futures.items():
+            try:
+                batch_prices, batch_errors = self._wait("quotes", None, t, future)
+            except ProviderError as e:
+                errors[t] = str(e)
+                continue
+            if t in batch_prices:
+                prices[t] = batch_prices[t]
+            else:
+                errors[t] = batch_errors.get(t, "No price returned")
+        return prices, errors
+
+    def info(self, ticker):
+        futures = self._submit("info", None, [ticker],
+                               lambda batch: {t: self.backend.info(t) for t in batch})
+        return self._wait("info", None, ticker, futures[ticker])[ticker]
+
+
+_override = None
+
+def use_provider(provider):
+    """Swap the process-wide provider (replay data, fakes in benchmarks). None restores the default."""
+    global _override
+    _override = provider
+
+@st.cache_resource
+def _default_provider():
+    replay_dir = None
+    try:
+        replay_dir = st.secrets.get("MARKET_DATA_DIR")
+    except Exception:
+        pass
+    backend = ReplayProvider(replay_dir) if replay_dir else YFinanceProvider()
+    return CoalescingProvider(backend)
+
+def get_provider():
+    """Market-data provider shared by every session in the process"""
+    return _override or _default_provider()
@@ -0,0 +1,140 @@
+"""
+Risk metrics for many return series at once.
+
+Every function takes one aligned (bars x series) return matrix -- users and benchmarks side by
+side, NaN where a series has no return for a bar -- and works on whole columns, so the cost is
+a few array passes however many portfolios there are.
+"""
+import numpy as np
+import pandas as pd
+
+from utils.price_store import BAR_SECONDS, INTERVAL_ALIASES
+
+RISK_BENCHMARK = "SPY"
+RISK_COLUMNS = ["Volatility %", "Max Drawdown %", "Sharpe", "Sortino", "Beta", "Correlation"]
+
+# Fewer returns than this and a ratio says more about noise than about risk
+MIN_OBSERVATIONS = 3
+
+ROLLING_WINDOW = 21  # bars (about a month of daily bars)
+
+SESSION_SECONDS = 6.5 * 3600
+
+
+def periods_per_year(interval):
+    """Bars per year for annualising: 252 sessions, intraday bars per 6.5h session"""
+    interval = INTERVAL_ALIASES.get(interval, interval)
+    seconds = BAR_SECONDS.get(interval, 86400)
+    if seconds < 86400:
+        return 252 * SESSION_SECONDS / seconds
+    return 252 * 86400 / seconds if seconds < 7 * 86400 else 365.25 * 86400 / seconds
+
+
+def flow_adjusted_returns(values, cost, active):
+    """
+    Per-bar returns of portfolios that receive deposits and withdrawals (bars x portfolios arrays).
+    The change in cost basis between two bars is money moved in or out, not performance,
+    so it's taken out of the value change (time-weighted return). Money coming in is counted
+    as invested from the start of the bar, so a buy into a near-empty portfolio doesn't
+    divide by almost nothing. NaN where there's nothing to measure.
+    """
+    values = np.asarray(values, dtype=float)
+    cost = np.asarray(cost, dtype=float)
+    returns = np.full(values.shape, np.nan)
+    if len(values) < 2:
+        return returns
+    flow = np.diff(cost, axis=0)
+    base = values[:-1] + np.maximum(flow, 0.0)
+    gain = np.diff(values, axis=0) - flow
+    ok = active[:-1] & active[1:] & (values[:-1] > 0) & (base > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns[1:] = np.where(ok, gain / base, np.nan)
+    return returns
+
+
+def price_returns(closes):
+    """Simple returns of a close-price frame (gaps stay NaN instead of being filled)"""
+    return closes.pct_change(fill_method=None)
+
+
+def _drawdown(returns):
+    """Worst peak-to-trough fall of every column, as a negative fraction"""
+    growth = np.cumprod(1.0 + np.nan_to_num(returns, nan=0.0), axis=0)
+    peak = np.maximum.accumulate(growth, axis=0)
+    return (growth / peak - 1.0).min(axis=0, initial=0.0)
+
+
+def risk_metrics(returns, benchmark, periods=252, risk_free=0.0):
+    """
+    Volatility, max drawdown, Sharpe, Sortino, beta and correlation for every column of `returns`.
+
+    returns: DataFrame (bars x series); benchmark: Series on the same index (e.g. SPY returns).
+    Ratios are annualised with `periods` bars per year; risk_free is an annual rate.
+    Returns a DataFrame indexed like returns.columns with RISK_COLUMNS.
+    """
+    r = returns.to_numpy(dtype=float)
+    b = benchmark.reindex(returns.index).to_numpy(dtype=float)[:, None]
+    valid = ~np.isnan(r)
+    n = valid.sum(axis=0)
+
+    excess = r - risk_free / periods
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(valid, excess, 0.0).sum(axis=0) / n
+        dev = np.where(valid, r - np.where(valid, r, 0.0).sum(axis=0) / n, 0.0)
+        std = np.sqrt((dev ** 2).sum(axis=0) / (n - 1))
+        downside = np.sqrt((np.where(valid, np.minimum(excess, 0.0), 0.0) ** 2).sum(axis=0) / n)
+
+        # Beta/correlation only over bars where both the series and the benchmark have a return
+        both = valid & ~np.isnan(b)
+        m = both.sum(axis=0)
+        rx = np.where(both, r, 0.0)
+        bx = np.where(both, b, 0.0)
+        rx = np.where(both, rx - rx.sum(axis=0) / m, 0.0)
+        bx = np.where(both, bx - bx.sum(axis=0) / m, 0.0)
+        cov = (rx * bx).sum(axis=0)
+        var_b = (bx ** 2).sum(axis=0)
+        var_r = (rx ** 2).sum(axis=0)
+
+        scale = np.sqrt(periods)
+        table = {
+            "Volatility %": std * scale * 100,
+            "Max Drawdown %": _drawdown(r) * 100,
+            "Sharpe": mean / std * scale,
+            "Sortino": mean / downside * scale,
+            "Beta": cov / var_b,
+            "Correlation": cov / np.sqrt(var_b * var_r),
+        }
+
+    enough = n >= MIN_OBSERVATIONS
+    paired = m >= MIN_OBSERVATIONS
+    for col, values in table.items():
+        keep = paired if col in ("Beta", "Correlation") else enough
+        table[col] = np.where(keep & np.isfinite(values), values, np.nan)
+    return pd.DataFrame(table, index=returns.columns, columns=RISK_COLUMNS)
+
+
+def rolling_risk(returns, benchmark, window=ROLLING_WINDOW, periods=252):
+    """(annualised volatility %, beta) over a trailing window of bars, for every column"""
+    min_periods = max(MIN_OBSERVATIONS, window // 2)
+    rolling = returns.rolling(window, min_periods=min_periods)
+    volatility = rolling.std() * np.sqrt(periods) * 100
+    benchmark = benchmark.reindex(returns.index)
+    beta = rolling.cov(benchmark, pairwise=False).div(benchmark.rolling(window, min_periods=min_periods).var(), axis=0)
+    return volatility, beta
+
+
+def history_returns(history):
+    """
+    Per-bar returns of one analytics history frame (Date + Return %, and for portfolios
+    Portfolio Value + Cost Basis) as a Series indexed by Date.
+    """
+    if history.empty:
+        return pd.Series(dtype=float)
+    index = pd.DatetimeIndex(history["Date"])
+    if "Cost Basis" in history.columns:
+        values = history["Portfolio Value"].to_numpy(dtype=float)[:, None]
+        cost = history["Cost Basis"].to_numpy(dtype=float)[:, None]
+        returns = flow_adjusted_returns(values, cost, np.ones(values.shape, dtype=bool))[:, 0]
+        return pd.Series(returns, index=index)
+    growth = pd.Series(1.0 + history["Return %"].to_numpy(dtype=float) / 100, index=index)
+    return price_returns(growth)
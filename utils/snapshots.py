@@ -0,0 +1,238 @@
+"""
+End-of-day portfolio snapshots.
+
+Every user's portfolio value and cost basis (same rules as analytics.replay_matrix) are stored per
+daily bar once the session has settled. Long daily ranges (1M to ALL, the leaderboard) read these
+rows and only replay the bars after the last snapshot, instead of rebuilding years of history from
+raw trades on every cache miss. Weekly ranges replay the weekly bars instead, so a week is valued
+at its own bar like any other interval.
+
+Holdings are not stored here: current positions, lots and realized P&L come from utils.ledger.
+
+The first request after a close extends each user by the new session(s); a user whose already
+snapshotted trades changed (a backdated import, a delete) is rebuilt from their first trade.
+"""
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.market_calendar import settled_until
+from utils.price_store import CACHE_DIR, get_store
+
+DB_PATH = CACHE_DIR / "snapshots.sqlite"
+
+SYNC_BATCH = 50  # users replayed together when building (bounds the bars x positions arrays)
+
+# Closes loaded before the first new bar, so forward-filling has a previous close to carry
+FILL_LOOKBACK = 10 * 86400
+
+# What identifies a trade for the fingerprint (callers may pass more or fewer columns)
+FINGERPRINT_COLUMNS = ["id", "ticker", "action", "price", "quantity", "created_at"]
+NUMERIC_COLUMNS = {"id", "price", "quantity"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    user_name TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    value REAL NOT NULL,
+    cost REAL NOT NULL,
+    PRIMARY KEY (user_name, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS state (
+    user_name TEXT PRIMARY KEY,
+    through INTEGER,
+    checked INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    tz TEXT
+);
+"""
+
+
+def _trade_hashes(trades_df, times):
+    """
+    One hash per trade (times: their _epochs), for _fingerprint. Values are normalised first: Supabase returns
+    whole-number prices/quantities as ints, so the same trades arrive int64 in one frame and
+    float64 in another (mixed with other users' fractional rows), and timestamps in any offset.
+    """
+    columns = {}
+    for c in FINGERPRINT_COLUMNS:
+        if c not in trades_df.columns:
+            continue
+        if c == "created_at":
+            columns[c] = times
+        elif c in NUMERIC_COLUMNS:
+            columns[c] = pd.to_numeric(trades_df[c], errors="coerce").to_numpy(dtype="float64")
+        else:
+            columns[c] = trades_df[c].astype(str).to_numpy()
+    return pd.util.hash_pandas_object(pd.DataFrame(columns), index=False).to_numpy()
+
+
+def _fingerprint(hashes):
+    """Order-independent hash of a set of trades, from their _trade_hashes"""
+    return str(int(hashes.sum())) if len(hashes) else "0"
+
+
+def _epochs(created_at):
+    return pd.to_datetime(pd.Series(created_at), utc=True, format="ISO8601").dt.as_unit("s").astype("int64").to_numpy()
+
+
+class SnapshotStore:
+    """
+    SQLite table of per-user end-of-day rows (user_name, ts, value, cost), ts being the daily bar
+    time (epoch seconds). state keeps, per user, the last bar stored (`through`), the settle cutoff
+    it was brought up to (`checked`) and a fingerprint of the trades dated at or before `through`.
+    """
+
+    def __init__(self, path=DB_PATH, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._write_lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as con:
+            con.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=30)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    # --- Reads ---
+    def states(self, users=None):
+        """{user: (through, checked, fingerprint, tz)}"""
+        with self._connect() as con:
+            rows = con.execute("SELECT user_name, through, checked, fingerprint, tz FROM state").fetchall()
+        states = {r[0]: r[1:] for r in rows}
+        return states if users is None else {u: states[u] for u in users if u in states}
+
+    def through(self, users):
+        """{user: last stored bar} (users never synced are left out)"""
+        return {u: s[0] for u, s in self.states(users).items() if s[0] is not None}
+
+    def rows(self, users, start=None):
+        """Stored rows of the users from start (epoch seconds) on: DataFrame user_name, ts, value, cost"""
+        users = list(users)
+        if not users:
+            return pd.DataFrame(columns=["user_name", "ts", "value", "cost"])
+        marks = ",".join("?" * len(users))
+        with self._connect() as con:
+            rows = con.execute(
+                f"SELECT user_name, ts, value, cost FROM snapshots WHERE user_name IN ({marks}) AND ts >= ? "
+                "ORDER BY user_name, ts",
+                (*users, int(start) if start is not None else 0),
+            ).fetchall()
+        return pd.DataFrame(rows, columns=["user_name", "ts", "value", "cost"])
+
+    def history(self, user, start=None):
+        """One user's stored rows as an analytics history (Date, Portfolio Value, Cost Basis, Return %)"""
+        rows = self.rows([user], start)
+        tz = self.states([user]).get(user, (None,) * 4)[3] or "UTC"
+        cost = rows["cost"].to_numpy(dtype=float)
+        value = rows["value"].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct = np.where(cost != 0, (value - cost) / cost * 100, 0.0)
+        return pd.DataFrame({
+            "Date": pd.to_datetime(rows["ts"].to_numpy(dtype="int64"), unit="s", utc=True).tz_convert(tz),
+            "Portfolio Value": value,
+            "Cost Basis": cost,
+            "Return %": pct,
+        })
+
+    # --- Writes ---
+    def sync(self, trades_df, now=None):
+        """
+        Brings every user in trades_df up to their last settled session (no-op when nothing closed
+        since the last sync and their settled trades are unchanged). Returns {user: last stored bar}.
+        """
+        if trades_df.empty:
+            return {}
+        now = self.clock() if now is None else now
+        times = _epochs(trades_df['created_at'])
+        hashes = _trade_hashes(trades_df, times)
+        states = self.states()
+
+        work = {}  # user -> (bars after this are (re)built (None: from scratch), settle cutoff)
+        for user, positions in trades_df.groupby('user_name', sort=False).indices.items():
+            rows = trades_df.iloc[positions]
+            cutoff = int(settled_until(rows['ticker'].unique(), now))
+            state = states.get(user)
+            if state is not None:
+                through, checked, fingerprint, _ = state
+                settled = positions[times[positions] <= (through if through is not None else -1)]
+                if _fingerprint(hashes[settled]) == fingerprint:
+                    if checked < cutoff:
+                        work[user] = (through, cutoff)
+                    continue
+            work[user] = (None, cutoff)
+
+        users = list(work)
+        for i in range(0, len(users), SYNC_BATCH):
+            batch = users[i:i + SYNC_BATCH]
+            self._build(trades_df[trades_df['user_name'].isin(batch)], {u: work[u] for u in batch})
+        return self.through(trades_df['user_name'].unique())
+
+    def _build(self, trades_df, work):
+        """Replays the users' trades over daily closes and stores the new settled bars"""
+        from utils.analytics import _closes_frame, replay_matrix
+
+        times = _epochs(trades_df['created_at'])
+        hashes = _trade_hashes(trades_df, times)
+        first = {u: times[i].min() for u, i in trades_df.groupby('user_name', sort=False).indices.items()}
+        start = min(max(after or 0, first[u]) for u, (after, _) in work.items()) - FILL_LOOKBACK
+        end = max(cutoff for _, cutoff in work.values())
+        tickers = trades_df['ticker'].unique().tolist()
+
+        raw = _closes_frame(get_store().get_history(tickers, start, end, interval="1d"))
+        if raw.empty:
+            return
+        history = raw.ffill()
+        ts = history.index.as_unit("s").asi8
+        groups, values, cost, active = replay_matrix(trades_df, history, group_col='user_name')
+
+        tz = str(history.index.tz or "UTC")
+        snapshot_rows, states, rebuilt = [], [], []
+        for g, user in enumerate(groups):
+            after, cutoff = work[user]
+            lower = after if after is not None else -1
+            user_rows = trades_df['user_name'].to_numpy() == user
+            # Only bars one of the user's own tickers traded on (others come from the shared index)
+            own = raw.reindex(columns=trades_df.loc[user_rows, 'ticker'].unique()).notna().any(axis=1).to_numpy()
+            settled = own & (ts < cutoff)
+            keep = settled & active[:, g] & (ts > lower)
+            snapshot_rows += zip([user] * int(keep.sum()), ts[keep].tolist(), values[keep, g].tolist(), cost[keep, g].tolist())
+
+            through = int(ts[settled].max()) if settled.any() else after
+            fingerprint = _fingerprint(hashes[user_rows & (times <= (through if through is not None else -1))])
+            states.append((user, through, cutoff, fingerprint, tz))
+            if after is None:
+                rebuilt.append(user)
+
+        with self._write_lock, self._connect() as con:
+            for user in rebuilt:
+                con.execute("DELETE FROM snapshots WHERE user_name = ?", (user,))
+            con.executemany("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)", snapshot_rows)
+            con.executemany("INSERT OR REPLACE INTO state VALUES (?, ?, ?, ?, ?)", states)
+
+    def discard(self, user=None):
+        """Forget stored rows (one user, or everyone); they're rebuilt on the next sync"""
+        with self._write_lock, self._connect() as con:
+            for table in ("snapshots", "state"):
+                if user is None:
+                    con.execute(f"DELETE FROM {table}")
+                else:
+                    con.execute(f"DELETE FROM {table} WHERE user_name = ?", (user,))
+
+
+@st.cache_resource
+def get_snapshots():
+    """Process-wide snapshot store shared by every session"""
+    return SnapshotStore()
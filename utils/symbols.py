@@ -0,0 +1,243 @@
+"""
+Local symbol universe with prefix and fuzzy search (no network on lookups).
+
+    python -m utils.symbols --refresh     # rebuild assets/symbols.csv from the Nasdaq Trader and SEC listings
+"""
+import argparse
+import csv
+import io
+import json
+import re
+import sys
+from bisect import bisect_left
+from collections import namedtuple
+from pathlib import Path
+
+import streamlit as st
+
+UNIVERSE_PATH = Path("assets") / "symbols.csv"
+
+# Full exchange listings (Nasdaq + NYSE/ARCA/other), pipe-delimited, refreshed nightly by Nasdaq
+LISTING_URLS = {
+    "nasdaqlisted": "https://www.nasdaqtrader.com/dynamic/symdir/nasdaqlisted.txt",
+    "otherlisted": "https://www.nasdaqtrader.com/dynamic/symdir/otherlisted.txt",
+}
+OTHER_EXCHANGES = {"A": "NYSE AMERICAN", "N": "NYSE", "P": "NYSE ARCA", "Z": "CBOE", "V": "IEX"}
+
+# SEC's ticker file adds what the exchange listings leave out (OTC names); the SEC asks for a User-Agent
+SEC_TICKERS_URL = "https://www.sec.gov/files/company_tickers_exchange.json"
+SEC_EXCHANGES = {"Nasdaq": "NASDAQ", "NYSE": "NYSE", "OTC": "OTC", "CBOE": "CBOE"}
+USER_AGENT = "WaddleWealth symbol refresh"
+
+# One-letter Yahoo exchange suffixes (VOD.L, SAP.F, ...): a dot before one of these is a
+# foreign listing, not a US share class, and is kept
+EXCHANGE_SUFFIXES = {"L", "F", "V", "T"}
+
+Symbol = namedtuple("Symbol", ["symbol", "name", "exchange"])
+
+_WORD = re.compile(r"[a-z0-9]+")
+_TICKER = re.compile(r"\^?[A-Z0-9]{1,6}([-.][A-Z0-9]{1,4})?(=[A-Z])?")
+_SHARE_CLASS = re.compile(r"([A-Z]{1,4})[./]([A-Z])")
+
+
+def _deletions(text):
+    return {text[:i] + text[i + 1:] for i in range(len(text))}
+
+
+class SymbolIndex:
+    """
+    In-memory index over the symbol universe.
+
+    - symbols and name words are kept sorted, so a prefix query is two bisects
+    - fuzzy symbol matches use a deletion neighbourhood (every symbol with one character
+      dropped), which finds anything one edit away with a handful of dict lookups
+    """
+
+    def __init__(self, rows):
+        self.by_symbol = {}
+        for r in rows:
+            symbol = r.symbol.strip().upper()
+            if symbol and symbol not in self.by_symbol:
+                self.by_symbol[symbol] = Symbol(symbol, r.name.strip(), r.exchange.strip())
+
+        self._symbols = sorted(self.by_symbol)
+        self._words = sorted({(w, s) for s, row in self.by_symbol.items() for w in _WORD.findall(row.name.lower())})
+        self._word_keys = [w for w, _ in self._words]
+
+        self._neighbours = {}
+        for s in self._symbols:
+            for variant in _deletions(s) | {s}:
+                self._neighbours.setdefault(variant, []).append(s)
+
+    def __len__(self):
+        return len(self.by_symbol)
+
+    def __contains__(self, symbol):
+        return normalize(symbol) in self.by_symbol
+
+    def get(self, symbol):
+        return self.by_symbol.get(normalize(symbol))
+
+    def _prefixed(self, keys, prefix, limit):
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + "\uffff", lo=start)
+        return range(start, min(end, start + limit))
+
+    def prefix(self, text, limit=10):
+        """Symbols starting with text, shortest first"""
+        text = normalize(text)
+        if not text:
+            return []
+        hits = [self._symbols[i] for i in self._prefixed(self._symbols, text, limit * 5)]
+        return sorted(hits, key=lambda s: (len(s), s))[:limit]
+
+    def by_name(self, text, limit=10):
+        """Symbols whose name has a word starting with text ('appl' -> AAPL)"""
+        words = _WORD.findall(text.lower())
+        if not words:
+            return []
+        # Every word of the query has to prefix some word of the name
+        candidates = None
+        for w in words:
+            found = {self._words[i][1] for i in self._prefixed(self._word_keys, w, 200)}
+            candidates = found if candidates is None else candidates & found
+            if not candidates:
+                return []
+        return sorted(candidates, key=lambda s: (len(self.by_symbol[s].name), s))[:limit]
+
+    def fuzzy(self, text, limit=10):
+        """Symbols within one edit (insert, delete, substitute) of text"""
+        text = normalize(text)
+        if not text:
+            return []
+        hits = []
+        for variant in _deletions(text) | {text}:
+            hits.extend(self._neighbours.get(variant, ()))
+        hits = [s for s in dict.fromkeys(hits) if s != text]
+        return sorted(hits, key=lambda s: (abs(len(s) - len(text)), s))[:limit]
+
+    def search(self, text, limit=8):
+        """Autocomplete: exact symbol, symbol prefix, name words, then near-miss symbols"""
+        text = text.strip()
+        results = []
+        exact = self.get(text)
+        if exact:
+            results.append(exact.symbol)
+        results += self.prefix(text, limit)
+        results += self.by_name(text, limit)
+        results += self.fuzzy(text, limit)
+        return [self.by_symbol[s] for s in dict.fromkeys(results)][:limit]
+
+
+
+def normalize(symbol):
+    """
+    User input -> Yahoo-style symbol: upper case, US share classes with '-' (BRK.B -> BRK-B).
+    Other dots are exchange suffixes and stay (VWRL.L, SHOP.TO), as do futures and FX (GC=F, EURUSD=X).
+    """
+    symbol = (symbol or "").strip().upper()
+    share_class = _SHARE_CLASS.fullmatch(symbol)
+    if share_class and share_class.group(2) not in EXCHANGE_SUFFIXES:
+        return f"{share_class.group(1)}-{share_class.group(2)}"
+    return symbol.replace("/", "-")
+
+
+def _listing_symbol(symbol):
+    """Exchange-listing symbol -> Yahoo style (the listings only hold US symbols, so every dot is a class separator)"""
+    return symbol.strip().upper().replace(".", "-").replace("/", "-")
+
+
+def load_universe(path=UNIVERSE_PATH):
+    with open(path, newline="") as f:
+        return SymbolIndex(Symbol(r["symbol"], r.get("name") or "", r.get("exchange") or "") for r in csv.DictReader(f))
+
+
+@st.cache_resource
+def get_symbol_index():
+    """Process-wide symbol index, built once from the bundled universe file"""
+    return load_universe()
+
+
+def is_valid_symbol(symbol, index=None):
+    """
+    True for a symbol in the local universe, False for text that can't be a symbol, and None
+    (unverified) for anything else: the universe lists US exchange and OTC symbols, not mutual
+    funds, futures, FX pairs or foreign listings, so confirm those another way (a price lookup).
+    Pass index when checking many symbols in a loop.
+    """
+    if index is None:
+        index = get_symbol_index()
+    if symbol in index:
+        return True
+    return None if looks_like_symbol(symbol) else False
+
+
+def looks_like_symbol(text):
+    return bool(_TICKER.fullmatch(normalize(text)))
+
+
+# --- Refresh from the exchange listings ---
+def _parse_listing(text, symbol_col, exchange_of):
+    rows = []
+    reader = csv.DictReader(io.StringIO(text), delimiter="|")
+    for r in reader:
+        symbol = r.get(symbol_col) or ""
+        if not symbol or symbol.startswith("File Creation Time") or r.get("Test Issue") == "Y":
+            continue
+        name = (r.get("Security Name") or "").split(" - ")[0]
+        rows.append(Symbol(_listing_symbol(symbol), name, exchange_of(r)))
+    return rows
+
+
+def _parse_sec(text):
+    payload = json.loads(text)
+    rows = []
+    for record in payload["data"]:
+        r = dict(zip(payload["fields"], record))
+        if r.get("ticker") and r.get("exchange"):
+            rows.append(Symbol(_listing_symbol(r["ticker"]), r.get("name") or "", SEC_EXCHANGES.get(r["exchange"], r["exchange"].upper())))
+    return rows
+
+
+def refresh_universe(path=UNIVERSE_PATH):
+    """Download the current listings and rewrite the universe file. Returns the number of symbols."""
+    from urllib.request import Request, urlopen
+
+    def fetch(url):
+        with urlopen(Request(url, headers={"User-Agent": USER_AGENT}), timeout=30) as response:
+            return response.read().decode("utf-8", errors="replace")
+
+    rows = _parse_listing(fetch(LISTING_URLS["nasdaqlisted"]), "Symbol", lambda r: "NASDAQ")
+    rows += _parse_listing(fetch(LISTING_URLS["otherlisted"]), "ACT Symbol",
+                           lambda r: OTHER_EXCHANGES.get(r.get("Exchange"), r.get("Exchange") or ""))
+    # Exchange listings win on names; SEC only adds symbols they don't have
+    rows += _parse_sec(fetch(SEC_TICKERS_URL))
+
+    # Keep the non-listed extras (indices, crypto pairs) from the current file
+    current = load_universe(path) if Path(path).exists() else SymbolIndex([])
+    listed = {r.symbol for r in rows}
+    rows += [s for s in current.by_symbol.values() if s.exchange in ("INDEX", "CRYPTO") and s.symbol not in listed]
+
+    index = SymbolIndex(rows)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(Symbol._fields)
+        writer.writerows(sorted(index.by_symbol.values()))
+    return len(index)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--refresh", action="store_true", help="rebuild the universe file from the exchange listings")
+    parser.add_argument("--path", default=UNIVERSE_PATH, help="universe file (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.refresh:
+        print(f"{refresh_universe(args.path)} symbols written to {args.path}")
+    else:
+        index = load_universe(args.path)
+        print(f"{len(index)} symbols in {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,43 +1,30 @@
 import streamlit as st
-import datetime
-import pytz
-import yfinance as yf
-import pandas as pd
+from utils.db import get_write_queue
+from utils.market_calendar import get_market_status
+from utils.poller import get_poller
+from utils.symbols import get_symbol_index, is_valid_symbol, normalize
+
+TAPE_SYMBOLS = {"SPY": "SPY", "QQQ": "QQQ", "BTC-USD": "BTC", "^VIX": "VIX"}
+
+# Seconds between tape refreshes (reads the shared quote board, no network)
+TAPE_REFRESH = 30
+
+# Seconds between checks on writes still in the queue
+WRITE_STATUS_REFRESH = 1
+WRITE_NAMES = {"trade": "trade", "delete_trade": "trade delete", "profile": "profile changes"}
 
-@st.cache_data(ttl=60)
 def get_market_tape():
-    symbols = {"SPY": "SPY", "QQQ": "QQQ", "BTC-USD": "BTC", "^VIX": "VIX"}
-    tickers = list(symbols.keys())
-    try:
-        data = yf.download(tickers, period="5d", interval="1d", progress=False)['Close']
-        tape_data = []
-        for t in tickers:
-            series = None
-            if t in data.columns:
-                series = data[t]
-            
-            if series is not None:
-                series = series.dropna()
-                if len(series) >= 2:
-                    curr = series.iloc[-1]
-                    prev = series.iloc[-2]
-                    pct = ((curr - prev) / prev) * 100
-                    tape_data.append({"name": symbols[t], "price": curr, "pct": pct})
-        return tape_data
-    except:
-        return []
-
-def get_market_status():
-    tz = pytz.timezone('US/Eastern')
-    now = datetime.datetime.now(tz)
-    is_weekday = now.weekday() < 5
-    current_hour = now.hour + (now.minute / 60)
-    is_open = is_weekday and (9.5 <= current_hour < 16.0)
-    
-    color = "#00FF00" if is_open else "#888888"
-    status_text = "Market Open" if is_open else "Market Closed"
-    date_str = now.strftime("%B %d")
-    return color, status_text, date_str
+    poller = get_poller()
+    poller.watch(list(TAPE_SYMBOLS), wait=True)
+    board = poller.snapshot()
+
+    tape_data = []
+    for t, name in TAPE_SYMBOLS.items():
+        q = board.get(t)
+        if q and q["prev_close"]:
+            pct = ((q["price"] - q["prev_close"]) / q["prev_close"]) * 100
+            tape_data.append({"name": name, "price": q["price"], "pct": pct})
+    return tape_data
 
 def render_top_bar():
     with open("assets/style.css") as f:
@@ -47,25 +34,50 @@ def render_top_bar():
     c1, c2 = st.columns([1, 1], gap="medium", vertical_alignment="center")
     
     with c1:
+        index = get_symbol_index()
+
+        def open_symbol(symbol):
+            st.session_state["selected_ticker"] = symbol
+            st.session_state["trigger_redirect"] = True
+
         def handle_search():
-            if st.session_state["top_search"]:
-                st.session_state["selected_ticker"] = st.session_state["top_search"].upper()
-                st.session_state["top_search"] = ""
-                st.session_state["trigger_redirect"] = True
+            query = st.session_state["top_search"].strip()
+            st.session_state["top_search"] = ""
+            if not query:
+                return
+            # Exact symbols go straight through; anything else gets suggestions (no network either way)
+            if is_valid_symbol(query, index):
+                open_symbol(normalize(query))
+            else:
+                st.session_state["search_query"] = query
 
         st.text_input(
             "Search", key="top_search", 
-            placeholder="Search assets (e.g. NVDA)...", 
+            placeholder="Search assets (e.g. NVDA, apple)...", 
             label_visibility="collapsed", 
             on_change=handle_search
         )
+
+        # Suggestions show for one run: picking one (or doing anything else) dismisses them
+        query = st.session_state.pop("search_query", None)
+        if query:
+            matches = index.search(query, limit=4)
+            for m in matches:
+                st.button(f"{m.symbol} · {m.name}", key=f"search_{m.symbol}", on_click=open_symbol, args=(m.symbol,))
+            # Funds, futures, FX and foreign listings aren't in the universe, so offer the symbol as typed too
+            if is_valid_symbol(query, index) is None:
+                st.button(f"Open {normalize(query)}", key="search_as_typed", on_click=open_symbol, args=(normalize(query),))
+            elif not matches:
+                st.caption(f"No symbol matches “{query}”.")
         
         if st.session_state.get("trigger_redirect"):
             st.session_state["trigger_redirect"] = False
             st.switch_page("views/stock.py")
 
     with c2:
-        color, status, date = get_market_status()
+        market = get_market_status()
+        color = "#00FF00" if market.is_open else "#888888"
+        status, date = market.label, market.date
         st.markdown(f"""
             <div style="display: flex; justify-content: flex-end; align-items: center; color: #666; font-size: 13px; font-family: sans-serif;">
                 <span style="color: {color}; font-weight: bold; margin-right: 8px;">● {status.upper()}</span>
@@ -74,6 +86,10 @@ def render_top_bar():
         """, unsafe_allow_html=True)
 
     # 2. MARKET TAPE
+    render_market_tape()
+
+@st.fragment(run_every=TAPE_REFRESH)
+def render_market_tape():
     tape = get_market_tape()
     if tape:
         html_items = ""
@@ -95,3 +111,33 @@ def render_top_bar():
 {html_items}
 </div>
 """, unsafe_allow_html=True)
+
+def render_write_status():
+    """Status channel of the write-behind queue: toasts for saved writes, retry/dismiss for failed ones"""
+    username = st.session_state["user"]["username"]
+    queue = get_write_queue()
+
+    for notice in queue.notices(username):
+        if notice["ok"] and notice["label"]:
+            st.toast(f"✅ {notice['label']}")
+
+    for op in queue.failed(username):
+        c1, c2, c3 = st.columns([6, 1, 1], vertical_alignment="center")
+        what = WRITE_NAMES.get(op["kind"], op["kind"])
+        if op["kind"] == "trade":
+            what += f" ({op['data']['action']} {op['data']['ticker']})"
+        c1.error(f"Couldn't save {what}: {op['error']}")
+        c2.button("Retry", key=f"retry_{op['key']}", on_click=queue.retry, args=(op["key"],), use_container_width=True)
+        c3.button("Dismiss", key=f"dismiss_{op['key']}", on_click=queue.dismiss, args=(op["key"],), use_container_width=True)
+
+    if queue.pending(user=username):
+        render_pending_writes(username)
+
+@st.fragment(run_every=WRITE_STATUS_REFRESH)
+def render_pending_writes(username):
+    pending = get_write_queue().pending(user=username)
+    if pending:
+        st.caption(f"Saving {len(pending)} change{'s' if len(pending) > 1 else ''}...")
+    else:
+        # Everything landed: rerun the page so it reads the stored writes
+        st.rerun()
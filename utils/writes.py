@@ -0,0 +1,232 @@
+import atexit
+import threading
+import time
+import uuid
+from collections import deque
+
+from utils.perf import METRICS
+
+# Writes arriving this soon after the first one go out in the same batch
+BATCH_WINDOW = 0.05
+BATCH_SIZE = 200  # ops per handler call
+
+# Retries back off RETRY_BASE * 2^n seconds (capped) before a write is reported as failed
+MAX_ATTEMPTS = 5
+RETRY_BASE = 1.0
+RETRY_CAP = 30.0
+
+# How long shutdown waits for queued writes to go out
+EXIT_TIMEOUT = 10.0
+
+NOTICES = 50  # finished writes remembered per user for the status channel
+
+
+# Server answers worth retrying. postgrest-py passes the HTTP status as the code when the body isn't
+# a PostgREST error (gateway 5xx, rate limits); PostgREST's own PGRST00x codes are connection and
+# pool timeouts; Postgres SQLSTATE classes 08/40/53/57 are lost connections, serialization
+# failures and deadlocks, exhausted resources and statement timeouts/shutdowns.
+RETRY_STATUS = {408, 425, 429}
+RETRY_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003"}
+RETRY_SQLSTATE_CLASSES = {"08", "40", "53", "57"}
+
+
+def permanent(exc):
+    """
+    Errors the server answered with (constraint, bad column...) won't go away by retrying;
+    dropped connections, 5xx, rate limits and timeouts will.
+    """
+    code = getattr(exc, "code", None)
+    if code is None:
+        return False
+    code = str(code)
+    if code.isdigit() and len(code) == 3:
+        status = int(code)
+        return not (status >= 500 or status in RETRY_STATUS)
+    return code not in RETRY_CODES and code[:2] not in RETRY_SQLSTATE_CLASSES
+
+
+class WriteQueue:
+    """
+    Write-behind queue: submit() returns at once and a background thread sends the writes
+    in batches, one handler call per kind of write.
+
+    handlers: {kind: fn(list of ops)} -- ops are dicts {"key", "kind", "user", "data", "label", ...};
+    a handler raises if the batch wasn't written. Keys are unique per write, so handlers can pass
+    them to the server as idempotency keys and a retried batch never writes a row twice.
+
+    Status channel: pending()/failed() for what's in flight or stuck, notices() for what finished.
+    """
+
+    def __init__(self, handlers, clock=time.time, batch_window=BATCH_WINDOW):
+        self.handlers = handlers
+        self.clock = clock
+        self.batch_window = batch_window
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._ops = {}       # key -> op, in submit order
+        self._notices = {}   # user -> deque of {"key", "kind", "label", "ok", "error", "at"}
+        self._thread = None
+        self._wake = threading.Event()
+        atexit.register(self.close)
+
+    def submit(self, kind, user, data, label=None, coalesce=False):
+        """
+        Queues a write and returns its key. coalesce=True merges data into a queued, not yet sent
+        write of the same kind and user (last value wins), e.g. profile edits.
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown write kind {kind!r}")
+        with self._lock:
+            if coalesce:
+                for op in self._ops.values():
+                    if op["kind"] == kind and op["user"] == user and op["status"] == "pending":
+                        op["data"].update(data)
+                        op["label"] = label or op["label"]
+                        self._wake.set()
+                        return op["key"]
+            key = uuid.uuid4().hex
+            self._ops[key] = {
+                "key": key, "kind": kind, "user": user, "data": dict(data), "label": label,
+                "status": "pending", "attempts": 0, "due": 0.0, "error": None,
+                "queued": self.clock(), "solo": False,
+            }
+        METRICS.count("writes", kind=kind, result="queued")
+        self._start()
+        self._wake.set()
+        return key
+
+    def pending(self, user=None, kind=None):
+        """Writes not stored yet (queued, sending or waiting to retry), oldest first"""
+        with self._lock:
+            return [dict(op) for op in self._ops.values()
+                    if op["status"] != "failed" and (user is None or op["user"] == user)
+                    and (kind is None or op["kind"] == kind)]
+
+    def failed(self, user=None):
+        """Writes that ran out of retries (or were refused); they stay until retried or dismissed"""
+        with self._lock:
+            return [dict(op) for op in self._ops.values()
+                    if op["status"] == "failed" and (user is None or op["user"] == user)]
+
+    def notices(self, user):
+        """Writes of a user that finished since the last call (each is reported once)"""
+        with self._lock:
+            found = self._notices.pop(user, ())
+        return list(found)
+
+    def retry(self, key):
+        with self._lock:
+            op = self._ops.get(key)
+            if op is None or op["status"] != "failed":
+                return
+            op.update(status="pending", attempts=0, due=0.0, error=None)
+        self._start()
+        self._wake.set()
+
+    def dismiss(self, key):
+        with self._lock:
+            op = self._ops.get(key)
+            if op is not None and op["status"] == "failed":
+                del self._ops[key]
+                self._idle.notify_all()
+
+    def wait(self, timeout=None):
+        """Block until nothing is queued or sending (failed writes don't count). False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while any(op["status"] != "failed" for op in self._ops.values()):
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    return False
+                self._idle.wait(left)
+        return True
+
+    def flush(self, force=False):
+        """Sends every due write (force: ignore retry backoff). Returns the number of ops attempted."""
+        now = self.clock()
+        with self._lock:
+            due = [op for op in self._ops.values()
+                   if op["status"] == "pending" and (force or op["due"] <= now)]
+            for op in due:
+                op["status"] = "sending"
+
+        # One handler call per kind (BATCH_SIZE ops at a time); ops split out after a refused batch go alone
+        for kind in self.handlers:
+            ops = [op for op in due if op["kind"] == kind]
+            solo = [[op] for op in ops if op["solo"]]
+            ops = [op for op in ops if not op["solo"]]
+            for batch in [ops[i:i + BATCH_SIZE] for i in range(0, len(ops), BATCH_SIZE)] + solo:
+                self._send(kind, batch)
+        return len(due)
+
+    def _send(self, kind, batch):
+        try:
+            self.handlers[kind](batch)
+        except Exception as e:
+            self._failed(batch, e)
+            return
+        with self._lock:
+            for op in batch:
+                self._ops.pop(op["key"], None)
+                self._notify(op, True)
+            self._idle.notify_all()
+        METRICS.count("writes", n=len(batch), kind=kind, result="written")
+
+    def _failed(self, batch, exc):
+        now = self.clock()
+        with self._lock:
+            if permanent(exc) and len(batch) > 1:
+                # One bad row refuses the whole batch: send each on its own to find it
+                for op in batch:
+                    op.update(status="pending", solo=True, due=now)
+                self._wake.set()
+                return
+            for op in batch:
+                op["attempts"] += 1
+                op["error"] = str(exc)
+                if permanent(exc) or op["attempts"] >= MAX_ATTEMPTS:
+                    op["status"] = "failed"
+                    self._notify(op, False)
+                    METRICS.count("writes", kind=op["kind"], result="failed")
+                else:
+                    op["status"] = "pending"
+                    op["due"] = now + min(RETRY_CAP, RETRY_BASE * 2 ** (op["attempts"] - 1))
+                    METRICS.count("writes", kind=op["kind"], result="retry")
+            self._idle.notify_all()
+
+    def _notify(self, op, ok):
+        notices = self._notices.setdefault(op["user"], deque(maxlen=NOTICES))
+        notices.append({"key": op["key"], "kind": op["kind"], "label": op["label"],
+                        "ok": ok, "error": op["error"], "at": self.clock()})
+
+    def _next_due(self):
+        with self._lock:
+            due = [op["due"] for op in self._ops.values() if op["status"] == "pending"]
+        return min(due) if due else None
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            due = self._next_due()
+            timeout = None if due is None else max(0.0, due - self.clock())
+            if self._wake.wait(timeout):
+                # Let a burst of writes (several trades, a trade + a profile edit) join one batch
+                time.sleep(self.batch_window)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass  # handlers' errors are kept on the ops; keep the thread alive regardless
+
+    def close(self, timeout=EXIT_TIMEOUT):
+        """At shutdown: send what's still queued right away instead of waiting out backoffs"""
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            if not self.flush(force=True):
+                time.sleep(0.05)  # the background thread has the rest in flight
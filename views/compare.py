@@ -1,8 +1,10 @@
 import streamlit as st
 import plotly.graph_objects as go
+from utils.charts import scatter
 import pandas as pd
-from utils.db import get_trades, get_users
+from utils.db import get_trades, get_trades_version, get_users, HISTORY_COLUMNS
 from utils.analytics import get_portfolio_history, get_benchmark_history
+from utils.risk import RISK_BENCHMARK, ROLLING_WINDOW, history_returns, periods_per_year, risk_metrics, rolling_risk
 from utils.ui_components import render_top_bar
 
 st.session_state["current_page"] = "compare"
@@ -34,7 +36,9 @@ if not targets:
 
 # --- FETCH DATA ---
 df_chart = pd.DataFrame()
-all_trades = pd.DataFrame(get_trades())
+selected_users = [t.replace("User: ", "") for t in targets if "User: " in t]
+versions = {u: get_trades_version(u) for u in selected_users}
+all_trades = pd.DataFrame(get_trades(user=selected_users, columns=HISTORY_COLUMNS)) if selected_users else pd.DataFrame()
 chart_data = {} # Store traces
 
 # Map 1d -> Intraday interval for better comparison
@@ -46,9 +50,11 @@ with st.spinner("Crunching numbers..."):
         
         if "User: " in t:
             uname = t.replace("User: ", "")
+            if all_trades.empty:
+                continue
             u_trades = all_trades[all_trades['user_name'] == uname]
             if not u_trades.empty:
-                hist = get_portfolio_history(u_trades, period=period, interval=interval)
+                hist = get_portfolio_history(u_trades, period=period, interval=interval, version=versions[uname])
                 if not hist.empty:
                     chart_data[uname] = hist
         else:
@@ -63,7 +69,7 @@ for name, data in chart_data.items():
     # Style logic: Me = Green, Others = Colors
     color = "#00FF00" if name == current_user else None
     
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=data["Date"],
         y=data["Return %"],
         mode='lines',
@@ -85,3 +91,47 @@ fig.update_layout(
 )
 
 st.plotly_chart(fig, use_container_width=True)
+
+# --- RISK ---
+# One aligned return matrix for everything on the chart; beta/correlation against SPY
+if chart_data:
+    returns = pd.DataFrame({name: history_returns(data) for name, data in chart_data.items()})
+    spy = chart_data.get(RISK_BENCHMARK)
+    if spy is None:
+        spy = get_benchmark_history(RISK_BENCHMARK, period=period, interval=interval)
+    benchmark = history_returns(spy).reindex(returns.index)
+    periods = periods_per_year(interval)
+
+    st.subheader("Risk")
+    risk = risk_metrics(returns, benchmark, periods=periods)
+    risk.index.name = "Name"
+    st.dataframe(
+        risk,
+        column_config={
+            "Volatility %": st.column_config.NumberColumn(format="%.1f%%"),
+            "Max Drawdown %": st.column_config.NumberColumn(format="%.1f%%"),
+            "Sharpe": st.column_config.NumberColumn(format="%.2f"),
+            "Sortino": st.column_config.NumberColumn(format="%.2f"),
+            "Beta": st.column_config.NumberColumn(format="%.2f"),
+            "Correlation": st.column_config.NumberColumn(format="%.2f"),
+        },
+        use_container_width=True
+    )
+
+    with st.expander(f"Rolling risk ({ROLLING_WINDOW} bars)"):
+        volatility, beta = rolling_risk(returns, benchmark, periods=periods)
+        for title, frame, suffix in [("Volatility", volatility, "%"), (f"Beta vs {RISK_BENCHMARK}", beta, "")]:
+            rolling_fig = go.Figure()
+            for name in frame.columns:
+                series = frame[name].dropna()
+                rolling_fig.add_trace(scatter(x=series.index, y=series, mode='lines', name=name))
+            rolling_fig.update_layout(
+                title=title,
+                template="plotly_dark",
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                hovermode="x unified",
+                yaxis=dict(gridcolor="#222", ticksuffix=suffix),
+                legend=dict(orientation="h", y=1.02, xanchor="right", x=1)
+            )
+            st.plotly_chart(rolling_fig, use_container_width=True)
@@ -0,0 +1,106 @@
+import time
+
+import pandas as pd
+import streamlit as st
+from utils.auth import is_admin
+from utils.db import get_write_queue
+from utils.perf import METRICS, to_json, to_prometheus
+
+if not is_admin(st.session_state.get("user", {})):
+    st.error("Admins only.")
+    st.stop()
+
+st.title("⏱️ Diagnostics")
+
+snap = METRICS.snapshot()
+st.caption(f"Process-wide since {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snap['since']))}")
+
+def timer_table(name, label):
+    rows = [
+        {label: t["labels"].get(label), **{k: t[k] for k in ("count", "errors")},
+         **{k.replace("_s", " ms"): t[k] * 1000 for k in ("avg_s", "p50_s", "p95_s", "max_s", "sum_s")},
+         **{k: v for k, v in t["labels"].items() if k != label}}
+        for t in snap["timers"] if t["name"] == name
+    ]
+    if not rows:
+        return pd.DataFrame()
+    return pd.DataFrame(rows).sort_values("sum ms", ascending=False).reset_index(drop=True)
+
+ms = {c: st.column_config.NumberColumn(format="%.1f") for c in ("avg ms", "p50 ms", "p95 ms", "max ms", "sum ms")}
+
+# 1. Pages
+st.subheader("Pages")
+pages = timer_table("page", "page")
+if pages.empty:
+    st.info("No page renders recorded yet.")
+else:
+    slowest = pages.sort_values("p95 ms", ascending=False).iloc[0]
+    st.metric("Slowest page (p95)", slowest["page"], f"{slowest['p95 ms']:.0f} ms", delta_color="off")
+    st.dataframe(pages, column_config=ms, use_container_width=True, hide_index=True)
+
+# 2. Upstream calls (Supabase, yfinance, quote poller)
+st.subheader("Upstream calls")
+calls = timer_table("calls", "name")
+if calls.empty:
+    st.info("No upstream calls recorded yet.")
+else:
+    st.dataframe(calls[["kind", "name"] + [c for c in calls.columns if c not in ("kind", "name")]],
+                 column_config=ms, use_container_width=True, hide_index=True)
+
+# 3. Caches
+st.subheader("Caches")
+counts = [c for c in snap["counters"] if c["name"] == "cache"]
+if not counts:
+    st.info("No cache lookups recorded yet.")
+else:
+    cache = pd.DataFrame([{**c["labels"], "value": c["value"]} for c in counts])
+    cache = cache.pivot_table(index=["module", "func"], columns="result", values="value", aggfunc="sum", fill_value=0)
+    cache = cache.reindex(columns=["hit", "miss"], fill_value=0).reset_index()
+    cache["hit rate"] = cache["hit"] / (cache["hit"] + cache["miss"]).where(lambda n: n > 0) * 100
+    st.dataframe(cache.sort_values("miss", ascending=False),
+                 column_config={"hit rate": st.column_config.NumberColumn(format="%.0f%%")},
+                 use_container_width=True, hide_index=True)
+
+    lookups = timer_table("cache_lookup", "func")
+    if not lookups.empty:
+        with st.expander("Time spent in cached functions"):
+            st.dataframe(lookups, column_config=ms, use_container_width=True, hide_index=True)
+
+# 4. Write queue (trade/profile writes sent in the background)
+st.subheader("Write queue")
+queue = get_write_queue()
+q1, q2 = st.columns(2)
+q1.metric("Queued", len(queue.pending()))
+q2.metric("Failed", len(queue.failed()))
+writes = [c for c in snap["counters"] if c["name"] == "writes"]
+if writes:
+    writes = pd.DataFrame([{**c["labels"], "value": c["value"]} for c in writes])
+    writes = writes.pivot_table(index="kind", columns="result", values="value", aggfunc="sum", fill_value=0)
+    st.dataframe(writes.reindex(columns=["queued", "written", "retry", "failed"], fill_value=0).reset_index(),
+                 use_container_width=True, hide_index=True)
+
+# 5. Export
+st.divider()
+c1, c2, c3 = st.columns(3)
+c1.download_button("Export JSON", to_json(), file_name="waddle-metrics.json", mime="application/json",
+                   use_container_width=True)
+c2.download_button("Export Prometheus", to_prometheus(), file_name="waddle-metrics.prom", mime="text/plain",
+                   use_container_width=True)
+if c3.button("Reset counters", use_container_width=True):
+    METRICS.reset()
+    st.rerun()
+
+# 6. Maintenance
+st.subheader("Maintenance")
+if st.button("Move inline avatars to storage", help="Legacy base64 avatars in the users table → avatars bucket"):
+    from utils.avatars import migrate_inline_avatars
+
+    with st.spinner("Uploading thumbnails..."):
+        moved = migrate_inline_avatars()
+    st.success(f"Moved {moved} avatar(s).")
+
+if st.button("Rebuild portfolio snapshots", help="Drops the stored end-of-day rows; they're rebuilt on the next long-range chart or leaderboard"):
+    from utils.snapshots import get_snapshots
+
+    get_snapshots().discard()
+    st.success("Snapshots cleared.")
@@ -1,27 +1,47 @@
 import streamlit as st
-import time
 from utils.db import log_trade
+from utils.ledger import get_ledger, get_positions
 from utils.market import get_current_price, get_common_tickers
+from utils.symbols import get_symbol_index, is_valid_symbol, normalize
 
 st.title("➕ Log a New Trade")
 
-# 1. Ticker Selection
-common_tickers = get_common_tickers()
+# 1. Ticker Selection: the whole symbol universe, popular tickers first
+symbol_index = get_symbol_index()
+ticker_options = list(dict.fromkeys(get_common_tickers() + sorted(symbol_index.by_symbol)))
+
+def ticker_label(symbol):
+    # The search box filters on the label, so company names match too
+    row = symbol_index.by_symbol.get(symbol)
+    return f"{symbol} · {row.name}" if row and row.name else symbol
 
 with st.container(border=True):
     st.subheader("1. Asset Details")
     
     ticker = st.selectbox(
-        "Search Ticker (e.g. NVDA, VOO)", 
-        options=common_tickers, 
+        "Search Ticker or Company (e.g. NVDA, Vanguard)", 
+        options=ticker_options, 
         index=None,
+        format_func=ticker_label,
         placeholder="Type to search..."
     )
 
+    unverified = False
     if not ticker:
         manual_ticker = st.text_input("Or type a custom ticker manually:")
         if manual_ticker:
-            ticker = manual_ticker.upper()
+            # Checked against the local symbol universe before any price lookup
+            ticker = normalize(manual_ticker)
+            valid = is_valid_symbol(ticker)
+            if not valid:
+                hints = ", ".join(f"{m.symbol} ({m.name})" for m in symbol_index.search(manual_ticker, limit=3))
+                if valid is False:
+                    st.error(f"{manual_ticker} isn't a valid symbol." + (f" Did you mean {hints}?" if hints else ""))
+                    ticker = None
+                else:
+                    # Funds, futures, FX and foreign listings aren't in the list: the price lookup below decides
+                    unverified = True
+                    st.warning(f"{ticker} isn't in the local symbol list." + (f" Did you mean {hints}?" if hints else ""))
 
     # 2. Real-Time Price Check
     current_price = 0.0
@@ -34,6 +54,9 @@ with st.container(border=True):
         
         if current_price > 0:
             st.metric(label=f"Current Price of {ticker}", value=f"${current_price:,.2f}")
+        elif unverified:
+            st.error(f"No price found for {ticker}. Please check the symbol.")
+            ticker = None
         else:
             st.warning(f"Could not fetch price for {ticker}. Please enter manually below.")
 
@@ -82,6 +105,17 @@ with st.container(border=True):
     # 4. Strategy & Submit
     st.subheader("3. Reasoning")
     action = st.selectbox("Action", ["Buy", "Sell"])
+
+    # Sells close the oldest lots first unless specific lots are picked
+    lot_ids = None
+    if action == "Sell" and ticker:
+        username = st.session_state["user"]["username"]
+        get_positions(username)
+        lots = get_ledger().lots(username, ticker)
+        if len(lots) > 1:
+            with st.expander("Choose lots to sell (default: oldest first)"):
+                labels = {lot["id"]: f"{lot['quantity']:.4g} sh @ ${lot['price']:,.2f} · {lot['opened']:%Y-%m-%d}" for lot in lots}
+                lot_ids = st.multiselect("Lots", list(labels), format_func=labels.get) or None
     reasoning = st.text_area("Thesis", placeholder="Why did you buy this? (Earnings, FOMO, Long-term hold...)")
 
     submit = st.button("Log Trade", type="primary", use_container_width=True)
@@ -95,10 +129,10 @@ with st.container(border=True):
                 action, 
                 entry_price, 
                 final_qty, 
-                reasoning
+                reasoning,
+                lot_ids=lot_ids
             )
-            st.success(f"✅ Logged {action} {final_qty:.4f} shares of {ticker}!")
-            time.sleep(2)
+            # Queued: saved in the background, a toast confirms it once stored
             st.switch_page("views/dashboard.py")
         else:
             st.error("Please ensure Ticker, Price, and Quantity are set.")
@@ -0,0 +1,85 @@
+import streamlit as st
+import pandas as pd
+from utils.db import get_trades, insert_trades, HISTORY_COLUMNS
+from utils.importer import FIELDS, plan_import, read_header, text_stream
+
+st.title("📥 Import Trades")
+
+st.write("Upload a CSV export of your broker's trade history. Only buys and sells are imported; "
+         "dividends, fees and transfers are skipped.")
+
+username = st.session_state["user"]["username"]
+
+uploaded = st.file_uploader("Broker CSV", type=["csv", "txt"])
+if not uploaded:
+    st.stop()
+
+# 1. Columns: detected from the header, anything it doesn't name is picked by hand
+try:
+    header, detected = read_header(uploaded)
+except ValueError as e:
+    st.error(str(e))
+    st.stop()
+
+columns = dict(detected)
+missing = [f for f in FIELDS if f not in detected]
+if missing:
+    st.warning("Some columns weren't recognised. Pick them below.")
+    pickers = st.columns(len(missing))
+    for picker, field in zip(pickers, missing):
+        choice = picker.selectbox(field.title(), header, index=None, key=f"import_col_{field}")
+        if choice is not None:
+            columns[field] = header.index(choice)
+    if any(f not in columns for f in FIELDS):
+        st.stop()
+
+# 2. Parse + validate the whole file (no writes); kept until the file or mapping changes
+plan_key = (uploaded.name, uploaded.size, getattr(uploaded, "file_id", None), tuple(sorted(columns.items())))
+if st.session_state.get("import_plan_key") != plan_key:
+    with st.spinner("Reading file..."):
+        existing = get_trades(user=username, columns=HISTORY_COLUMNS)
+        with text_stream(uploaded) as stream:
+            plan = plan_import(stream, username, existing, reasoning=f"Imported from {uploaded.name}", columns=columns)
+    st.session_state["import_plan"] = plan
+    st.session_state["import_plan_key"] = plan_key
+plan = st.session_state["import_plan"]
+
+c1, c2, c3, c4 = st.columns(4)
+c1.metric("Rows read", f"{plan['rows']:,}")
+c2.metric("New trades", f"{len(plan['trades']):,}")
+c3.metric("Already imported", f"{plan['duplicates']:,}")
+c4.metric("Errors", f"{plan['error_count']:,}")
+
+if plan["skipped"]:
+    st.caption(f"{plan['skipped']:,} non-trade rows (dividends, fees, transfers...) skipped.")
+if plan["unverified"]:
+    st.caption("Not in the local symbol list, imported as typed: " + ", ".join(sorted(plan["unverified"])))
+
+if plan["errors"]:
+    with st.expander(f"Rows with errors ({plan['error_count']:,})"):
+        st.dataframe(pd.DataFrame(plan["errors"]), hide_index=True, use_container_width=True)
+        if plan["error_count"] > len(plan["errors"]):
+            st.caption(f"Showing the first {len(plan['errors'])}.")
+
+if not plan["trades"]:
+    st.info("Nothing new to import.")
+    st.stop()
+
+st.dataframe(
+    pd.DataFrame(plan["trades"][:20], columns=["created_at", "ticker", "action", "quantity", "price"]),
+    hide_index=True,
+    use_container_width=True
+)
+
+# 3. Write in batches; re-running after a failure is safe (stored rows are skipped as duplicates)
+if st.button(f"Import {len(plan['trades']):,} trades", type="primary"):
+    total = len(plan["trades"])
+    bar = st.progress(0.0, text=f"0 / {total:,} trades")
+    try:
+        insert_trades(plan["trades"], progress=lambda done, total: bar.progress(done / total, text=f"{done:,} / {total:,} trades"))
+    except Exception as e:
+        st.session_state.pop("import_plan_key", None)
+        st.error(f"Import stopped: {e}. Upload the file again to resume; rows already stored will be skipped.")
+        st.stop()
+    st.session_state.pop("import_plan_key", None)
+    st.success(f"✅ Imported {total:,} trades.")
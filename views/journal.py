@@ -1,40 +1,106 @@
 import streamlit as st
-import pandas as pd
-from utils.db import get_trades, delete_trade
+from utils.db import query_trades, delete_trade, pending_deletes, pending_trades
 
 st.title("📖 Trade Journal")
 
+PAGE_SIZES = [10, 25, 50]
+
+# --- CONTROLS (all applied server-side) ---
 col1, col2 = st.columns(2)
 view_mode = col1.radio("View:", ["My Trades", "All Family Trades"], horizontal=True)
+sort_order = col2.radio("Sort:", ["Newest first", "Oldest first"], horizontal=True)
+
+f1, f2, f3 = st.columns([2, 1, 1])
+ticker_filter = f1.text_input("Ticker", placeholder="All tickers").upper().strip()
+action_filter = f2.selectbox("Action", ["All", "Buy", "Sell"])
+page_size = f3.selectbox("Per page", PAGE_SIZES, index=1)
+
+filters = {
+    "user": st.session_state["user"]["username"] if view_mode == "My Trades" else None,
+    "ticker": ticker_filter or None,
+    "action": None if action_filter == "All" else action_filter,
+}
+desc = sort_order == "Newest first"
+
+
+def _delete(trade_id):
+    delete_trade(trade_id, user=st.session_state["user"]["username"])
+    # Drop just this row; the rest of the page stays as fetched
+    page = st.session_state["journal_page"]
+    page["rows"] = [r for r in page["rows"] if r['id'] != trade_id]
+    st.session_state["journal_deleted"] = True
+
+
+def _turn_page(step):
+    cursors = st.session_state["journal_cursors"]
+    if step > 0:
+        cursors.append(st.session_state["journal_page"]["next"])
+    else:
+        cursors.pop()
+    st.session_state["journal_page"] = None
+
+
+@st.fragment
+def render_journal(filters, desc, page_size):
+    state = st.session_state
 
-raw_data = get_trades()
-df = pd.DataFrame(raw_data)
+    # New filters -> back to the first page
+    key = (tuple(sorted(filters.items())), desc, page_size)
+    if state.get("journal_key") != key:
+        state["journal_key"] = key
+        state["journal_cursors"] = [None]
+        state["journal_page"] = None
 
-if not df.empty:
-    if view_mode == "My Trades":
-        df = df[df['user_name'] == st.session_state["user"]["username"]]
+    # Only the visible page is fetched
+    cursors = state["journal_cursors"]
+    if state["journal_page"] is None:
+        rows, next_cursor = query_trades(**filters, limit=page_size, after=cursors[-1], desc=desc)
+        state["journal_page"] = {"rows": rows, "next": next_cursor}
+    page = state["journal_page"]
 
-    for index, row in df.iterrows():
+    if state.pop("journal_deleted", False):
+        st.toast("Trade deleted!")
+
+    # Optimistic view: my trades still being saved head the first page, queued deletes are hidden
+    username = st.session_state["user"]["username"]
+    saving = []
+    if desc and len(cursors) == 1 and filters["user"] in (None, username):
+        saving = [t for t in pending_trades(username)
+                  if filters["ticker"] in (None, t["ticker"]) and filters["action"] in (None, t["action"])]
+    deleting = pending_deletes(username)
+    rows = saving + [r for r in page["rows"] if r['id'] not in deleting]
+
+    if not rows:
+        st.info("No trades found.")
+
+    for row in rows:
         with st.container(border=True):
             c1, c2, c3, c4 = st.columns([1, 1, 3, 0.5])
-            
+
             color = "green" if row['action'] == "Buy" else "red"
-            
+
             with c1:
                 st.markdown(f"**{row['ticker']}**")
-                st.caption(f"{row['created_at'][:10]}")
+                st.caption(f"{row['created_at'][:10]}" if row['id'] is not None else "Saving...")
             with c2:
                 st.markdown(f":{color}[{row['action']}] **{row['quantity']}** @ ${row['price']}")
             with c3:
                 st.markdown(f"_{row['reasoning']}_")
                 st.caption(f"Trader: {row['user_name']}")
             with c4:
-                # Only allow deleting your own trades
-                if row['user_name'] == st.session_state["user"]["username"]:
+                # Only allow deleting your own (stored) trades
+                if row['user_name'] == username and row['id'] is not None:
                     # Unique key is crucial here!
-                    if st.button("🗑️", key=f"del_{row['id']}"):
-                        delete_trade(row['id'])
-                        st.toast("Trade deleted!")
-                        st.rerun()
-else:
-    st.info("No trades found.")
+                    st.button("🗑️", key=f"del_{row['id']}", on_click=_delete, args=(row['id'],))
+
+    # --- PAGER ---
+    p1, p2, p3 = st.columns([1, 2, 1], vertical_alignment="center")
+    p1.button("← Prev", disabled=len(cursors) == 1, on_click=_turn_page, args=(-1,), use_container_width=True)
+    p2.caption(f"Page {len(cursors)}")
+    p3.button("Next →", disabled=page["next"] is None, on_click=_turn_page, args=(1,), use_container_width=True)
+
+
+# A full rerun refetches the current page; pager clicks and deletes only rerun the fragment
+if "journal_key" in st.session_state:
+    st.session_state["journal_page"] = None
+render_journal(filters, desc, page_size)
@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
-from utils.db import get_trades, get_users
-from utils.analytics import get_portfolio_history, get_bulk_history
+from utils.db import get_trades, get_trades_version, get_users, HISTORY_COLUMNS
+from utils.analytics import get_leaderboard_returns
 
 st.title("🏆 Market Leaderboard")
 
@@ -11,44 +11,32 @@ st.write("Ranking Family Portfolios against major ETFs.")
 period = st.select_slider("Ranking Period", options=["5d", "1mo", "3mo", "6mo", "1y", "ytd"], value="1mo")
 
 # 2. Data Gathering
-ranking_data = []
+ranking_data = pd.DataFrame()
 
 with st.spinner(f"Analyzing market data for {period}..."):
     
-    # A. Get Users Performance
-    all_trades = pd.DataFrame(get_trades())
+    version = get_trades_version()
+    all_trades = pd.DataFrame(get_trades(columns=HISTORY_COLUMNS))
     all_users = get_users()
-    
-    for u in all_users:
-        username = u['username']
-        u_trades = all_trades[all_trades['user_name'] == username]
-        
-        if not u_trades.empty:
-            # We use get_portfolio_history to get accurate User ROI
-            hist = get_portfolio_history(u_trades, period=period)
-            if not hist.empty:
-                last_day = hist.iloc[-1]
-                ranking_data.append({
-                    "Name": u['full_name'],
-                    "Type": "User",
-                    "Return %": last_day["Return %"]
-                })
+    names = {u['username']: u['full_name'] for u in all_users}
+
+    if not all_trades.empty:
+        all_trades = all_trades[all_trades['user_name'].isin(names)]
 
-    # B. Get ETF Performance
+    # Users + ETFs in one shared market-data pass
     etfs = ["SPY", "QQQ", "VOO", "VGT", "SCHD", "IWM", "DIA"]
-    etf_data = get_bulk_history(etfs, period=period)
-    
-    if not etf_data.empty:
-        for _, row in etf_data.iterrows():
-            ranking_data.append({
-                "Name": row['Name'],
-                "Type": "ETF",
-                "Return %": row['Return %']
-            })
+    results = get_leaderboard_returns(all_trades, etfs, period=period, version=version)
+
+    if not results.empty:
+        # Usernames -> display names (ETFs keep their ticker)
+        ranking_data = results.copy()
+        name = ranking_data['Name'].astype(str)
+        ranking_data['Name'] = name.where(ranking_data['Type'] != "User", name.map(lambda n: names.get(n, n)))
+        ranking_data['Type'] = ranking_data['Type'].astype(str)
 
 # 3. Display
-if ranking_data:
-    df = pd.DataFrame(ranking_data).sort_values("Return %", ascending=False).reset_index(drop=True)
+if not ranking_data.empty:
+    df = ranking_data.sort_values("Return %", ascending=False).reset_index(drop=True)
     
     # Add Rank Column
     df.index = df.index + 1
@@ -62,10 +50,17 @@ if ranking_data:
     st.dataframe(
         df,
         column_config={
-            "Return %": st.column_config.NumberColumn(format="%.2f%%")
+            "Return %": st.column_config.NumberColumn(format="%.2f%%"),
+            "Volatility %": st.column_config.NumberColumn(format="%.1f%%", help="Annualised standard deviation of daily returns"),
+            "Max Drawdown %": st.column_config.NumberColumn(format="%.1f%%", help="Worst peak-to-trough fall in the period"),
+            "Sharpe": st.column_config.NumberColumn(format="%.2f", help="Annualised mean daily return / volatility"),
+            "Sortino": st.column_config.NumberColumn(format="%.2f", help="Like Sharpe, but only counts downside moves"),
+            "Beta": st.column_config.NumberColumn(format="%.2f", help="Sensitivity to SPY's daily moves"),
+            "Correlation": st.column_config.NumberColumn(format="%.2f", help="Correlation of daily returns with SPY"),
         },
         use_container_width=True
     )
+    st.caption("Risk columns use daily returns over the same period; beta and correlation are against SPY.")
     
     # Quick Winner Announcement
     winner = df.iloc[0]
@@ -1,7 +1,6 @@
 import streamlit as st
-import time
-import base64
 from utils.db import update_user_profile
+from utils.avatars import avatar_src, upload_avatar, MAX_UPLOAD
 from utils.ui_components import render_top_bar
 
 st.session_state["current_page"] = "profile"
@@ -10,7 +9,7 @@ render_top_bar()
 st.title("Settings")
 
 current_user = st.session_state["user"]
-current_avatar = current_user.get('avatar_url', 'https://www.gravatar.com/avatar/00000000000000000000000000000000?d=mp&f=y')
+current_avatar = current_user.get('avatar_url')
 
 # Layout
 col1, col2 = st.columns([1, 3])
@@ -18,7 +17,7 @@ col1, col2 = st.columns([1, 3])
 with col1:
     st.markdown(
         f"""
-        <img src="{current_avatar}" style="border-radius: 50%; width: 120px; height: 120px; object-fit: cover; border: 2px solid #333;">
+        <img src="{avatar_src(current_avatar)}" style="border-radius: 50%; width: 120px; height: 120px; object-fit: cover; border: 2px solid #333;">
         """,
         unsafe_allow_html=True
     )
@@ -29,6 +28,10 @@ with col2:
 
 st.divider()
 
+# Set by the last save (the page reruns right after it)
+if "profile_error" in st.session_state:
+    st.error(st.session_state.pop("profile_error"))
+
 # --- FORM ---
 with st.form("profile_form"):
     st.markdown("### Profile Details")
@@ -39,35 +42,33 @@ with st.form("profile_form"):
     # 1. File Uploader
     uploaded_file = st.file_uploader("Upload new image", type=['png', 'jpg', 'jpeg'])
     
-    # 2. Logic to convert file to Base64 string
-    final_avatar_url = current_avatar
+    # 2. Only a downscaled thumbnail is stored (in the avatars bucket), on save
     if uploaded_file is not None:
-        try:
-            bytes_data = uploaded_file.getvalue()
-            # Check size (limit to ~1MB to prevent DB bloat)
-            if len(bytes_data) > 1_000_000:
-                st.error("Image too large. Please use an image under 1MB.")
-            else:
-                b64 = base64.b64encode(bytes_data).decode()
-                final_avatar_url = f"data:image/png;base64,{b64}"
-                st.info("New image selected! Click 'Save Changes' to apply.")
-        except:
-            st.error("Error processing image.")
+        if uploaded_file.size > MAX_UPLOAD:
+            st.error("Image too large. Please use an image under 10MB.")
+            uploaded_file = None
+        else:
+            st.info("New image selected! Click 'Save Changes' to apply.")
 
     st.markdown("### Security")
     new_password = st.text_input("New Password", type="password", value=current_user['password'])
     
     if st.form_submit_button("Save Changes", type="primary"):
-        # Update DB
+        final_avatar_url = current_avatar
+        if uploaded_file is not None:
+            try:
+                final_avatar_url = upload_avatar(current_user['username'], uploaded_file.getvalue())
+            except Exception:
+                st.session_state["profile_error"] = "Error processing image. Keeping your current picture."
+
+        # Update DB (queued; a toast confirms it once saved)
         update_user_profile(current_user['username'], new_name, new_password, final_avatar_url)
         
-        # Update Session
+        # Update Session right away so the page shows the new details
         st.session_state["user"]["full_name"] = new_name
         st.session_state["user"]["password"] = new_password
         st.session_state["user"]["avatar_url"] = final_avatar_url
         
-        st.success("Profile updated!")
-        time.sleep(1)
         st.rerun()
 
 st.divider()
@@ -1,7 +1,9 @@
 import streamlit as st
-import yfinance as yf
 import plotly.graph_objects as go
-import pandas as pd
+from utils.charts import scatter
+from utils.analytics import get_price_history
+from utils.market import get_common_tickers
+from utils.metadata import get_metadata
 from utils.ui_components import render_top_bar
 
 st.session_state["current_page"] = "stock"
@@ -12,7 +14,10 @@ if "selected_ticker" not in st.session_state:
     st.stop()
 
 ticker = st.session_state["selected_ticker"]
-stock = yf.Ticker(ticker)
+
+# Name/sector/stats come from the metadata cache; warm the popular symbols while we're here
+metadata = get_metadata()
+metadata.prefetch(get_common_tickers())
 
 # --- TIME CONTROLS ---
 # We reuse the logic from the dashboard for consistency
@@ -32,10 +37,10 @@ c1, c2 = st.columns([2, 1])
 with c1:
     st.title(ticker)
     # Simple Sector Badge
-    try:
-        info = stock.info
+    info = metadata.get(ticker)
+    if info:
         st.caption(f"{info.get('longName', ticker)} • {info.get('sector', 'ETF/Crypto')}")
-    except:
+    else:
         st.caption("Asset Details")
 
 with c2:
@@ -49,7 +54,7 @@ with c2:
 
 # --- DATA ---
 period, interval = TIME_MAP[st.session_state["stock_period"]]
-hist = stock.history(period=period, interval=interval)
+hist = get_price_history(ticker, period=period, interval=interval)
 
 if hist.empty:
     st.warning("No data available.")
@@ -74,7 +79,7 @@ st.markdown(f"""
 fig = go.Figure()
 
 # Main Line
-fig.add_trace(go.Scatter(
+fig.add_trace(scatter(
     x=hist.index, 
     y=hist['Close'],
     mode='lines',
@@ -85,7 +90,7 @@ fig.add_trace(go.Scatter(
 ))
 
 # Baseline Dotted
-fig.add_trace(go.Scatter(
+fig.add_trace(scatter(
     x=[hist.index[0], hist.index[-1]],
     y=[start_val, start_val],
     mode='lines',
@@ -109,26 +114,29 @@ st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
 # --- STATS CARDS ---
 st.divider()
 st.subheader("About")
-col1, col2, col3, col4 = st.columns(4)
-
-try:
-    mcap = info.get('marketCap', 0)
-    pe = info.get('trailingPE', '-')
-    vol = info.get('averageVolume', 0)
-    high = info.get('fiftyTwoWeekHigh', 0)
-
-    # Helper to format big numbers
-    def fmt_num(n):
-        if n > 1e12: return f"{n/1e12:.2f}T"
-        if n > 1e9: return f"{n/1e9:.2f}B"
-        if n > 1e6: return f"{n/1e6:.2f}M"
-        return str(n)
-
-    col1.metric("Market Cap", fmt_num(mcap))
-    col2.metric("P/E Ratio", pe)
-    col3.metric("Avg Volume", fmt_num(vol))
-    col4.metric("52W High", f"${high}")
-    
-    st.write(info.get('longBusinessSummary', ''))
-except:
+# get() returns {} when the metadata fetch failed and nothing is cached
+if not info:
     st.caption("Detailed stats unavailable.")
+else:
+    col1, col2, col3, col4 = st.columns(4)
+    try:
+        mcap = info.get('marketCap', 0)
+        pe = info.get('trailingPE', '-')
+        vol = info.get('averageVolume', 0)
+        high = info.get('fiftyTwoWeekHigh', 0)
+
+        # Helper to format big numbers
+        def fmt_num(n):
+            if n > 1e12: return f"{n/1e12:.2f}T"
+            if n > 1e9: return f"{n/1e9:.2f}B"
+            if n > 1e6: return f"{n/1e6:.2f}M"
+            return str(n)
+
+        col1.metric("Market Cap", fmt_num(mcap))
+        col2.metric("P/E Ratio", pe)
+        col3.metric("Avg Volume", fmt_num(vol))
+        col4.metric("52W High", f"${high}")
+    
+        st.write(info.get('longBusinessSummary', ''))
+    except:
+        st.caption("Detailed stats unavailable.")